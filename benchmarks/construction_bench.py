@@ -0,0 +1,242 @@
+"""
+Offline construction throughput benchmark.
+
+Starts the local mock LLM server, points ``LLM_BASE_URL`` at it, generates a
+synthetic corpus and drives ``KTBuilder.build_knowledge_graph`` end to end.
+Reports chunks/sec, lock contention on ``KTBuilder.lock``, per-stage time
+(chunking, extraction, dedup, Tree-Comm, serialization) and peak RSS.
+
+Usage:
+    python -m benchmarks.construction_bench --docs 200 --words-per-doc 400 \
+        --latency-ms 150 --jitter-ms 50 --error-rate 0.01 --workers 32
+
+Tree-Comm loads the configured sentence-transformers model; pass
+``--skip-tree-comm`` when the model is not available locally.
+"""
+
+import argparse
+import functools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.mock_llm_server import MockLLMState, start_server
+
+RELATIONS = ["founded", "located in", "works with", "part of", "acquired", "studied at", "wrote", "directed"]
+
+
+class ContentionLock:
+    """Drop-in replacement for threading.Lock that records acquisition wait time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.hold_seconds = 0.0
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(blocking=False):
+            waited, contended = 0.0, False
+        else:
+            if not blocking:
+                return False
+            start = time.perf_counter()
+            if not self._lock.acquire(timeout=timeout):
+                return False
+            waited, contended = time.perf_counter() - start, True
+        self._acquired_at = time.perf_counter()
+        with self._stats_lock:
+            self.acquisitions += 1
+            self.contended += int(contended)
+            self.wait_seconds += waited
+        return True
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        with self._stats_lock:
+            self.hold_seconds += held
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def report(self) -> dict:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "contention_ratio": self.contended / self.acquisitions if self.acquisitions else 0.0,
+            "wait_seconds": round(self.wait_seconds, 4),
+            "hold_seconds": round(self.hold_seconds, 4),
+        }
+
+
+class StageTimer:
+    """Accumulates wall time per stage; concurrent stages (chunking, extraction) report summed thread time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, stage: str, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.seconds[stage] += elapsed
+                    self.calls[stage] += 1
+        return timed
+
+    def report(self) -> dict:
+        return {stage: {"seconds": round(self.seconds[stage], 4), "calls": self.calls[stage]} for stage in self.seconds}
+
+
+def generate_corpus(num_docs: int, words_per_doc: int, num_entities: int, seed: int = 0) -> list:
+    """Synthetic documents made of 'EntA <relation> EntB.' sentences over a shared entity pool."""
+    rng = random.Random(seed)
+    docs = []
+    for d in range(num_docs):
+        sentences, words = [], 0
+        while words < words_per_doc:
+            a, b = rng.randrange(num_entities), rng.randrange(num_entities)
+            sentence = f"Ent{a} {rng.choice(RELATIONS)} Ent{b}."
+            sentences.append(sentence)
+            words += len(sentence.split())
+        docs.append({"title": f"Doc {d}", "text": " ".join(sentences)})
+    return docs
+
+
+def instrument_builder(builder, timer: StageTimer, skip_tree_comm: bool):
+    builder.lock = ContentionLock()
+    builder.chunk_text = timer.wrap("chunking", builder.chunk_text)
+    builder.process_level1_level2 = timer.wrap("extraction", builder.process_level1_level2)
+    builder.process_level1_level2_agent = timer.wrap("extraction", builder.process_level1_level2_agent)
+    builder.triple_deduplicate = timer.wrap("dedup", builder.triple_deduplicate)
+    builder.process_level4 = timer.wrap("tree_comm", (lambda: None) if skip_tree_comm else builder.process_level4)
+    builder.process_all_documents = timer.wrap("documents", builder.process_all_documents)
+    return builder
+
+
+def run(args) -> dict:
+    canned = None
+    if args.canned_response:
+        with open(args.canned_response, "r", encoding="utf-8") as f:
+            canned = f.read()
+    state = MockLLMState(args.latency_ms, args.jitter_ms, args.error_rate, canned, args.seed)
+    server = start_server(state)
+    host, port = server.server_address[:2]
+    os.environ["LLM_BASE_URL"] = f"http://{host}:{port}/v1"
+    os.environ["LLM_API_KEY"] = os.environ.get("LLM_API_KEY") or "mock-key"
+    os.environ["LLM_MODEL"] = os.environ.get("LLM_MODEL") or "mock-model"
+    os.environ["OPENAI_PROVIDER"] = "openai"
+
+    from config import get_config
+    from models.constructor import kt_gen as constructor
+
+    config = get_config(args.config)
+    config.construction.max_workers = args.workers
+    if args.chunk_size:
+        config.construction.chunk_size = args.chunk_size
+    schema_path = os.path.abspath(args.schema)
+
+    work_dir = args.output_dir or tempfile.mkdtemp(prefix="kt_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    corpus_path = os.path.join(work_dir, "bench_corpus.json")
+    with open(corpus_path, "w", encoding="utf-8") as f:
+        json.dump(generate_corpus(args.docs, args.words_per_doc, args.entities, args.seed), f)
+
+    timer = StageTimer()
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # build_knowledge_graph writes to relative output/ paths
+    try:
+        builder = constructor.KTBuilder(args.dataset, schema_path=schema_path, mode=args.mode, config=config)
+        instrument_builder(builder, timer, args.skip_tree_comm)
+        start = time.perf_counter()
+        builder.build_knowledge_graph(corpus_path)
+        total = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+
+    num_chunks = len(builder.all_chunks)
+    stages = timer.report()
+    # everything after process_all_documents: chunk file, format_output and the JSON dump
+    documents = stages.pop("documents", {"seconds": 0.0})
+    stages["serialization"] = {"seconds": round(total - documents["seconds"], 4), "calls": 1}
+    return {
+        "docs": args.docs,
+        "chunks": num_chunks,
+        "nodes": builder.graph.number_of_nodes(),
+        "edges": builder.graph.number_of_edges(),
+        "total_seconds": round(total, 4),
+        "chunks_per_sec": round(num_chunks / total, 3) if total else 0.0,
+        "llm_requests": state.requests,
+        "llm_injected_errors": state.errors,
+        "lock": builder.lock.report(),
+        "stages": stages,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "work_dir": work_dir,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KTBuilder construction throughput benchmark (offline)")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--words-per-doc", type=int, default=300)
+    parser.add_argument("--entities", type=int, default=2000, help="Size of the synthetic entity pool")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--chunk-size", type=int, default=0, help="Override construction.chunk_size (tokens)")
+    parser.add_argument("--mode", choices=["agent", "noagent"], default="noagent")
+    parser.add_argument("--dataset", default="bench", help="Dataset name passed to KTBuilder (controls chunking)")
+    parser.add_argument("--schema", default=os.path.join(REPO_ROOT, "schemas", "demo.json"))
+    parser.add_argument("--config", default=os.path.join(REPO_ROOT, "config", "base_config.yaml"))
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--canned-response", help="JSON file returned verbatim for extraction prompts")
+    parser.add_argument("--skip-tree-comm", action="store_true", help="Skip Tree-Comm (no embedding model needed)")
+    parser.add_argument("--output-dir", help="Working directory for corpus and outputs (default: temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={report['docs']} chunks={report['chunks']} nodes={report['nodes']} edges={report['edges']}")
+    print(f"total={report['total_seconds']}s  throughput={report['chunks_per_sec']} chunks/s  peak_rss={report['peak_rss_mb']} MB")
+    print(f"llm requests={report['llm_requests']} injected_errors={report['llm_injected_errors']}")
+    lock = report["lock"]
+    print(f"lock: acquisitions={lock['acquisitions']} contended={lock['contended']} "
+          f"({lock['contention_ratio']:.1%}) wait={lock['wait_seconds']}s hold={lock['hold_seconds']}s")
+    for stage in ("chunking", "extraction", "dedup", "tree_comm", "serialization"):
+        info = report["stages"].get(stage, {"seconds": 0.0, "calls": 0})
+        print(f"  {stage:<14} {info['seconds']:>10.3f}s  ({info['calls']} calls)")
+
+
+if __name__ == "__main__":
+    main()
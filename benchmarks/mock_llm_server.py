@@ -0,0 +1,168 @@
+"""
+Local OpenAI-compatible stub for offline construction benchmarks.
+
+Serves ``POST /v1/chat/completions`` (and ``/chat/completions``) with
+configurable latency, jitter and error rate. Extraction prompts are answered
+with a canned JSON document, or, by default, with triples synthesized from the
+``EntNNN`` tokens found in the chunk so that graphs have realistic shape.
+Community-naming prompts from Tree-Comm get a JSON array back.
+
+Usage:
+    python -m benchmarks.mock_llm_server --port 8765 --latency-ms 200 --error-rate 0.01
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 LLM_API_KEY=mock python main.py ...
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+ENTITY_RE = re.compile(r"\bEnt\d+\b")
+COMMUNITY_DATA_RE = re.compile(r"Communities data:\s*(\[.*?\])\s*\n", re.S)
+
+
+class MockLLMState:
+    """Behaviour knobs and request counters shared by all handler threads."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 canned_response: Optional[str] = None, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.canned_response = canned_response
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def next_delay_and_failure(self):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def render(self, prompt: str) -> str:
+        match = COMMUNITY_DATA_RE.search(prompt)
+        if match:
+            return self._community_response(match.group(1))
+        if self.canned_response is not None:
+            return self.canned_response
+        return self._extraction_response(prompt)
+
+    @staticmethod
+    def _community_response(data: str) -> str:
+        try:
+            communities = json.loads(data)
+        except json.JSONDecodeError:
+            communities = []
+        return json.dumps([
+            {"id": str(c.get("id")), "name": f"Community {c.get('center', c.get('id'))}",
+             "summary": f"Synthetic community of {c.get('size', 0)} members"}
+            for c in communities
+        ])
+
+    @staticmethod
+    def _extraction_response(prompt: str) -> str:
+        entities = list(dict.fromkeys(ENTITY_RE.findall(prompt)))
+        triples = [[a, "related_to", b] for a, b in zip(entities, entities[1:])]
+        attributes = {e: [f"index: {e[3:]}"] for e in entities[::3]}
+        return json.dumps({
+            "attributes": attributes,
+            "triples": triples,
+            "entity_types": {e: "concept" for e in entities},
+        })
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    state: MockLLMState = None
+
+    def log_message(self, format, *args):
+        return
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+
+        delay, fail = self.state.next_delay_and_failure()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send_json(500, {"error": {"message": "injected mock failure", "type": "server_error"}})
+            return
+
+        messages = request.get("messages") or [{}]
+        prompt = str(messages[-1].get("content", ""))
+        content = self.state.render(prompt)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+
+def start_server(state: MockLLMState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub on a daemon thread; port 0 picks a free port (see server.server_address)."""
+    handler = type("BoundMockLLMHandler", (MockLLMHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--canned-response", help="Path to a JSON file returned verbatim for extraction prompts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    canned = None
+    if args.canned_response:
+        with open(args.canned_response, "r", encoding="utf-8") as f:
+            canned = f.read()
+
+    state = MockLLMState(args.latency_ms, args.jitter_ms, args.error_rate, canned, args.seed)
+    server = start_server(state, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Mock LLM server listening on http://{host}:{port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
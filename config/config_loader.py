@@ -4,9 +4,9 @@ Handles loading, validation, and access to configuration parameters.
 """
 
 import os
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import yaml
 
 from utils.logger import logger
@@ -35,6 +35,7 @@ class ConstructionConfig:
     datasets_no_chunk: list = None
     chunk_size: int = 1000
     overlap: int = 200
+    connect_keywords_to_communities: bool = True
     
     def __post_init__(self):
         if self.datasets_no_chunk is None:
@@ -54,6 +55,38 @@ class FAISSConfig:
     search_k: int = 50
     max_workers: int = 4
     device: str = "cpu"
+    # ANN index: flat | ivf_flat | ivf_pq | hnsw | sq8 | sqfp16 | pq; index_types overrides per node/relation/triple/community/chunk
+    index_type: str = "flat"
+    index_types: Dict[str, str] = field(default_factory=dict)
+    nlist: int = 0  # 0 = 4 * sqrt(n)
+    nprobe: int = 16
+    pq_m: int = 16
+    pq_nbits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 128
+    train_sample_size: int = 100000
+    min_ann_size: int = 10000  # smaller collections stay flat
+    recall_report: bool = True
+    recall_queries: int = 200
+    recall_k: int = 10
+    # Cold start: open .index files and .npy embedding matrices memory-mapped
+    mmap: bool = True
+    embedding_dtype: str = "float32"  # on-disk embedding matrices: float32 | float16
+    # Triple vectors: encode (one encoder call per distinct triple text) | compose (weighted head + relation + tail)
+    triple_embedding: str = "encode"
+    triple_compose_weights: List[float] = field(default_factory=lambda: [1.0, 0.5, 1.0])
+    # Graph edits update the cached indices in place (stable IDs) unless more than this fraction of entries changed
+    incremental_update: bool = True
+    incremental_max_change_ratio: float = 0.3
+    # Triple-path neighborhood expansion: successor hops, edges followed per node and hop (0 = all), LRU size
+    neighbor_hops: int = 3
+    hop_degree_cap: int = 0
+    neighbor_cache_size: int = 10000
+    # Shared FAISS search result cache (LRU entries, 0 = off), optional TTL in seconds and memory budget
+    search_cache_size: int = 4096
+    search_cache_ttl: float = 0.0
+    search_cache_max_mb: float = 64.0
 
 @dataclass
 class AgentConfig:
@@ -74,6 +107,16 @@ class RetrievalConfig:
     enable_high_recall: bool = True
     enable_caching: bool = True
     cache_dir: str = "retriever/faiss_cache_new"
+    # Query embeddings: LRU entries (0 = off); concurrent encodes batched for up to query_batch_wait_ms (0 = off)
+    query_cache_size: int = 1024
+    query_batch_size: int = 32
+    query_batch_wait_ms: float = 2.0
+    # Optional cross-encoder applied after the embedding rerank of retrieved chunks ("" = off)
+    chunk_reranker_model: str = ""
+    chunk_reranker_batch_size: int = 32
+    chunk_reranker_cache_size: int = 4096
+    # Persistent text-hash cache of one-hop triple embeddings not found in the triple index (0 = off)
+    triple_cache_size: int = 50000
     faiss: FAISSConfig = None
     agent: AgentConfig = None
     
@@ -94,7 +137,11 @@ class EmbeddingsConfig:
 @dataclass
 class NLPConfig:
     """NLP configuration"""
-    spacy_model: str = 'en_core_web_lg' 
+    spacy_model: str = 'en_core_web_lg'  # en_core_web_sm for latency-sensitive deployments
+    # Pipeline components not loaded: keyword extraction only reads POS tags and entities
+    spacy_exclude: List[str] = field(default_factory=lambda: ["parser", "lemmatizer"])
+    pipe_batch_size: int = 64
+    keyword_cache_size: int = 4096  # memoized spaCy parses of query texts (0 = off)
 
 
 @dataclass
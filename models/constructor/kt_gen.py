@@ -6,12 +6,12 @@ from concurrent import futures
 from typing import Any, Dict, List, Tuple
 
 import nanoid
-import networkx as nx
 import tiktoken
 import json_repair
 
 from config import get_config
-from utils import call_llm_api, graph_processor, tree_comm
+from utils import call_llm_api, graph_index, graph_processor, keyword_matcher, tree_comm
+from utils.graph_index import IndexedMultiDiGraph
 from utils.logger import logger
 
 class KTBuilder:
@@ -22,7 +22,7 @@ class KTBuilder:
         self.config = config
         self.dataset_name = dataset_name
         self.schema = self.load_schema(schema_path or config.get_dataset_config(dataset_name).schema_path)
-        self.graph = nx.MultiDiGraph()
+        self.graph = IndexedMultiDiGraph()
         self.node_counter = 0
         self.datasets_no_chunk = config.construction.datasets_no_chunk
         self.token_len = 0
@@ -467,7 +467,7 @@ class KTBuilder:
 
     def process_level4(self):
         """Process communities using Tree-Comm algorithm"""
-        level2_nodes = [n for n, d in self.graph.nodes(data=True) if d['level'] == 2]
+        level2_nodes = graph_index.node_index(self.graph).nodes_with_level(2)
         start_comm = time.time()
         _tree_comm = tree_comm.FastTreeComm(
             self.graph, 
@@ -479,23 +479,39 @@ class KTBuilder:
         # create super nodes (level 4 communities)
         _tree_comm.create_super_nodes_with_keywords(comm_to_nodes, level=4)
         # _tree_comm.add_keywords_to_level3(comm_to_nodes)
-        # connect keywords to communities (optional)
-        # self._connect_keywords_to_communities()
+        # connect keywords to communities
+        if getattr(self.config.construction, 'connect_keywords_to_communities', True):
+            self._connect_keywords_to_communities()
         end_comm = time.time()
         logger.info(f"Community Indexing Time: {end_comm - start_comm}s")
     
     def _connect_keywords_to_communities(self):
-        """Connect relevant keywords to communities"""
-        # comm_names = [self.graph.nodes[n]['properties']['name'] for n, d in self.graph.nodes(data=True) if d['level'] == 4]
-        comm_nodes = [n for n, d in self.graph.nodes(data=True) if d['level'] == 4]
-        kw_nodes = [n for n, d in self.graph.nodes(data=True) if d['label'] == 'keyword']
+        """Connect relevant keywords to communities.
+
+        A keyword describes a community when either lowercased name contains the
+        other. Two Aho-Corasick automata (keyword names and community names) are
+        built once, so the linking is linear in the total length of all names
+        instead of O(communities x keywords).
+        """
+        nodes, index = self.graph.nodes, graph_index.node_index(self.graph)
+        comm_names = {n: str(nodes[n]['properties'].get('name', '')) for n in index.nodes_with_level(4)}
+        kw_names = {n: str(nodes[n]['properties'].get('name', '')) for n in index.nodes_with_label('keyword')}
+        if not comm_names or not kw_names:
+            return
+
+        kw_matcher = keyword_matcher.AhoCorasickMatcher().add_all((name, kw) for kw, name in kw_names.items()).build()
+        comm_matcher = keyword_matcher.AhoCorasickMatcher().add_all((name, comm) for comm, name in comm_names.items()).build()
+
+        links = set()
+        for comm, comm_name in comm_names.items():
+            links.update((kw, comm) for kw in kw_matcher.find(comm_name))
+        for kw, kw_name in kw_names.items():
+            links.update((kw, comm) for comm in comm_matcher.find(kw_name))
+
         with self.lock:
-            for comm in comm_nodes:
-                comm_name = self.graph.nodes[comm]['properties']['name'].lower()
-                for kw in kw_nodes:
-                    kw_name = self.graph.nodes[kw]['properties']['name'].lower()
-                    if kw_name in comm_name or comm_name in kw_name:
-                        self.graph.add_edge(kw, comm, relation="describes")
+            for kw, comm in links:
+                self.graph.add_edge(kw, comm, relation="describes")
+        logger.info(f"Linked {len(links)} keyword-community pairs")
 
     def process_document(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Process a single document and return its results."""
@@ -581,7 +597,7 @@ class KTBuilder:
 
     def triple_deduplicate(self):
         """deduplicate triples in lv1 and lv2"""
-        new_graph = nx.MultiDiGraph()
+        new_graph = IndexedMultiDiGraph()
 
         for node, node_data in self.graph.nodes(data=True):
             new_graph.add_node(node, **node_data)
@@ -0,0 +1,379 @@
+"""
+Approximate-nearest-neighbor index construction for DualFAISSRetriever.
+
+Index types (per index, configured under ``retrieval.faiss``):
+    flat      exact inner-product scan (IndexFlatIP)
+    ivf_flat  inverted lists over k-means cells, exact vectors
+    ivf_pq    inverted lists with product-quantized vectors
+    hnsw      hierarchical navigable small world graph
+    sq8       exhaustive scan over 8-bit scalar-quantized vectors (4x smaller than flat)
+    sqfp16    exhaustive scan over float16 vectors (2x smaller than flat)
+    pq        exhaustive scan over product-quantized vectors
+
+All indices use inner product on L2-normalized vectors, i.e. cosine similarity.
+Indices built with ``ids`` return those stable IDs from searches, and the IDs
+survive incremental ``update_index`` calls. IVF indices keep the IDs in their
+inverted lists, with a hashtable direct map for reconstruction. The other
+types are wrapped in ``IndexIDMap2``. An ``IndexIDMap2`` around an IVF index
+breaks on removal: ``remove_ids`` compacts the wrapper's ID table but not the
+IVF's internal IDs.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from utils.logger import logger
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sqfp16", "pq")
+PQ_TYPES = ("ivf_pq", "pq")
+
+# faiss k-means warns below ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+_direct_map_lock = threading.Lock()
+
+
+def index_spec(faiss_config, name: str) -> Dict:
+    """Resolve the effective index parameters for one named index (node/relation/triple/community)."""
+    overrides = getattr(faiss_config, 'index_types', None) or {}
+    index_type = str(overrides.get(name, getattr(faiss_config, 'index_type', 'flat'))).lower()
+    if index_type not in INDEX_TYPES:
+        logger.warning(f"Unknown FAISS index type '{index_type}' for {name} index, using flat")
+        index_type = "flat"
+    return {
+        "type": index_type,
+        "nlist": getattr(faiss_config, 'nlist', 0),
+        "nprobe": getattr(faiss_config, 'nprobe', 16),
+        "pq_m": getattr(faiss_config, 'pq_m', 16),
+        "pq_nbits": getattr(faiss_config, 'pq_nbits', 8),
+        "hnsw_m": getattr(faiss_config, 'hnsw_m', 32),
+        "ef_construction": getattr(faiss_config, 'ef_construction', 200),
+        "ef_search": getattr(faiss_config, 'ef_search', 128),
+        "train_sample_size": getattr(faiss_config, 'train_sample_size', 100000),
+        "min_ann_size": getattr(faiss_config, 'min_ann_size', 10000),
+    }
+
+
+def _resolve_nlist(spec: Dict, n: int) -> int:
+    nlist = spec["nlist"] or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // MIN_POINTS_PER_CENTROID))
+
+
+def _resolve_pq_m(m: int, dim: int) -> int:
+    """PQ needs the sub-quantizer count to divide the dimension; take the closest divisor not above m."""
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _factory_string(spec: Dict, n: int, dim: int) -> str:
+    index_type = spec["type"]
+    if index_type == "ivf_flat":
+        return f"IVF{_resolve_nlist(spec, n)},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{_resolve_nlist(spec, n)},PQ{_resolve_pq_m(spec['pq_m'], dim)}x{spec['pq_nbits']}"
+    if index_type == "hnsw":
+        return f"HNSW{spec['hnsw_m']},Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "sqfp16":
+        return "SQfp16"
+    if index_type == "pq":
+        return f"PQ{_resolve_pq_m(spec['pq_m'], dim)}x{spec['pq_nbits']}"
+    return "Flat"
+
+
+def _effective_type(spec: Dict, n: int) -> str:
+    """Fall back to flat when the collection is too small for the requested ANN structure to pay off or train."""
+    index_type = spec["type"]
+    if index_type == "flat":
+        return "flat"
+    if n < spec["min_ann_size"]:
+        return "flat"
+    if index_type in ("ivf_flat", "ivf_pq") and n < MIN_POINTS_PER_CENTROID:
+        return "flat"
+    if index_type in PQ_TYPES and n < MIN_POINTS_PER_CENTROID * (1 << spec["pq_nbits"]):
+        return "flat"
+    return index_type
+
+
+def sample_training_set(embeddings: np.ndarray, sample_size: int, seed: int = 0) -> np.ndarray:
+    n = embeddings.shape[0]
+    if sample_size <= 0 or n <= sample_size:
+        return embeddings
+    rows = np.random.default_rng(seed).choice(n, size=sample_size, replace=False)
+    rows.sort()
+    return np.ascontiguousarray(embeddings[rows])
+
+
+def _populate(index, embeddings: np.ndarray, ids):
+    if ids is None:
+        index.add(embeddings)
+        return index
+    if isinstance(index, faiss.IndexIVF):
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.add_with_ids(embeddings, np.ascontiguousarray(ids, dtype=np.int64))
+        return index
+    index = faiss.IndexIDMap2(index)
+    index.add_with_ids(embeddings, np.ascontiguousarray(ids, dtype=np.int64))
+    return index
+
+
+def build_index(embeddings: np.ndarray, spec: Dict, name: str = "", ids=None) -> faiss.Index:
+    """Build and populate an index over L2-normalized float32 embeddings.
+
+    With ``ids`` searches return those IDs instead of row positions (see the module docstring).
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+    index_type = _effective_type(spec, n)
+    if index_type != spec["type"]:
+        logger.info(f"{name} index: {n} vectors is below the {spec['type']} threshold, using flat")
+
+    if index_type == "flat":
+        return _populate(faiss.IndexFlatIP(dim), embeddings, ids)
+
+    factory = _factory_string(dict(spec, type=index_type), n, dim)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = spec["ef_construction"]
+
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        # never sample below what k-means needs for the coarse (and PQ) centroids
+        min_train = MIN_POINTS_PER_CENTROID * max(ivf.nlist if ivf is not None else 1,
+                                                  (1 << spec["pq_nbits"]) if index_type in PQ_TYPES else 1)
+        train = sample_training_set(embeddings, max(spec["train_sample_size"], min_train))
+        start = time.time()
+        index.train(train)
+        logger.info(f"{name} index ({factory}) trained on {train.shape[0]} vectors in {time.time() - start:.2f}s")
+
+    index = _populate(index, embeddings, ids)
+    apply_search_params(index, spec)
+    logger.info(f"{name} index ({factory}) built with {index.ntotal} vectors")
+    return index
+
+
+def _base_index(index):
+    """The index an IndexIDMap/IndexIDMap2 wrapper delegates to (the index itself otherwise)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def is_flat(index) -> bool:
+    return isinstance(_base_index(index), faiss.IndexFlat)
+
+
+def bytes_per_vector(index) -> Optional[int]:
+    """Stored code size of one vector (graph links and inverted-list IDs not counted)."""
+    base = _base_index(index)
+    storage = getattr(base, 'storage', None)
+    if storage is not None:
+        base = faiss.downcast_index(storage)
+    code_size = getattr(base, 'code_size', None)
+    return int(code_size) if code_size is not None else None
+
+
+def is_id_mapped(index) -> bool:
+    """Whether ``index`` carries stable IDs that update_index can remove and add by."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return index.direct_map.type == faiss.DirectMap.Hashtable
+    # IndexIDMap2 around IVF (older caches) cannot remove correctly, callers rebuild it
+    return isinstance(index, faiss.IndexIDMap2) and not isinstance(_base_index(index), faiss.IndexIVF)
+
+
+def _ivf_ids(index) -> np.ndarray:
+    invlists = index.invlists
+    ids = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+           for l in range(index.nlist) if invlists.list_size(l)]
+    return np.concatenate(ids).astype(np.int64) if ids else np.zeros(0, dtype=np.int64)
+
+
+def stored_vectors(index):
+    """(ids, vectors) held by an ID-mapped index whose codes can be decoded (flat, HNSW-flat, IVF-flat)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        ids = _ivf_ids(index)
+        vectors = reconstruct_batch(index, ids) if len(ids) else np.zeros((0, index.d), dtype=np.float32)
+        return ids, vectors
+    base = _base_index(index)
+    vectors = base.reconstruct_n(0, base.ntotal) if base.ntotal else np.zeros((0, base.d), dtype=np.float32)
+    return faiss.vector_to_array(index.id_map).astype(np.int64), vectors
+
+
+def reconstruct_batch(index, ids) -> np.ndarray:
+    """Stored vectors for ``ids`` (decoded codes for PQ), without searching.
+
+    IVF indices get a hashtable direct map on first use, which stays valid
+    across later add_with_ids/remove_ids calls.
+    """
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF) and base.direct_map.type == faiss.DirectMap.NoMap:
+        with _direct_map_lock:
+            if base.direct_map.type == faiss.DirectMap.NoMap:
+                base.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype=np.int64))
+
+
+def _selector_params(index, selector):
+    """SearchParameters restricting a search to ``selector``, typed for the index's search implementation."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = getattr(_base_index(index), 'hnsw', None)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_subset(index, query: np.ndarray, k: int, ids, exact_ratio: float = 0.125):
+    """Top-``k`` search restricted to the vectors stored under ``ids``; returns (D, I) like index.search.
+
+    Subsets below ``exact_ratio`` of the index are scored exactly from their
+    reconstructed vectors; larger ones are searched in place with an
+    IDSelectorBatch, which ANN structures and ID-mapped indices honour.
+    """
+    query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    k = min(k, len(ids))
+    if k <= 0:
+        return np.zeros((1, 0), dtype=np.float32), np.zeros((1, 0), dtype=np.int64)
+
+    if len(ids) > exact_ratio * index.ntotal:
+        try:
+            selector = faiss.IDSelectorBatch(ids)
+            return index.search(query, k, params=_selector_params(index, selector))
+        except Exception as e:
+            logger.debug(f"Selector search not supported by {type(_base_index(index)).__name__} ({e}), scoring subset exactly")
+
+    scores = reconstruct_batch(index, ids) @ query[0]
+    top = np.argsort(-scores, kind="stable")[:k]
+    return scores[top].reshape(1, -1).astype(np.float32), ids[top].reshape(1, -1)
+
+
+def update_index(index, spec: Dict, remove_ids, add_embeddings: np.ndarray, add_ids, name: str = ""):
+    """Remove ``remove_ids`` and add normalized ``add_embeddings`` under ``add_ids`` in an ID-mapped index.
+
+    HNSW cannot delete, so an HNSW index with removals is rebuilt from its stored
+    vectors (no re-encoding). Returns the updated index, which may be a new object.
+    """
+    remove_ids = np.asarray(list(remove_ids), dtype=np.int64)
+    add_ids = np.asarray(list(add_ids), dtype=np.int64)
+    if len(remove_ids):
+        if isinstance(_base_index(index), faiss.IndexHNSW):
+            ids, vectors = stored_vectors(index)
+            keep = ~np.isin(ids, remove_ids)
+            logger.info(f"{name} index: HNSW does not support removal, rebuilding from {int(keep.sum())} stored vectors")
+            index = build_index(vectors[keep], spec, name=name, ids=ids[keep])
+        else:
+            index.remove_ids(remove_ids)
+    if len(add_ids):
+        index.add_with_ids(np.ascontiguousarray(add_embeddings, dtype=np.float32), add_ids)
+    if len(remove_ids) and not check_ids(index, (), remove_ids):
+        raise RuntimeError(f"{name} index returns wrong IDs after removal")
+    return index
+
+
+def check_ids(index, expected_ids, removed_ids, sample: int = 32, k: int = 10, seed: int = 0) -> bool:
+    """Spot-check an ID-mapped index after an update.
+
+    Checks that a sample of ``expected_ids`` (all of the index's IDs when empty)
+    reconstructs and finds itself among its own top-``k`` results, and that no
+    ``removed_ids`` come back.
+    """
+    expected_ids = np.asarray(list(expected_ids), dtype=np.int64)
+    if not len(expected_ids):
+        base = faiss.downcast_index(index)
+        if isinstance(base, faiss.IndexIVF):
+            expected_ids = _ivf_ids(base)
+        elif isinstance(base, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            expected_ids = faiss.vector_to_array(base.id_map).astype(np.int64)
+    if not len(expected_ids) or not index.ntotal:
+        return True
+    if len(expected_ids) > sample:
+        expected_ids = np.random.default_rng(seed).choice(expected_ids, size=sample, replace=False)
+    try:
+        vectors = reconstruct_batch(index, expected_ids)
+    except Exception as e:
+        logger.warning(f"Stored IDs cannot be reconstructed: {e}")
+        return False
+    _, I = index.search(np.ascontiguousarray(vectors, dtype=np.float32), min(k, index.ntotal))
+    found = (I == expected_ids[:, None]).any(axis=1)
+    if np.isin(I, np.asarray(list(removed_ids), dtype=np.int64)).any():
+        return False
+    # quantized codes may tie with near-duplicates, so a few misses are tolerated
+    return bool(found.mean() >= 0.9)
+
+
+def read_index(path: str, mmap: bool = True):
+    """Open a persisted index; with mmap, inverted lists and codes stay in the page cache instead of the heap."""
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            logger.warning(f"Memory-mapped read of {path} failed ({e}), reading into memory")
+    return faiss.read_index(path)
+
+
+def apply_search_params(index, spec: Dict) -> None:
+    """Set query-time knobs (nprobe for IVF, efSearch for HNSW); a no-op for flat indices."""
+    try:
+        ivf = faiss.try_extract_index_ivf(index)
+    except Exception:
+        ivf = None
+    if ivf is not None:
+        ivf.nprobe = max(1, min(spec["nprobe"], ivf.nlist))
+        return
+    hnsw = getattr(_base_index(index), 'hnsw', None)
+    if hnsw is not None:
+        hnsw.efSearch = spec["ef_search"]
+
+
+def recall_report(index, embeddings: np.ndarray, k: int = 10, num_queries: int = 200, seed: int = 0) -> Optional[Dict]:
+    """Recall@k (top-k overlap), per-query latency and vector footprint of ``index`` against an exact float32 flat scan.
+
+    Queries are sampled from the indexed vectors themselves, which is the
+    distribution retrieval queries land in after encoding.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n = embeddings.shape[0]
+    if n == 0 or num_queries <= 0:
+        return None
+    k = min(k, n)
+    queries = sample_training_set(embeddings, num_queries, seed=seed)
+
+    flat = faiss.IndexFlatIP(embeddings.shape[1])
+    flat.add(embeddings)
+    start = time.perf_counter()
+    _, exact = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, approx = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(len(set(e[e >= 0]) & set(a[a >= 0])) for e, a in zip(exact, approx))
+    flat_bytes = embeddings.shape[1] * 4
+    code_bytes = bytes_per_vector(index)
+    return {
+        "index": type(_base_index(index)).__name__,
+        "ntotal": int(index.ntotal),
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(hits / (k * len(queries)), 4),
+        "flat_ms_per_query": round(flat_ms, 4),
+        "ann_ms_per_query": round(ann_ms, 4),
+        "speedup": round(flat_ms / ann_ms, 2) if ann_ms else None,
+        "bytes_per_vector": code_bytes,
+        "flat_bytes_per_vector": flat_bytes,
+        "compression": round(flat_bytes / code_bytes, 2) if code_bytes else None,
+    }
@@ -2,10 +2,10 @@ import os
 import pickle
 import threading
 import time
+from contextlib import contextmanager
 from functools import lru_cache
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, Optional, Tuple
 
-import faiss
 import numpy as np
 import spacy
 import torch
@@ -13,9 +13,16 @@ import torch.nn.functional as F
 import concurrent.futures
 from sentence_transformers import SentenceTransformer
 
+from models.retriever import ann_index
+from models.retriever import retrieval_pipeline
 from models.retriever.faiss_filter import DualFAISSRetriever
 from utils import graph_processor
+from utils import cache_manifest
 from utils import call_llm_api
+from utils import embedding_store
+from utils import encoder_registry
+from utils import text_embedding_cache
+from utils.lru_cache import LRUCache
 from utils.logger import logger
 
 try:
@@ -54,10 +61,12 @@ class KTRetriever:
             recall_paths = recall_paths if recall_paths != 2 else config.retrieval.recall_paths
             schema_path = schema_path or config.get_dataset_config(dataset).schema_path
             mode = mode if mode != "agent" else config.triggers.mode
-            qa_encoder = qa_encoder or SentenceTransformer(config.embeddings.model_name)
+            if qa_encoder is not None:
+                encoder_registry.register_encoder(config.embeddings.model_name, qa_encoder)
+            qa_encoder = qa_encoder or encoder_registry.get_encoder(config.embeddings.model_name)
         
         self.graph = graph_processor.load_graph_from_json(json_path)
-        self.qa_encoder = qa_encoder or SentenceTransformer('all-MiniLM-L6-v2')
+        self.qa_encoder = qa_encoder or encoder_registry.get_encoder('all-MiniLM-L6-v2')
 
         self.llm_client = call_llm_api.LLMCompletionCall()
         
@@ -78,15 +87,42 @@ class KTRetriever:
         os.makedirs(cache_dir, exist_ok=True)
         self.debug_mode = True
 
-        self.nlp = spacy.load(config.nlp.spacy_model)
-        
-        self.faiss_retriever = DualFAISSRetriever(dataset, self.graph, model_name=config.embeddings.model_name, cache_dir=cache_dir, device=self.device)
-        
-        self.node_embedding_cache = {}       
-        self.triple_embedding_cache = {}     
-        self.query_embedding_cache = {}      
-        self.faiss_search_cache = {}         
-        self.chunk_embedding_cache = {}      
+        # keyword extraction reads POS tags, stop words and entities only: skip the components it never uses
+        self.nlp = spacy.load(config.nlp.spacy_model, exclude=list(getattr(config.nlp, 'spacy_exclude', ['parser', 'lemmatizer'])))
+        self.nlp_batch_size = getattr(config.nlp, 'pipe_batch_size', 64)
+        # each distinct text is parsed once: keyword extraction reads the lowercased question,
+        # query enhancement the original one
+        self.doc_cache = LRUCache(getattr(config.nlp, 'keyword_cache_size', 4096))
+        
+        self.faiss_retriever = DualFAISSRetriever(dataset, self.graph, model_name=config.embeddings.model_name, cache_dir=cache_dir, device=self.device, faiss_config=config.retrieval.faiss)
+        self.graph_store = self.faiss_retriever.graph_store
+
+        # one long-lived, process-wide pool for all retrieval stages and sub-questions
+        max_workers = config.retrieval.faiss.max_workers if config else 4
+        self.executor = retrieval_pipeline.shared_executor(max_workers)
+        
+        retrieval_config = config.retrieval if config else None
+        # one-hop triple rerank vectors, keyed by triple text hash, shared by all retrievers and kept across runs
+        self.triple_embedding_cache = text_embedding_cache.get_text_embedding_cache(
+            f"{self.cache_dir}/{self.dataset}/triple_embedding_cache.npy",
+            maxsize=getattr(retrieval_config, 'triple_cache_size', 50000),
+            model=self.faiss_retriever.model_name
+        )
+        # repeated sub-questions and IRCoT steps reuse their query embeddings
+        self.query_embedding_cache = LRUCache(getattr(retrieval_config, 'query_cache_size', 1024))
+        # embeddings of an open batched_queries block, also when the query cache is disabled
+        self._batched_query_embeddings: Dict[str, torch.Tensor] = {}
+        # concurrent single-query encodes (also across retrievers) are served as micro-batches
+        self.query_encoder = encoder_registry.get_batching_encoder(
+            self.qa_encoder,
+            max_batch_size=getattr(retrieval_config, 'query_batch_size', 32),
+            max_wait_ms=getattr(retrieval_config, 'query_batch_wait_ms', 2.0)
+        )
+        self.chunk_embedding_cache = embedding_store.EmbeddingStore(device=self.device)
+        # optional second-stage chunk reranker; its (question, chunk) scores are cached
+        self.chunk_reranker_model = getattr(retrieval_config, 'chunk_reranker_model', '') or ''
+        self.chunk_reranker_batch_size = getattr(retrieval_config, 'chunk_reranker_batch_size', 32)
+        self.chunk_rerank_cache = LRUCache(getattr(retrieval_config, 'chunk_reranker_cache_size', 4096))
         self.chunk_faiss_index = None      
         self.chunk_id_to_index = {}         
         self.index_to_chunk_id = {}          
@@ -103,6 +139,7 @@ class KTRetriever:
         self.precompute_lock = threading.Lock()
         
         self.chunk2id = {}
+        self._chunks_fingerprint = None
         chunk_file = f"output/chunks/{self.dataset}.txt"
         if os.path.exists(chunk_file):
             try:
@@ -134,29 +171,107 @@ class KTRetriever:
                 
                 if cache_loaded:
                     self.node_embeddings_precomputed = True
-                    
-                    if not hasattr(self.faiss_retriever, 'node_embedding_cache') or not self.faiss_retriever.node_embedding_cache:
-                        self.faiss_retriever.node_embedding_cache = {}
-                        for node, embed in self.node_embedding_cache.items():
-                            self.faiss_retriever.node_embedding_cache[node] = embed.clone().detach()
                 
             except Exception as e:
                 self.enable_performance_optimizations = False
 
+    @property
+    def node_embedding_cache(self) -> embedding_store.EmbeddingStore:
+        """Node embeddings, the same store instance DualFAISSRetriever scores against."""
+        return self.faiss_retriever.node_embedding_cache
+
+    @node_embedding_cache.setter
+    def node_embedding_cache(self, store: embedding_store.EmbeddingStore):
+        self.faiss_retriever.node_embedding_cache = store
+
     def build_indices(self):
         """Build all FAISS indices for efficient retrieval."""
         self.faiss_retriever.build_indices()
         self._precompute_node_embeddings()
 
+    def close(self):
+        """Persist the triple embedding cache (the executor and query batching encoder are shared)."""
+        self.triple_embedding_cache.save()
+
     def _get_query_embedding(self, query: str) -> torch.Tensor:
         """
-        Get query embedding with simple caching (most expensive operation)
+        Get query embedding with LRU caching (most expensive operation)
         """
+        cached = self._batched_query_embeddings.get(query)
+        if cached is None:
+            cached = self.query_embedding_cache.get(query)
+        if cached is not None:
+            return cached
         query_embed = torch.tensor(
-                    self.qa_encoder.encode(query)
+                    self.query_encoder.encode(query)
                 ).float().to(self.device)
+        self.query_embedding_cache.put(query, query_embed)
         return query_embed
 
+    def _search_index(self, name: str, index, query: np.ndarray, k: int):
+        """index.search for a single query row through DualFAISSRetriever's shared search result cache."""
+        return self.faiss_retriever.search(name, index, query, k)
+
+    @contextmanager
+    def batched_queries(self, questions: List[str]):
+        """
+        Encode ``questions`` in one encoder call and search every index once with the
+        stacked (Q, d) query matrix. While the context is open, the per-question
+        pipeline (process_retrieval_results) picks its embedding and FAISS rows up
+        from the caches instead of encoding and searching one row at a time.
+        The embeddings stay in the LRU query cache afterwards (unless it is disabled).
+        """
+        questions = [q for q in dict.fromkeys(questions)
+                     if q and q not in self.query_embedding_cache and q not in self._batched_query_embeddings]
+        embedded = []
+        try:
+            if questions:
+                try:
+                    start_time = time.time()
+                    embeddings = torch.as_tensor(
+                        np.asarray(self.qa_encoder.encode(questions), dtype=np.float32)
+                    ).to(self.device)
+                    for question, embedding in zip(questions, embeddings):
+                        self.query_embedding_cache.put(question, embedding)
+                        self._batched_query_embeddings[question] = embedding
+                        embedded.append(question)
+                    self._batch_search(embeddings)
+                    logger.info(f"Batched encoding and search of {len(questions)} queries: {time.time() - start_time:.3f}s")
+                except Exception as e:
+                    logger.warning(f"Batched query search failed, falling back to per-query search: {e}")
+            yield
+        finally:
+            for question in embedded:
+                self._batched_query_embeddings.pop(question, None)
+
+    def _batch_search(self, embeddings: torch.Tensor):
+        """Search node, relation, chunk (and triple/community) indices once for all rows of ``embeddings``.
+
+        Per-row results go into the shared search result cache under the keys the
+        single-query code paths look up.
+        """
+        fr = self.faiss_retriever
+        with torch.no_grad():
+            # per row, so cache keys match the bytes the single-query paths produce
+            transformed = np.stack([fr.transform_vector(e).detach().cpu().numpy().astype(np.float32) for e in embeddings])
+        raw = embeddings.detach().cpu().numpy().astype(np.float32)
+
+        searches = [
+            ("node", getattr(fr, 'node_index', None), transformed, min(self.top_k * 3, 50)),
+            ("relation", getattr(fr, 'relation_index', None), transformed, self.top_k),
+        ]
+        if self.recall_paths != 1:
+            searches.append(("triple", fr.triple_index, transformed, self.top_k))
+            searches.append(("community", fr.comm_index, transformed, self.top_k))
+        if self.chunk_embeddings_precomputed and self.chunk_faiss_index is not None:
+            searches.append(("chunk", self.chunk_faiss_index, raw, min(self.top_k, self.chunk_faiss_index.ntotal)))
+
+        for name, index, queries, k in searches:
+            if index is None or k <= 0:
+                continue
+            D, I = index.search(np.ascontiguousarray(queries), k)
+            fr.cache_search_results(name, queries, k, D, I)
+
     def _precompute_node_texts(self):
         """
         Precompute node texts for all nodes to avoid repeated text extraction.
@@ -200,6 +315,7 @@ class KTRetriever:
             
             with open(cache_path, 'wb') as f:
                 pickle.dump(self._node_text_cache, f)
+            cache_manifest.write_manifest(cache_path, self.faiss_retriever.fingerprint())
             
             file_size = os.path.getsize(cache_path)
             logger.info(f"Saved node text cache with {len(self._node_text_cache)} entries to {cache_path} (size: {file_size} bytes)")
@@ -212,6 +328,9 @@ class KTRetriever:
         """Load node text cache from disk"""
         cache_path = f"{self.cache_dir}/{self.dataset}/node_text_cache.pkl"
         if os.path.exists(cache_path):
+            manifest_ok = self._check_cache_manifest(cache_path, self.faiss_retriever.fingerprint())
+            if manifest_ok is False:
+                return False
             try:
                 file_size = os.path.getsize(cache_path)
                 if file_size < 1000:  # Less than 1KB likely empty or corrupted
@@ -225,7 +344,7 @@ class KTRetriever:
                     logger.warning("Warning: Loaded cache is empty")
                     return False
                 
-                if not self._check_text_cache_consistency():
+                if not manifest_ok and not self._check_text_cache_consistency():
                     logger.warning("Text cache inconsistent with current graph, will rebuild")
                     return False
                 
@@ -243,6 +362,18 @@ class KTRetriever:
             logger.warning(f"Cache file not found: {cache_path}")
         return False
 
+    def _check_cache_manifest(self, cache_path: str, fingerprint: str, model: str = None) -> Optional[bool]:
+        """True/False when the artifact's manifest decides validity, None when the full consistency check must run."""
+        manifest_ok, reason = cache_manifest.check_manifest(cache_path, fingerprint, model=model)
+        if manifest_ok is False:
+            logger.info(f"Cache {cache_path} is stale ({reason}), will rebuild")
+        return manifest_ok
+
+    def _chunk_fingerprint(self) -> str:
+        if self._chunks_fingerprint is None:
+            self._chunks_fingerprint = cache_manifest.items_fingerprint(self.chunk2id.items())
+        return self._chunks_fingerprint
+
     def _check_text_cache_consistency(self):
         """Check if the loaded text cache is consistent with current graph"""
         try:
@@ -278,11 +409,10 @@ class KTRetriever:
                 self.node_embeddings_precomputed = True
                 return
             
-            if hasattr(self.faiss_retriever, 'node_embedding_cache') and self.faiss_retriever.node_embedding_cache:
-                for node, embed in self.faiss_retriever.node_embedding_cache.items():
-                    self.node_embedding_cache[node] = embed.clone().detach()
+            # The store is shared with faiss_retriever, which may already have filled it in build_indices
+            if self._check_embedding_cache_consistency():
                 self.node_embeddings_precomputed = True
-                logger.info(f"Successfully loaded {len(self.node_embedding_cache)} node embeddings from faiss_retriever cache")
+                logger.info(f"Using {len(self.node_embedding_cache)} node embeddings from the shared faiss_retriever cache")
                 
                 self._save_node_embedding_cache()
                 return
@@ -314,9 +444,8 @@ class KTRetriever:
                     try:
                         batch_embeddings = self.qa_encoder.encode(batch_texts, convert_to_tensor=True)
                         
-                        for j, node in enumerate(valid_nodes):
-                            self.node_embedding_cache[node] = batch_embeddings[j]
-                            total_processed += 1
+                        self.node_embedding_cache.add_batch(valid_nodes, batch_embeddings)
+                        total_processed += len(valid_nodes)
                             
                     except Exception as e:
                         logger.error(f"Error encoding batch {i//batch_size}: {str(e)}")
@@ -341,55 +470,23 @@ class KTRetriever:
                 logger.warning(f"Failed to save node embedding cache: {e}")
                 logger.info("Continuing without saving cache...")
 
-            self._cleanup_node_cache()
-
     def _save_node_embedding_cache(self):
-        """Save node embedding cache to disk"""
-        cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.pt"
+        """Save node embedding cache to disk as one .npy matrix plus a node ID table"""
+        cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.npy"
         try:
             if not self.node_embedding_cache:
                 logger.warning("Warning: No node embeddings to save!")
                 return False
-                
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
             
-            cpu_cache = {}
-            for node, embed in self.node_embedding_cache.items():
-                if embed is not None:
-                    try:
-                        if hasattr(embed, 'detach'):
-                            cpu_cache[node] = embed.detach().cpu().numpy()
-                        elif isinstance(embed, np.ndarray):
-                            cpu_cache[node] = embed
-                        else:
-                            cpu_cache[node] = np.array(embed)
-                    except Exception as e:
-                        logger.warning(f"Warning: Failed to convert embedding for node {node}: {e}")
-                        continue
-            
-            if not cpu_cache:
-                logger.warning("Warning: No valid embeddings to save!")
-                return False
-            
-            try:
-                tensor_cache = {}
-                for node, embed_array in cpu_cache.items():
-                    if isinstance(embed_array, np.ndarray):
-                        tensor_cache[node] = torch.from_numpy(embed_array).float()
-                    else:
-                        tensor_cache[node] = embed_array
-                
-                torch.save(tensor_cache, cache_path)
-                logger.info(f"Saved node embedding cache using torch.save with tensor format")
-            except Exception as torch_error:
-                logger.error(f"torch.save failed: {torch_error}, using numpy.save")
-                cache_path_npz = cache_path.replace('.pt', '.npz')
-                np.savez_compressed(cache_path_npz, **cpu_cache)
-                cache_path = cache_path_npz
-                logger.error(f"Saved using numpy.savez_compressed format")
+            self.node_embedding_cache.save(
+                cache_path,
+                dtype=getattr(self.config.retrieval.faiss, 'embedding_dtype', 'float32') if self.config else 'float32'
+            )
+            embedding_store.share(cache_path, self.node_embedding_cache)
+            cache_manifest.write_manifest(cache_path, self.faiss_retriever.fingerprint(), model=self.faiss_retriever.model_name)
             
             file_size = os.path.getsize(cache_path)
-            logger.info(f"Saved node embedding cache with {len(cpu_cache)} entries to {cache_path} (size: {file_size} bytes)")
+            logger.info(f"Saved node embedding cache with {len(self.node_embedding_cache)} entries to {cache_path} (size: {file_size} bytes)")
             return True
                 
         except Exception as e:
@@ -400,6 +497,30 @@ class KTRetriever:
         """Load node embedding cache from disk"""
         cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.pt"
         cache_path_npz = cache_path.replace('.pt', '.npz')
+        cache_path_npy = cache_path.replace('.pt', '.npy')
+        
+        if os.path.exists(cache_path_npy):
+            manifest_ok = self._check_cache_manifest(cache_path_npy, self.faiss_retriever.fingerprint(),
+                                                     model=self.faiss_retriever.model_name)
+            if manifest_ok is False:
+                return False
+            try:
+                use_mmap = getattr(self.config.retrieval.faiss, 'mmap', True) if self.config else True
+                store = embedding_store.open_shared(cache_path_npy, mmap=use_mmap, device=self.device)
+                if not store:
+                    logger.warning("Warning: Loaded cache is empty")
+                    return False
+                
+                self.node_embedding_cache = store
+                if not manifest_ok and not self._check_embedding_cache_consistency():
+                    logger.info("Embedding cache inconsistent with current graph, will rebuild")
+                    return False
+                
+                logger.info(f"Loaded node embedding cache with {len(store)} entries from {cache_path_npy} (file size: {os.path.getsize(cache_path_npy)} bytes)")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Error loading node embedding matrix: {e}")
         
         if os.path.exists(cache_path_npz):
             try:
@@ -524,16 +645,6 @@ class KTRetriever:
             logger.error(f"Error checking embedding cache consistency: {e}")
             return False
 
-    def _cleanup_node_cache(self):
-        """
-        Clean up node embedding cache to save memory
-        """
-        with self.cache_locks['node_embedding']:
-            if len(self.node_embedding_cache) > 5000:
-                # Keep only the most recent entries
-                recent_nodes = list(self.node_embedding_cache.keys())[-5000:]
-                self.node_embedding_cache = {k: self.node_embedding_cache[k] for k in recent_nodes}
-
     def retrieve(self, question: str) -> Dict:
         """
         Perform enhanced two-path retrieval process with query understanding and caching.
@@ -713,50 +824,20 @@ class KTRetriever:
         if not filtered_nodes:
             return {"top_nodes": []}
         
-        filtered_node_embeddings = []
-        filtered_node_map = {}
-        
-        for idx, node_id in enumerate(filtered_nodes):
-            if node_id in self.faiss_retriever.node_map.values():
-                # Find the original index of this node in the FAISS index
-                original_idx = None
-                for orig_idx, orig_node_id in self.faiss_retriever.node_map.items():
-                    if orig_node_id == node_id:
-                        original_idx = orig_idx
-                        break
-                
-                if original_idx is not None:
-                    node_embedding = self.faiss_retriever.node_index.reconstruct(int(original_idx))
-                    filtered_node_embeddings.append(node_embedding)
-                    filtered_node_map[len(filtered_node_embeddings) - 1] = node_id
-        
-        if filtered_node_embeddings:
-            filtered_embeddings_array = np.array(filtered_node_embeddings).astype('float32')
-            temp_index = faiss.IndexFlatIP(filtered_embeddings_array.shape[1])
-            temp_index.add(filtered_embeddings_array)
-            
-            search_k = min(self.top_k, len(filtered_node_embeddings))
-            _, indices = temp_index.search(question_embed.reshape(1, -1), search_k)
-            
-            top_filtered_nodes = [filtered_node_map[idx] for idx in indices[0] if idx in filtered_node_map]
-        else:
+        top_filtered_nodes = self.faiss_retriever.search_nodes_in(question_embed, filtered_nodes, self.top_k)
+        if not top_filtered_nodes:
             top_filtered_nodes = filtered_nodes[:self.top_k]
         
         return {"top_nodes": top_filtered_nodes}
 
     def _get_one_hop_triples_from_nodes(self, node_list: list) -> list:
-
+        # incident edge ids come back sorted, i.e. in graph edge order, so only the first top_k are materialized
+        store = self.graph_store
         one_hop_triples = []
-        node_set = set(node_list)
-        
-        for u, v, data in self.graph.edges(data=True):
-            if u in node_set or v in node_set:
-                relation = data.get('relation', '')
-                u_name = self._get_node_name(u)
-                v_name = self._get_node_name(v)
-                one_hop_triples.append((u_name, relation, v_name))
-        
-        return one_hop_triples[:self.top_k]
+        for eid in store.edges_of(store.node_ids(node_list))[:self.top_k].tolist():
+            u, relation, v = store.edge_triple(eid)
+            one_hop_triples.append((self._get_node_name(u), relation, self._get_node_name(v)))
+        return one_hop_triples
 
     def _filter_nodes_by_schema_type(self, target_types: list) -> list:
         """
@@ -771,17 +852,13 @@ class KTRetriever:
         if not target_types:
             return list(self.graph.nodes())
         
-        filtered_nodes = []
-        for node_id, node_data in self.graph.nodes(data=True):
-            node_properties = node_data.get('properties', {})
-            node_schema_type = node_properties.get('schema_type', '')
-            
-            if node_schema_type in target_types:
-                filtered_nodes.append(node_id)
-            # Also include nodes without schema_type for backward compatibility
-            elif not node_schema_type and node_data.get('label') == 'entity':
-                filtered_nodes.append(node_id)
-
+        node_attributes = self.faiss_retriever.node_attributes
+        filtered_nodes = node_attributes.nodes_with_schema_type(target_types)
+        # Also include nodes without schema_type for backward compatibility
+        filtered_nodes.extend(
+            node_id for node_id in node_attributes.nodes_with('schema_type', None)
+            if node_attributes.value(node_id, 'label') == 'entity'
+        )
         return filtered_nodes
 
     def _get_node_name(self, node_id: str) -> str:
@@ -792,17 +869,14 @@ class KTRetriever:
 
     def _parallel_dual_path_retrieval(self, question_embed: torch.Tensor, question: str) -> Dict:
         all_chunk_ids = set()
-        start_time = time.time()
-        
-        max_workers = 4
-        if self.config:
-            max_workers = self.config.retrieval.faiss.max_workers
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            path1_future = executor.submit(self._node_relation_retrieval, question_embed, question)
-            path2_future = executor.submit(self._triple_only_retrieval, question_embed)
-            
-            path1_results = path1_future.result()
-            path2_results = path2_future.result()
+
+        # both paths' stages in one DAG, so the triple/community search overlaps path 1's searches
+        pipeline = retrieval_pipeline.RetrievalPipeline(self.executor, name="dual_path")
+        self._add_node_relation_stages(pipeline, question_embed, question)
+        pipeline.add("path2", lambda: self._triple_only_retrieval(question_embed))
+        stage_results = pipeline.run()
+        path1_results = stage_results["path1"]
+        path2_results = stage_results["path2"]
 
         start_time = time.time()
 
@@ -846,67 +920,43 @@ class KTRetriever:
             'path_triples': [],
             'keywords': []
         }
-        max_workers = 4
-        if self.config:
-            max_workers = self.config.retrieval.faiss.max_workers
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-
-            faiss_node_future = executor.submit(
-                self._faiss_node_search, q_embed, min(self.top_k * 3, 50)
-            )
-            faiss_relation_future = executor.submit(
-                self._faiss_relation_search, q_embed, self.top_k
-            )
-            
-            if question:
-                keyword_future = executor.submit(self._keyword_strategy, question, question_embed)
-            else:
-                keyword_future = None
-
-            if question:
-                path_future = executor.submit(self._path_strategy, question, question_embed)
-            else:
-                path_future = None
-            
-            try:
-                results['faiss_nodes'] = faiss_node_future.result()
-            except Exception as e:
-                logger.error(f"FAISS node search failed: {e}")
-            
-            try:
-                results['faiss_relations'] = faiss_relation_future.result()
-            except Exception as e:
-                logger.error(f"FAISS relation search failed: {e}")
-            
-            if keyword_future:
-                try:
-                    keyword_results = keyword_future.result()
-                    results['keyword_nodes'] = keyword_results.get('nodes', [])
-                    results['keywords'] = keyword_results.get('keywords', [])
-                except Exception as e:
-                    logger.error(f"Keyword strategy failed: {e}")
-            
-            if path_future:
+        # each strategy is isolated so one failure does not discard the others
+        def guarded(fn, label):
+            def run(*args):
                 try:
-                    results['path_triples'] = path_future.result()
+                    return fn(*args)
                 except Exception as e:
-                    logger.error(f"Path strategy failed: {e}")
-        
+                    logger.error(f"{label} failed: {e}")
+                    return None
+            return run
+
+        pipeline = retrieval_pipeline.RetrievalPipeline(self.executor, name="strategies")
+        pipeline.add("faiss_nodes", guarded(lambda: self._faiss_node_search(q_embed, min(self.top_k * 3, 50)),
+                                            "FAISS node search"))
+        pipeline.add("faiss_relations", guarded(lambda: self._faiss_relation_search(q_embed, self.top_k),
+                                                "FAISS relation search"))
+        if question:
+            pipeline.add("keywords", guarded(lambda: self._keyword_strategy(question, question_embed),
+                                             "Keyword strategy"))
+            pipeline.add("path_triples", guarded(lambda: self._path_strategy(question), "Path strategy"))
+        stage_results = pipeline.run()
+
+        if stage_results["faiss_nodes"] is not None:
+            results['faiss_nodes'] = stage_results["faiss_nodes"]
+        if stage_results["faiss_relations"] is not None:
+            results['faiss_relations'] = stage_results["faiss_relations"]
+        keyword_results = stage_results.get("keywords")
+        if keyword_results is not None:
+            results['keyword_nodes'] = keyword_results.get('nodes', [])
+            results['keywords'] = keyword_results.get('keywords', [])
+        if stage_results.get("path_triples") is not None:
+            results['path_triples'] = stage_results["path_triples"]
+
         return results
 
     def _faiss_node_search(self, q_embed, search_k: int) -> List[str]:
         """Execute FAISS node search with caching."""
-        search_key = f"node_search_{hash(q_embed.tobytes())}_{search_k}"
-        
-        if hasattr(self, 'faiss_search_cache') and search_key in self.faiss_search_cache:
-            D_nodes, I_nodes = self.faiss_search_cache[search_key]
-        else:
-            D_nodes, I_nodes = self.faiss_retriever.node_index.search(
-                q_embed.reshape(1, -1), search_k
-            )
-            if not hasattr(self, 'faiss_search_cache'):
-                self.faiss_search_cache = {}
-            self.faiss_search_cache[search_key] = (D_nodes, I_nodes)
+        D_nodes, I_nodes = self._search_index("node", self.faiss_retriever.node_index, q_embed, search_k)
         
         candidate_nodes = []
         for idx in I_nodes[0]:
@@ -923,17 +973,7 @@ class KTRetriever:
 
     def _faiss_relation_search(self, q_embed, top_k: int) -> List[str]:
         """Execute FAISS relation search with caching."""
-        search_key = f"relation_search_{hash(q_embed.tobytes())}_{top_k}"
-        
-        if hasattr(self, 'faiss_search_cache') and search_key in self.faiss_search_cache:
-            D_relations, I_relations = self.faiss_search_cache[search_key]
-        else:
-            D_relations, I_relations = self.faiss_retriever.relation_index.search(
-                q_embed.reshape(1, -1), top_k
-            )
-            if not hasattr(self, 'faiss_search_cache'):
-                self.faiss_search_cache = {}
-            self.faiss_search_cache[search_key] = (D_relations, I_relations)
+        D_relations, I_relations = self._search_index("relation", self.faiss_retriever.relation_index, q_embed, top_k)
         
         relations = []
         for idx in I_relations[0]:
@@ -963,127 +1003,76 @@ class KTRetriever:
         return
 
     def _node_relation_retrieval(self, question_embed: torch.Tensor, question: str = "") -> Dict:
-        overall_start = time.time()
-
-        max_workers = 4
-        if self.config:
-            max_workers = self.config.retrieval.faiss.max_workers
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            q_embed = self.faiss_retriever.transform_vector(question_embed)
-            search_k = min(self.top_k * 3, 50)
-            
-            future_faiss_nodes = executor.submit(
-                self._execute_faiss_node_search,
-                q_embed.cpu().numpy(),
-                search_k
-            )
+        pipeline = retrieval_pipeline.RetrievalPipeline(self.executor, name="node_relation")
+        self._add_node_relation_stages(pipeline, question_embed, question)
+        return pipeline.run()["path1"]
+
+    def _add_node_relation_stages(self, pipeline: retrieval_pipeline.RetrievalPipeline,
+                                  question_embed: torch.Tensor, question: str = "") -> None:
+        """
+        Path 1 as pipeline stages: FAISS node/relation and chunk search and keyword
+        extraction run concurrently, candidate scoring follows the searches, and
+        the expansions follow the top-node selection. Stage "path1" holds the result.
+        """
+        search_k = min(self.top_k * 3, 50)
+        pipeline.add("transform", lambda: self.faiss_retriever.transform_vector(question_embed).cpu().numpy())
+        pipeline.add("faiss_nodes", lambda q_embed: self._execute_faiss_node_search(q_embed, search_k), "transform")
+        pipeline.add("faiss_relations", self._execute_faiss_relation_search, "transform")
+        pipeline.add("chunk_search", lambda: self._chunk_embedding_retrieval(question_embed, self.top_k))
+        pipeline.add("faiss_scoring",
+                     lambda nodes: self._batch_calculate_entity_similarities(question_embed, nodes), "faiss_nodes")
+
+        if question:
+            pipeline.add("keywords", lambda: self._extract_query_keywords(question))
+            pipeline.add("keyword_nodes", self._keyword_based_node_search, "keywords")
+            pipeline.add("keyword_scoring",
+                         lambda faiss_nodes, keyword_nodes: self._score_keyword_candidates(
+                             question_embed, faiss_nodes, keyword_nodes),
+                         "faiss_nodes", "keyword_nodes")
+            pipeline.add("top_nodes", self._select_top_nodes, "faiss_scoring", "keyword_scoring")
+            pipeline.add("path_triples",
+                         lambda top_nodes, keywords: self._path_based_search(top_nodes, keywords, max_depth=2),
+                         "top_nodes", "keywords")
+        else:
+            pipeline.add("top_nodes", self._select_top_nodes, "faiss_scoring")
 
-            future_keywords = future_keyword_nodes = None
-            if question:
-                keywords_start = time.time()
-                future_keywords = executor.submit(
-                    self._extract_query_keywords,
-                    question
-                )
-                future_keyword_nodes = executor.submit(
-                    self._get_keyword_based_nodes,
-                    future_keywords
-                )
-
-            future_faiss_relations = executor.submit(
-                self._execute_faiss_relation_search,
-                q_embed.cpu().numpy()
-            )
+        pipeline.add("neighbor_triples",
+                     lambda top_nodes: self._optimized_neighbor_expansion(top_nodes, question_embed), "top_nodes")
+        pipeline.add("relation_triples", self._get_relation_matched_triples, "top_nodes", "faiss_relations")
 
-            future_chunk_retrieval = executor.submit(
-                self._chunk_embedding_retrieval,
-                question_embed,
-                self.top_k
-            )
+        triple_stages = ["neighbor_triples"] + (["path_triples"] if question else []) + ["relation_triples"]
 
-            faiss_candidate_nodes = future_faiss_nodes.result()
+        def assemble(top_nodes, all_relations, chunk_results, *triple_lists):
+            return {
+                "top_nodes": top_nodes,
+                "top_relations": all_relations,
+                "one_hop_triples": list({triple for triples in triple_lists for triple in triples}),
+                "chunk_results": chunk_results
+            }
 
-            future_faiss_sim = executor.submit(
-                self._batch_calculate_entity_similarities,
-                question_embed,
-                faiss_candidate_nodes
-            )
+        pipeline.add("path1", assemble, "top_nodes", "faiss_relations", "chunk_search", *triple_stages)
 
-            keyword_process_start = time.time()
-            keyword_candidate_nodes = []
-            if future_keyword_nodes:
-                keyword_nodes = future_keyword_nodes.result()
-                existing_faiss_nodes = set(faiss_candidate_nodes)
-                keyword_candidate_nodes = [
-                    n for n in keyword_nodes 
-                    if n not in existing_faiss_nodes
-                ]
-
-            future_keyword_sim = executor.submit(
-                self._batch_calculate_entity_similarities,
-                question_embed,
-                keyword_candidate_nodes
-            ) if keyword_candidate_nodes else None
+    def _score_keyword_candidates(self, question_embed: torch.Tensor, faiss_nodes: List[str],
+                                  keyword_nodes: List[str]) -> Dict[str, float]:
+        existing_faiss_nodes = set(faiss_nodes)
+        keyword_candidate_nodes = [n for n in keyword_nodes if n not in existing_faiss_nodes]
+        if not keyword_candidate_nodes:
+            return {}
+        return self._batch_calculate_entity_similarities(question_embed, keyword_candidate_nodes)
 
-            candidate_nodes = []
-            faiss_similarities = future_faiss_sim.result()
-            
+    def _select_top_nodes(self, faiss_similarities: Dict[str, float],
+                          keyword_similarities: Optional[Dict[str, float]] = None) -> List[str]:
+        candidate_nodes = list(faiss_similarities.items())
+        if keyword_similarities:
             candidate_nodes.extend(
-                (node, sim) for node, sim in faiss_similarities.items()
-            )
-
-            if future_keyword_sim:
-                keyword_similarities = future_keyword_sim.result()
-                
-                candidate_nodes.extend(
-                    (node, sim) for node, sim in keyword_similarities.items()
-                    if sim > 0.05 
-                )
-
-            candidate_nodes.sort(key=lambda x: x[1], reverse=True)
-            top_nodes = [node for node, score in candidate_nodes[:self.top_k] if score > 0.05]
-
-            all_relations = future_faiss_relations.result()
-
-            expansion_start = time.time()
-            future_path_triples = executor.submit(
-                self._path_based_search,
-                top_nodes,
-                future_keywords.result() if future_keywords else [],
-                max_depth=2
-            ) if question else None
-
-            future_neighbor_triples = executor.submit(
-                self._optimized_neighbor_expansion,
-                top_nodes,
-                question_embed
-            )
-
-            one_hop_triples = future_neighbor_triples.result()
-            path_triples = future_path_triples.result() if future_path_triples else []
-            relation_triples = self._get_relation_matched_triples(
-                top_nodes,
-                all_relations
+                (node, sim) for node, sim in keyword_similarities.items()
+                if sim > 0.05
             )
-
-            all_triples = list({
-                triple for triple in 
-                one_hop_triples + path_triples + relation_triples
-            })
-            chunk_results = future_chunk_retrieval.result()
-
-        return {
-            "top_nodes": top_nodes,
-            "top_relations": all_relations,
-            "one_hop_triples": all_triples,
-            "chunk_results": chunk_results  
-        }
-
+        candidate_nodes.sort(key=lambda x: x[1], reverse=True)
+        return [node for node, score in candidate_nodes[:self.top_k] if score > 0.05]
 
     def _execute_faiss_node_search(self, q_embed, search_k: int) -> List[str]:
-        _, I_nodes = self.faiss_retriever.node_index.search(
-            q_embed.reshape(1, -1), search_k
-        )
+        _, I_nodes = self._search_index("node", self.faiss_retriever.node_index, q_embed, search_k)
         return [
             self.faiss_retriever.node_map[str(idx)]
             for idx in I_nodes[0] 
@@ -1091,52 +1080,55 @@ class KTRetriever:
         ]
 
     def _execute_faiss_relation_search(self, q_embed) -> List[str]:
-        _, I_relations = self.faiss_retriever.relation_index.search(
-            q_embed.reshape(1, -1), self.top_k
-        )
+        _, I_relations = self._search_index("relation", self.faiss_retriever.relation_index, q_embed, self.top_k)
         return [
             self.faiss_retriever.relation_map[str(idx)]
             for idx in I_relations[0]
             if idx != -1 and str(idx) in self.faiss_retriever.relation_map
         ]
 
-    def _get_keyword_based_nodes(self, future_keywords) -> List[str]:
-        keywords = future_keywords.result()
-        return self._keyword_based_node_search(keywords)
-
     @lru_cache(maxsize=1000)
     def _get_cached_neighbors(self, node_id: str) -> List[str]:
-        return list(self.graph.neighbors(node_id))
+        idx = self.graph_store.node_id(node_id)
+        if idx < 0:
+            return []
+        keys = self.graph_store.keys
+        return [keys[j] for j in dict.fromkeys(self.graph_store.successors(idx).tolist())]
 
     def _optimized_neighbor_expansion(self, top_nodes: List[str], question_embed: torch.Tensor) -> List[Tuple]:
-        all_neighbors = set()
-        edge_queries = set()
+        """Edges between each top node and the successors gathered so far, read from the CSR rows of the top node.
+
+        Like ``graph.get_edge_data(u, v)``, a (u, v) pair contributes the relation
+        of its first parallel edge; CSR rows list edges in edge-id order, so that
+        is the first occurrence of the pair.
+        """
+        store = self.graph_store
+        seen = np.zeros(store.num_nodes, dtype=bool)
+        first_edge = {}
         for node in top_nodes:
-            neighbors = self._get_cached_neighbors(node)
-            all_neighbors.update(n for n in neighbors)
-            edge_queries.update((node, n) for n in all_neighbors)
-            edge_queries.update((n, node) for n in all_neighbors)
+            idx = store.node_id(node)
+            if idx < 0:
+                continue
+            seen[store.successors(idx)] = True
+            for indptr, other, eids, outgoing in ((store.out_indptr, store.out_indices, store.out_eid, True),
+                                                  (store.in_indptr, store.in_indices, store.in_eid, False)):
+                lo, hi = indptr[idx], indptr[idx + 1]
+                hit = seen[other[lo:hi]]
+                for j, eid in zip(other[lo:hi][hit].tolist(), eids[lo:hi][hit].tolist()):
+                    first_edge.setdefault((idx, j) if outgoing else (j, idx), eid)
 
         triples = []
-        for u, v in edge_queries:
-            edge_data = self.graph.get_edge_data(u, v)
-            if edge_data:
-                relation = list(edge_data.values())[0].get('relation', '')
-                if relation:
-                    triples.append((u, relation, v))
+        for (u, v), eid in first_edge.items():
+            relation = store.relations[store.edge_rel[eid]]
+            if relation:
+                triples.append((store.keys[u], relation, store.keys[v]))
         return triples
 
     def _get_relation_matched_triples(self, top_nodes: List[str], relations: List[str]) -> List[Tuple]:
-
-        top_node_set = set(top_nodes)
-        relation_set = set(relations)
-
-        return [
-            (u, data.get('relation'), v) 
-            for u, v, data in self.graph.edges(data=True) 
-            if data.get('relation') in relation_set and 
-               (u in top_node_set or v in top_node_set)
-        ]
+        # (node, relation) lookups in the graph store instead of a scan over every edge
+        store = self.graph_store
+        return [store.edge_triple(eid) for eid in
+                store.edges_of(store.node_ids(top_nodes), relations=relations).tolist()]
 
     def _triple_only_retrieval(self, question_embed: torch.Tensor) -> Dict:
         """
@@ -1418,12 +1410,13 @@ class KTRetriever:
         logger.info(f"[StepTiming] step=_merge_entity_attributes time={elapsed:.4f}")
         return merged_triples
 
-    def _process_chunk_results(self, chunk_results: Dict, question_embed: torch.Tensor, top_k: int) -> Tuple[List[str], set]:
+    def _process_chunk_results(self, chunk_results: Dict, question_embed: torch.Tensor, top_k: int,
+                               question: str = "") -> Tuple[List[str], set]:
         """Process chunk results and return formatted results and chunk IDs."""
         if not chunk_results:
             return [], set()
             
-        reranked_results = self._rerank_chunks_by_relevance(chunk_results, question_embed, top_k)
+        reranked_results = self._rerank_chunks_by_relevance(chunk_results, question_embed, top_k, question)
         chunk_ids = reranked_results.get('chunk_ids', [])
         chunk_scores = reranked_results.get('scores', [])
         chunk_contents = reranked_results.get('chunk_contents', [])
@@ -1529,7 +1522,7 @@ class KTRetriever:
         
         chunk_results = results['path1_results'].get('chunk_results')
         chunk_retrieval_results, chunk_retrieval_ids = self._process_chunk_results(
-            chunk_results, question_embed, top_k
+            chunk_results, question_embed, top_k, question
         )
         
         all_scored_triples = self._collect_all_scored_triples(results, question_embed)
@@ -1562,14 +1555,13 @@ class KTRetriever:
         """
         start_time = time.time()
         
-        default_max_workers = 4
-        if self.config:
-            default_max_workers = self.config.retrieval.faiss.max_workers
-        max_workers = min(len(sub_questions), default_max_workers)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-
+        self._prefetch_question_docs([sub_q.get('sub-question', '') for sub_q in sub_questions])
+        # one encode call and one (Q, d) search per index for all sub-questions
+        with self.batched_queries([sub_q.get('sub-question', '') for sub_q in sub_questions]):
+            # sub-questions share the retriever's executor with their own pipeline stages;
+            # a sub-question blocked on its pipeline runs that pipeline's ready stages itself
             future_to_subquestion = {
-                executor.submit(self._process_single_subquestion, sub_q, top_k, involved_types): sub_q 
+                self.executor.submit(self._process_single_subquestion, sub_q, top_k, involved_types): sub_q 
                 for sub_q in sub_questions
             }
             all_triples = set()
@@ -1582,23 +1574,22 @@ class KTRetriever:
                 try:
                     sub_result = future.result()
                     
-                    with threading.Lock():
-                        all_triples.update(sub_result['triples'])
-                        all_chunk_ids.update(sub_result['chunk_ids'])
-                        
-                        for chunk_id, content in sub_result['chunk_contents'].items():
-                            all_chunk_contents[chunk_id] = content
-                        
-                        all_sub_question_results.append(sub_result['sub_result'])
+                    # results are merged on this thread only
+                    all_triples.update(sub_result['triples'])
+                    all_chunk_ids.update(sub_result['chunk_ids'])
+                    
+                    for chunk_id, content in sub_result['chunk_contents'].items():
+                        all_chunk_contents[chunk_id] = content
+                    
+                    all_sub_question_results.append(sub_result['sub_result'])
                 except Exception as e:
                     logger.error(f"Error processing sub-question: {str(e)}")
-                    with threading.Lock():
-                        all_sub_question_results.append({
-                            'sub_question': sub_q.get('sub-question', ''),
-                            'triples_count': 0,
-                            'chunk_ids_count': 0,
-                            'time_taken': 0.0
-                        })
+                    all_sub_question_results.append({
+                        'sub_question': sub_q.get('sub-question', ''),
+                        'triples_count': 0,
+                        'chunk_ids_count': 0,
+                        'time_taken': 0.0
+                    })
 
         dedup_triples = list(all_triples) 
         dedup_chunk_ids = list(all_chunk_ids)  
@@ -1825,7 +1816,7 @@ class KTRetriever:
         """
         
         try:
-            doc = self.nlp(question)
+            doc = self._parse_text(question)
             
             entities = []
             for ent in doc.ents:
@@ -1890,28 +1881,15 @@ class KTRetriever:
 
     def _batch_calculate_entity_similarities(self, query_embed: torch.Tensor, nodes: List[str]) -> Dict[str, float]:
         similarities = {}
-        node_embeddings = []
-        valid_nodes = []
         with self.cache_locks['node_embedding']:
-            for node in nodes:
-                if node in self.node_embedding_cache:
-                    node_embeddings.append(self.node_embedding_cache[node])
-                    valid_nodes.append(node)
+            valid_nodes, _ = self.node_embedding_cache.rows_for(nodes)
         
-        if node_embeddings:
+        if valid_nodes:
 
             try:
-                node_embeddings_tensor = torch.stack(node_embeddings)
-                
-                batch_similarities = F.cosine_similarity(
-                    query_embed.unsqueeze(0), 
-                    node_embeddings_tensor, 
-                    dim=1
-                )
-                
-                for i, node in enumerate(valid_nodes):
-                    similarity = max(0.0, batch_similarities[i].item())
-                    similarities[node] = similarity
+                # one gather + matmul over the contiguous cache matrix
+                _, batch_similarities = self.node_embedding_cache.cosine_similarity(query_embed, valid_nodes)
+                similarities.update(zip(valid_nodes, batch_similarities.clamp_min(0.0).tolist()))
                         
             except Exception as e:
                 for node in valid_nodes:
@@ -1990,9 +1968,9 @@ class KTRetriever:
         
         try:
             encode_start = time.time()
-            triple_embeddings = self.qa_encoder.encode(triple_texts, convert_to_tensor=True).to(self.device)
+            triple_embeddings = self._triple_embeddings(valid_triples, triple_texts)
             encode_elapsed = time.time() - encode_start
-            logger.info(f"[StepTiming] step=batch_encode_triple_texts time={encode_elapsed:.4f}")
+            logger.info(f"[StepTiming] step=lookup_triple_embeddings time={encode_elapsed:.4f}")
             
             sim_calc_start = time.time()
             similarities = F.cosine_similarity(
@@ -2025,6 +2003,34 @@ class KTRetriever:
         logger.info(f"[StepTiming] step=_rerank_triples_by_relevance time={elapsed:.4f}")
         return scored_triples
     
+    def _triple_embeddings(self, triples: List[Tuple[str, str, str]], triple_texts: List[str]) -> torch.Tensor:
+        """
+        Vectors for ``triples`` (texts ``triple_texts``) from the persistent text-hash cache;
+        only the misses are encoded, in one batch.
+
+        Triple-index vectors are not reused: the index embeds a differently formatted
+        "head,relation,tail" text, so they would not score the text being reranked.
+        """
+        vectors = [None] * len(triples)
+        cached, to_encode = self.triple_embedding_cache.lookup(triple_texts)
+        for i, vector in cached.items():
+            vectors[i] = vector
+        if to_encode:
+            texts = [triple_texts[i] for i in to_encode]
+            encoded = np.asarray(self.qa_encoder.encode(texts), dtype=np.float32)
+            self.triple_embedding_cache.add(texts, encoded)
+            for i, vector in zip(to_encode, encoded):
+                vectors[i] = vector
+
+        stats = self.triple_embedding_cache.stats()
+        logger.info(f"Triple embeddings: {len(cached)} cached, "
+                    f"{len(to_encode)} encoded (cache hit rate {stats['hit_rate']:.1%}, {stats['size']} entries)")
+        return torch.from_numpy(np.stack(vectors).astype(np.float32, copy=False)).to(self.device)
+
+    def triple_embedding_stats(self) -> dict:
+        """Text-hash cache statistics of the one-hop triple reranking."""
+        return self.triple_embedding_cache.stats()
+
     def _rerank_triples_individual(self, triples: List[Tuple[str, str, str]], question_embed: torch.Tensor) -> List[Tuple[str, str, str, float]]:
         """
         Fallback individual triple processing when batch processing fails
@@ -2061,7 +2067,7 @@ class KTRetriever:
     def _extract_query_keywords(self, question: str) -> List[str]:
         """
         Automatically extract keywords from the question using spaCy NER and POS tagging.
-        Optimized for single-query scenarios.
+        The parse of the lowercased question is memoized.
         
         Args:
             question: Input question
@@ -2070,29 +2076,51 @@ class KTRetriever:
             List of automatically discovered keywords
         """
         try:
-            doc = self.nlp(question.lower())
-            keywords = []
-            
-            for token in doc:
-                if (not token.is_stop and len(token.text) > 2):
-                    if token.ent_type_: 
-                        keywords.append(token.text.lower())
-                    elif token.pos_ in ['NOUN', 'PROPN', 'ADJ']:
-                        keywords.append(token.text.lower())
-                    elif token.pos_ == 'VERB':
-                        keywords.append(token.text.lower())
-
-            for ent in doc.ents:
-                if len(ent.text) > 2:
-                    keywords.append(ent.text.lower())
-            
-            unique_keywords = list(set(keywords))
-            return unique_keywords
-            
+            return self._keywords_from_doc(self._parse_text(question.lower()))
         except Exception as e:
             logger.error(f"Error extracting keywords: {str(e)}")
             return []
 
+    def _parse_text(self, text: str):
+        """spaCy Doc of ``text``, memoized by the exact text parsed."""
+        doc = self.doc_cache.get(text)
+        if doc is None:
+            doc = self.nlp(text)
+            self.doc_cache.put(text, doc)
+        return doc
+
+    def _prefetch_question_docs(self, questions: List[str]) -> None:
+        """Parse and memoize the keyword-extraction input (lowercased) of all ``questions`` in one nlp.pipe pass."""
+        if not self.doc_cache.enabled:
+            return
+        pending = [text for text in dict.fromkeys(q.lower() for q in questions if q) if text not in self.doc_cache]
+        if not pending:
+            return
+        try:
+            docs = self.nlp.pipe(pending, batch_size=self.nlp_batch_size)
+            for text, doc in zip(pending, docs):
+                self.doc_cache.put(text, doc)
+        except Exception as e:
+            logger.warning(f"Batched question parsing failed, falling back to per-question parsing: {e}")
+
+    def _keywords_from_doc(self, doc) -> List[str]:
+        keywords = []
+        
+        for token in doc:
+            if (not token.is_stop and len(token.text) > 2):
+                if token.ent_type_: 
+                    keywords.append(token.text.lower())
+                elif token.pos_ in ['NOUN', 'PROPN', 'ADJ']:
+                    keywords.append(token.text.lower())
+                elif token.pos_ == 'VERB':
+                    keywords.append(token.text.lower())
+
+        for ent in doc.ents:
+            if len(ent.text) > 2:
+                keywords.append(ent.text.lower())
+        
+        return list(set(keywords))
+
     def _keyword_based_node_search(self, keywords: List[str]) -> List[str]:
         """
         Optimized keyword-based node search with text indexing and early termination.
@@ -2211,6 +2239,7 @@ class KTRetriever:
             
             with open(cache_path, 'wb') as f:
                 pickle.dump(serializable_index, f)
+            cache_manifest.write_manifest(cache_path, self.faiss_retriever.fingerprint())
             
             file_size = os.path.getsize(cache_path)
             logger.info(f"Saved node text index with {len(serializable_index)} words to {cache_path} (size: {file_size} bytes)")
@@ -2224,6 +2253,9 @@ class KTRetriever:
         """Load node text index from disk cache"""
         cache_path = f"{self.cache_dir}/{self.dataset}/node_text_index.pkl"
         if os.path.exists(cache_path):
+            manifest_ok = self._check_cache_manifest(cache_path, self.faiss_retriever.fingerprint())
+            if manifest_ok is False:
+                return False
             try:
                 file_size = os.path.getsize(cache_path)
                 if file_size < 1000: 
@@ -2241,7 +2273,7 @@ class KTRetriever:
                 for word, nodes in serializable_index.items():
                     self._node_text_index[word] = set(nodes)
                 
-                if not self._check_text_index_consistency():
+                if not manifest_ok and not self._check_text_index_consistency():
                     logger.info("Text index inconsistent with current graph, will rebuild")
                     return False
                 
@@ -2355,8 +2387,6 @@ class KTRetriever:
                 batch_size = self.config.embeddings.batch_size 
             
             total_processed = 0
-            embeddings_list = []
-            valid_chunk_ids = []
             
             for i in range(0, len(chunk_texts), batch_size):
                 batch_texts = chunk_texts[i:i + batch_size]
@@ -2365,11 +2395,8 @@ class KTRetriever:
                 try:
                     batch_embeddings = self.qa_encoder.encode(batch_texts, convert_to_tensor=True)
                     
-                    for j, chunk_id in enumerate(batch_chunk_ids):
-                        self.chunk_embedding_cache[chunk_id] = batch_embeddings[j]
-                        embeddings_list.append(batch_embeddings[j].cpu().numpy())
-                        valid_chunk_ids.append(chunk_id)
-                        total_processed += 1
+                    self.chunk_embedding_cache.add_batch(batch_chunk_ids, batch_embeddings)
+                    total_processed += len(batch_chunk_ids)
                         
                 except Exception as e:
                     logger.error(f"Error encoding chunk batch {i//batch_size}: {str(e)}")
@@ -2378,27 +2405,16 @@ class KTRetriever:
                             chunk_text = self.chunk2id[chunk_id]
                             embedding = torch.tensor(self.qa_encoder.encode(chunk_text)).float().to(self.device)
                             self.chunk_embedding_cache[chunk_id] = embedding
-                            embeddings_list.append(embedding.cpu().numpy())
-                            valid_chunk_ids.append(chunk_id)
                             total_processed += 1
                         except Exception as e2:
                             logger.error(f"Error encoding chunk {chunk_id}: {str(e2)}")
                             continue
             
-            if embeddings_list:
+            if self.chunk_embedding_cache:
                 try:
                     logger.info("Building FAISS index for chunk embeddings...")
-                    embeddings_array = np.array(embeddings_list)
-                    dimension = embeddings_array.shape[1]
-                    
-                    self.chunk_faiss_index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-                    self.chunk_faiss_index.add(embeddings_array.astype('float32'))
-                    
-                    for i, chunk_id in enumerate(valid_chunk_ids):
-                        self.chunk_id_to_index[chunk_id] = i
-                        self.index_to_chunk_id[i] = chunk_id
-                    
-                    logger.info(f"FAISS index built with {len(valid_chunk_ids)} chunks")
+                    self._build_chunk_faiss_index()
+                    logger.info(f"FAISS index built with {len(self.chunk_embedding_cache)} chunks")
                     
                 except Exception as e:
                     logger.error(f"Error building FAISS index for chunks: {str(e)}")
@@ -2408,56 +2424,67 @@ class KTRetriever:
             
             self._save_chunk_embedding_cache()
 
+    def _build_chunk_faiss_index(self):
+        """Index the chunk store matrix; FAISS row i is chunk_embedding_cache.ids[i]."""
+        embeddings_array = np.ascontiguousarray(self.chunk_embedding_cache.matrix.detach().cpu().numpy(), dtype='float32')
+        # Inner product for cosine similarity; retrieval.faiss.index_types.chunk selects e.g. sq8/sqfp16 storage
+        spec = ann_index.index_spec(self.config.retrieval.faiss if self.config else None, "chunk")
+        self.chunk_faiss_index = ann_index.build_index(embeddings_array, spec, name="chunk")
+        
+        self.chunk_id_to_index.clear()
+        self.index_to_chunk_id.clear()
+        for i, chunk_id in enumerate(self.chunk_embedding_cache.ids):
+            self.chunk_id_to_index[chunk_id] = i
+            self.index_to_chunk_id[i] = chunk_id
+
     def _save_chunk_embedding_cache(self):
-        """Save chunk embedding cache to disk"""
-        cache_path = f"{self.cache_dir}/{self.dataset}/chunk_embedding_cache.pt"
+        """Save chunk embedding cache to disk as one .npy matrix plus a chunk ID table"""
+        cache_path = f"{self.cache_dir}/{self.dataset}/chunk_embedding_cache.npy"
         try:
             if not self.chunk_embedding_cache:
                 return False
-                
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            
-            numpy_cache = {}
-            for chunk_id, embed in self.chunk_embedding_cache.items():
-                if embed is not None:
-                    try:
-                        if hasattr(embed, 'detach'):
-                            numpy_cache[chunk_id] = embed.detach().cpu().numpy()
-                        elif isinstance(embed, np.ndarray):
-                            numpy_cache[chunk_id] = embed
-                        else:
-                            numpy_cache[chunk_id] = np.array(embed)
-                    except Exception as e:
-                        continue
-            
-            if not numpy_cache:
-                return False
             
-            try:
-                tensor_cache = {}
-                for chunk_id, embed_array in numpy_cache.items():
-                    if isinstance(embed_array, np.ndarray):
-                        tensor_cache[chunk_id] = torch.from_numpy(embed_array).float()
-                    else:
-                        tensor_cache[chunk_id] = embed_array
-                
-                torch.save(tensor_cache, cache_path)
-            except Exception as torch_error:
-                cache_path_npz = cache_path.replace('.pt', '.npz')
-                np.savez_compressed(cache_path_npz, **numpy_cache)
-                cache_path = cache_path_npz
+            self.chunk_embedding_cache.save(
+                cache_path,
+                dtype=getattr(self.config.retrieval.faiss, 'embedding_dtype', 'float32') if self.config else 'float32'
+            )
+            cache_manifest.write_manifest(cache_path, self._chunk_fingerprint(), model=self.faiss_retriever.model_name)
             
             file_size = os.path.getsize(cache_path)
-            logger.info(f"Saved chunk embedding cache with {len(numpy_cache)} entries to {cache_path} (size: {file_size} bytes)")
+            logger.info(f"Saved chunk embedding cache with {len(self.chunk_embedding_cache)} entries to {cache_path} (size: {file_size} bytes)")
             return True
                 
         except Exception as e:
+            logger.warning(f"Failed to save chunk embedding cache: {e}")
             return False
 
     def _load_chunk_embedding_cache(self):
         """Load chunk embedding cache from disk"""
         cache_path = f"{self.cache_dir}/{self.dataset}/chunk_embedding_cache.pt"
         cache_path_npz = cache_path.replace('.pt', '.npz')
+        cache_path_npy = cache_path.replace('.pt', '.npy')
+        
+        if os.path.exists(cache_path_npy):
+            manifest_ok = self._check_cache_manifest(cache_path_npy, self._chunk_fingerprint(),
+                                                     model=self.faiss_retriever.model_name)
+            if manifest_ok is False:
+                return False
+            try:
+                use_mmap = getattr(self.config.retrieval.faiss, 'mmap', True) if self.config else True
+                store = embedding_store.EmbeddingStore.load(cache_path_npy, mmap=use_mmap, device=self.device)
+                if not store:
+                    return False
+                
+                self.chunk_embedding_cache = store
+                if not manifest_ok and not self._check_chunk_cache_consistency():
+                    return False
+                self._build_chunk_faiss_index()
+                
+                logger.info(f"Loaded chunk embedding cache with {len(store)} entries from {cache_path_npy}")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Failed to load chunk embedding cache from {cache_path_npy}: {e}")
         
         if os.path.exists(cache_path_npz):
             try:
@@ -2478,6 +2505,7 @@ class KTRetriever:
                         continue
                 
                 numpy_cache.close()
+                self._build_chunk_faiss_index()
                 
                 logger.info(f"Loaded chunk embedding cache with {len(self.chunk_embedding_cache)} entries from {cache_path_npz}")
                 return True
@@ -2534,25 +2562,7 @@ class KTRetriever:
                 
                 if self.chunk_embedding_cache:
                     try:
-                        embeddings_list = []
-                        valid_chunk_ids = []
-                        
-                        for chunk_id, embed in self.chunk_embedding_cache.items():
-                            embeddings_list.append(embed.cpu().numpy())
-                            valid_chunk_ids.append(chunk_id)
-                        
-                        embeddings_array = np.array(embeddings_list)
-                        dimension = embeddings_array.shape[1]
-                        
-                        self.chunk_faiss_index = faiss.IndexFlatIP(dimension)
-                        self.chunk_faiss_index.add(embeddings_array.astype('float32'))
-                        
-                        self.chunk_id_to_index.clear()
-                        self.index_to_chunk_id.clear()
-                        for i, chunk_id in enumerate(valid_chunk_ids):
-                            self.chunk_id_to_index[chunk_id] = i
-                            self.index_to_chunk_id[i] = chunk_id
-                        
+                        self._build_chunk_faiss_index()
                     except Exception as e:
                         return False
                 
@@ -2606,7 +2616,7 @@ class KTRetriever:
                 }
             
             query_embed_np = question_embed.cpu().numpy().reshape(1, -1).astype('float32')
-            scores, indices = self.chunk_faiss_index.search(query_embed_np, min(top_k, self.chunk_faiss_index.ntotal))
+            scores, indices = self._search_index("chunk", self.chunk_faiss_index, query_embed_np, min(top_k, self.chunk_faiss_index.ntotal))
             
             chunk_ids = []
             similarity_scores = []
@@ -2637,7 +2647,8 @@ class KTRetriever:
                 "chunk_contents": []
             }
 
-    def _rerank_chunks_by_relevance(self, chunk_results: Dict, question_embed: torch.Tensor, top_k: int = 10) -> Dict:
+    def _rerank_chunks_by_relevance(self, chunk_results: Dict, question_embed: torch.Tensor, top_k: int = 10,
+                                    question: str = "") -> Dict:
         """
         Rerank chunks by relevance to the question using semantic similarity
         
@@ -2645,6 +2656,7 @@ class KTRetriever:
             chunk_results: Dictionary containing chunk_ids, scores, and chunk_contents
             question_embed: Query embedding tensor
             top_k: Number of top chunks to return
+            question: Question text, used by the optional cross-encoder stage
             
         Returns:
             Reranked chunk results with updated scores
@@ -2657,26 +2669,25 @@ class KTRetriever:
             if not chunk_ids or not chunk_contents:
                 return chunk_results
             
+            pairs = list(zip(chunk_ids, chunk_contents))
+            similarities = self._chunk_similarities(question_embed, pairs)
+            
             chunk_similarities = []
-            for i, (chunk_id, content) in enumerate(zip(chunk_ids, chunk_contents)):
-                try:
-                    chunk_embed = torch.tensor(self.qa_encoder.encode(content)).float().to(self.device)
-                    
-                    similarity = F.cosine_similarity(question_embed, chunk_embed, dim=0).item()
-                    similarity = max(0.0, similarity)  # Ensure non-negative
-                    
-                    faiss_score = original_scores[i] if i < len(original_scores) else 0.0
-                    combined_score = (faiss_score + similarity) / 2.0  # Average of both scores
-                    
-                    chunk_similarities.append((chunk_id, content, combined_score, i))
-                    
-                except Exception as e:
-                    logger.error(f"Error calculating similarity for chunk {chunk_id}: {str(e)}")
-                    faiss_score = original_scores[i] if i < len(original_scores) else 0.0
+            for i, (chunk_id, content) in enumerate(pairs):
+                faiss_score = original_scores[i] if i < len(original_scores) else 0.0
+                similarity = similarities.get(i)
+                if similarity is None:
                     chunk_similarities.append((chunk_id, content, faiss_score, i))
+                    continue
+                similarity = max(0.0, similarity)  # Ensure non-negative
+                combined_score = (faiss_score + similarity) / 2.0  # Average of both scores
+                chunk_similarities.append((chunk_id, content, combined_score, i))
             
             chunk_similarities.sort(key=lambda x: x[2], reverse=True)
             
+            if self.chunk_reranker_model and question:
+                chunk_similarities = self._cross_encoder_rerank(question, chunk_similarities)
+            
             top_chunks = chunk_similarities[:top_k]
             
             reranked_chunk_ids = [chunk_id for chunk_id, _, _, _ in top_chunks]
@@ -2692,3 +2703,63 @@ class KTRetriever:
         except Exception as e:
             logger.error(f"Error in chunk reranking: {str(e)}")
             return chunk_results
+
+    def _chunk_similarities(self, question_embed: torch.Tensor, pairs: List[Tuple[str, str]]) -> Dict[int, float]:
+        """
+        Cosine similarity of the question to each (chunk_id, content), keyed by position.
+
+        Stored chunk vectors (encoded from the same chunk text by _precompute_chunk_embeddings)
+        are scored in one matmul; only chunks missing from the store are encoded, in one batch.
+        Positions whose similarity could not be computed are left out.
+        """
+        similarities = {}
+        stored_ids, scores = self.chunk_embedding_cache.cosine_similarity(
+            question_embed, [chunk_id for chunk_id, _ in pairs]
+        ) if self.chunk_embedding_cache else ([], None)
+        stored = dict(zip(stored_ids, scores.tolist())) if stored_ids else {}
+
+        missing = []
+        for i, (chunk_id, _) in enumerate(pairs):
+            if chunk_id in stored:
+                similarities[i] = stored[chunk_id]
+            else:
+                missing.append(i)
+        if missing:
+            try:
+                embeddings = torch.as_tensor(
+                    np.asarray(self.qa_encoder.encode([pairs[i][1] for i in missing]), dtype=np.float32)
+                ).to(self.device)
+                missing_scores = F.cosine_similarity(embeddings, question_embed.reshape(1, -1).to(embeddings.device), dim=1)
+                similarities.update(zip(missing, missing_scores.tolist()))
+            except Exception as e:
+                logger.error(f"Error calculating similarity for {len(missing)} chunks: {str(e)}")
+        return similarities
+
+    def _cross_encoder_rerank(self, question: str, chunk_similarities: List[Tuple]) -> List[Tuple]:
+        """
+        Second-stage rerank of (chunk_id, content, score, position) entries with the configured
+        cross-encoder. Uncached (question, chunk) pairs are scored in batches; on failure the
+        first-stage order is kept.
+        """
+        scores = {}
+        uncached = []
+        for chunk_id, content, _, _ in chunk_similarities:
+            score = self.chunk_rerank_cache.get((question, chunk_id))
+            if score is None:
+                uncached.append((chunk_id, content))
+            else:
+                scores[chunk_id] = score
+        if uncached:
+            try:
+                cross_encoder = encoder_registry.get_cross_encoder(self.chunk_reranker_model, self.device)
+                predicted = cross_encoder.predict([(question, content) for _, content in uncached],
+                                                  batch_size=self.chunk_reranker_batch_size)
+            except Exception as e:
+                logger.error(f"Cross-encoder chunk reranking failed: {str(e)}")
+                return chunk_similarities
+            for (chunk_id, _), score in zip(uncached, np.asarray(predicted, dtype=np.float32).reshape(-1).tolist()):
+                scores[chunk_id] = score
+                self.chunk_rerank_cache.put((question, chunk_id), score)
+        reranked = [(chunk_id, content, scores[chunk_id], i) for chunk_id, content, _, i in chunk_similarities]
+        reranked.sort(key=lambda x: x[2], reverse=True)
+        return reranked
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import time
@@ -10,19 +11,60 @@ import networkx as nx
 import numpy as np
 import torch
 import torch.nn.functional as F
-from sentence_transformers import SentenceTransformer
 
+from models.retriever import ann_index
+from utils import cache_manifest
+from utils import embedding_store
+from utils import encoder_registry
+from utils import graph_index
+from utils.graph_store import CompactGraph
+from utils.lru_cache import LRUCache
 from utils.logger import logger
 
+try:
+    from config import get_config
+except ImportError:
+    get_config = None
+
+INDEX_NAMES = ("node", "relation", "triple", "community")
+MEMBER_OF_RELATION = "member_of"
+# cache file prefix per index: {prefix}.index and {prefix}_map.json
+INDEX_FILES = {"node": "node", "relation": "relation", "triple": "triple", "community": "comm"}
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
 class DualFAISSRetriever:
-    def __init__(self, dataset, graph: nx.MultiDiGraph, model_name: str = "all-MiniLM-L6-v2", cache_dir: str = "retriever/faiss_cache_new", device: str = None):
+    def __init__(self, dataset, graph: nx.MultiDiGraph, model_name: str = "all-MiniLM-L6-v2", cache_dir: str = "retriever/faiss_cache_new", device: str = None, faiss_config=None):
         """
         :param graph: nx graph
         :param model_name: embedding model
         :param cache_dir: cache directory for FAISS indices
+        :param faiss_config: retrieval.faiss config (index types, nlist/nprobe/efSearch); defaults to the global config
         """
+        if faiss_config is None and get_config is not None:
+            try:
+                faiss_config = get_config().retrieval.faiss
+            except Exception:
+                faiss_config = None
+        self.faiss_config = faiss_config
+        self.index_specs = {name: ann_index.index_spec(faiss_config, name) for name in INDEX_NAMES}
+        self.ann_reports = {}
+        self.use_mmap = getattr(faiss_config, 'mmap', True)
+        # "encode": embed "head,relation,tail" texts; "compose": combine node and relation embeddings
+        self.triple_embedding_mode = str(getattr(faiss_config, 'triple_embedding', 'encode')).lower()
+        self.triple_compose_weights = tuple(getattr(faiss_config, 'triple_compose_weights', (1.0, 0.5, 1.0)))
+        self.embedding_dtype = getattr(faiss_config, 'embedding_dtype', 'float32')
+        self.incremental_update = getattr(faiss_config, 'incremental_update', True)
+        self.incremental_max_change_ratio = getattr(faiss_config, 'incremental_max_change_ratio', 0.3)
         self.graph = graph
-        self.model = SentenceTransformer(model_name)
+        # read-optimized CSR snapshot of the graph for hot retrieval paths
+        self.graph_store = CompactGraph.from_networkx(graph)
+        # label/level/schema_type/chunk id -> nodes (live for IndexedMultiDiGraph, a snapshot otherwise)
+        self.node_attributes = graph_index.node_index(graph)
+        self.model = encoder_registry.get_encoder(model_name)
+        self.model_name = model_name
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
         self.dataset = dataset
@@ -48,8 +90,27 @@ class DualFAISSRetriever:
         # Add attributes for storing embeddings and maps
         self.node_embeddings = None
         self.relation_embeddings = None
-        self.node_id_to_embedding = {}
-        self.relation_to_embedding = {}
+        # row order of node_embeddings / relation_embeddings (independent of the FAISS IDs in the maps)
+        self.node_embedding_ids = []
+        self.relation_embedding_ids = []
+        self._node_texts = None
+        self._index_state = None
+        # k-hop expansion over graph_store: hop count, per-hop degree cap (0 = none) and an LRU of results
+        self.neighbor_hops = getattr(faiss_config, 'neighbor_hops', 3)
+        self.hop_degree_cap = getattr(faiss_config, 'hop_degree_cap', 0)
+        self._khop_cache = LRUCache(getattr(faiss_config, 'neighbor_cache_size', 10000))
+        self._embedded_node_mask = None
+        self._triple_ids = {}
+        self._triple_ids_source = None
+        self._node_ids = {}
+        self._node_ids_source = None
+        # community -> member node IDs and node -> communities, from member_of edges
+        self.community_members: Dict[str, List[str]] = {}
+        self.node_communities: Dict[str, List[str]] = {}
+        self._embedded_mask_source = None
+        self._embedded_mask_size = 0
+        self.node_id_to_embedding = embedding_store.EmbeddingStore()
+        self.relation_to_embedding = embedding_store.EmbeddingStore()
         
         # Initialize map attributes to prevent AttributeError
         self.node_map = {}
@@ -57,12 +118,18 @@ class DualFAISSRetriever:
         self.triple_map = {}
         self.comm_map = {}
         
-        # FAISS caching and optimization
-        self.faiss_search_cache = {}  
+        # FAISS caching and optimization: search results of every retrieval path, keyed by
+        # (index name, graph fingerprint, float16-quantized query, k)
+        self.faiss_search_cache = LRUCache(getattr(faiss_config, 'search_cache_size', 4096),
+                                           ttl=getattr(faiss_config, 'search_cache_ttl', 0.0),
+                                           max_bytes=int(getattr(faiss_config, 'search_cache_max_mb', 64) * 1024 * 1024))
+        # content hash of the graph, validates cached artifacts through their manifests
+        self.graph_fingerprint = None
         self.index_loaded = False     
         self.gpu_resources = None     
         
-        self.node_embedding_cache = {}  # 缓存已编码的节点嵌入
+        self.node_embedding_cache = embedding_store.EmbeddingStore(device=self.device)  # 缓存已编码的节点嵌入
+        self._saved_cache_size = 0  # entries on disk, to skip rewriting an unchanged cache
         
         # Get model output dimension
         self.model_dim = self.model.get_sentence_embedding_dimension()
@@ -140,24 +207,37 @@ class DualFAISSRetriever:
         self.index_loaded = True
         logger.info("FAISS indices preloaded successfully")
 
-    def _cached_faiss_search(self, index, query_embed, top_k: int, cache_key: str):
-        if cache_key in self.faiss_search_cache:
-            return self.faiss_search_cache[cache_key]
-        
-
-        query_embed_np = query_embed.cpu().detach().numpy().reshape(1, -1)
-        D, I = index.search(query_embed_np, top_k)
-        
+    def _search_cache_key(self, name: str, query: np.ndarray, k: int) -> Tuple:
+        return name, self.graph_fingerprint, np.asarray(query, dtype=np.float16).tobytes(), k
 
-        result = (D, I)
-        self.faiss_search_cache[cache_key] = result
+    def search(self, name: str, index, query, k: int):
+        """index.search for one query vector, served from the shared search result cache when possible."""
+        if isinstance(query, torch.Tensor):
+            query = query.detach().cpu().numpy()
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        if not self.faiss_search_cache.enabled:
+            return index.search(query, k)
+        key = self._search_cache_key(name, query, k)
+        result = self.faiss_search_cache.get(key)
+        if result is None:
+            result = index.search(query, k)
+            self.faiss_search_cache.put(key, result)
+        return result
 
-        if len(self.faiss_search_cache) > 1000:
+    def cache_search_results(self, name: str, queries: np.ndarray, k: int, D: np.ndarray, I: np.ndarray):
+        """Store the rows of a batched index.search under the keys single-query ``search`` calls look up."""
+        if not self.faiss_search_cache.enabled:
+            return
+        for row, query in enumerate(queries):
+            self.faiss_search_cache.put(self._search_cache_key(name, query, k), (D[row:row + 1], I[row:row + 1]))
 
-            oldest_key = next(iter(self.faiss_search_cache))
-            del self.faiss_search_cache[oldest_key]
-        
-        return result
+    def fingerprint(self) -> str:
+        """Content fingerprint of the graph, computed once and reset by build_indices."""
+        if self.graph_fingerprint is None:
+            start_time = time.time()
+            self.graph_fingerprint = cache_manifest.graph_fingerprint(self.graph)
+            logger.info(f"Graph fingerprint {self.graph_fingerprint} computed in {time.time() - start_time:.2f}s")
+        return self.graph_fingerprint
 
     def dual_path_retrieval(self, query_emb: str, top_k: int = 10) -> Dict:
         """
@@ -211,21 +291,25 @@ class DualFAISSRetriever:
         """Collect all triples involving 3-hop neighbors of a given node."""
         if node not in self.node_id_to_embedding:
             return []
-            
-        neighbor_triples = []
-        neighbors = self._get_3hop_neighbors(node)
         
-        for neighbor in neighbors:
-            # Get outgoing edges from neighbor
-            for _, target, edge_data in self.graph.out_edges(neighbor, data=True):
-                if 'relation' in edge_data and target in self.node_id_to_embedding:
-                    neighbor_triples.append((neighbor, edge_data['relation'], target))
-            
-            # Get incoming edges to neighbor
-            for source, _, edge_data in self.graph.in_edges(neighbor, data=True):
-                if 'relation' in edge_data and source in self.node_id_to_embedding:
-                    neighbor_triples.append((source, edge_data['relation'], neighbor))
-                    
+        neighbors = self._khop_node_ids(node)
+        if not len(neighbors):
+            return []
+        
+        gs = self.graph_store
+        embedded = self._embedded_mask()
+        no_relation = gs.relations.id_of('')
+        keys, relations = gs.keys, gs.relations
+        neighbor_triples = []
+        # outgoing edges of the neighbors (target needs an embedding), then incoming ones (source needs one)
+        out_src, out_rel, out_dst = gs.out_edges_of(neighbors)
+        in_src, in_rel, in_dst = gs.in_edges_of(neighbors)
+        for src, rel, dst, keep in ((out_src, out_rel, out_dst, embedded[out_dst] & (out_rel != no_relation)),
+                                    (in_src, in_rel, in_dst, embedded[in_src] & (in_rel != no_relation))):
+            neighbor_triples.extend(
+                (keys[u], relations[r], keys[v])
+                for u, r, v in zip(src[keep].tolist(), rel[keep].tolist(), dst[keep].tolist())
+            )
         return neighbor_triples
     
     def _process_triple_index(self, idx: int) -> List[Tuple[str, str, str]]:
@@ -272,9 +356,7 @@ class DualFAISSRetriever:
             
         query_embed = self.transform_vector(query_embed)
         
-        # Create cache key and perform search
-        cache_key = f"triple_search_{hash(query_embed.cpu().numpy().tobytes())}_{top_k}"
-        D, I = self._cached_faiss_search(self.triple_index, query_embed, top_k, cache_key)
+        D, I = self.search("triple", self.triple_index, query_embed, top_k)
         
         # Collect all triples from matched indices using helper methods
         all_triples = []
@@ -307,11 +389,7 @@ class DualFAISSRetriever:
         # Apply dimension transformation
         query_embed = self.transform_vector(query_embed)
         
-        # Create cache key for this search
-        cache_key = f"comm_search_{hash(query_embed.cpu().numpy().tobytes())}_{top_k}"
-        
-        # Use cached search if available
-        D, I = self._cached_faiss_search(self.comm_index, query_embed, top_k, cache_key)
+        D, I = self.search("community", self.comm_index, query_embed, top_k)
 
         nodes = []
         for idx in I[0]:
@@ -335,99 +413,115 @@ class DualFAISSRetriever:
         
         return unique_nodes
 
+    def _embedded_mask(self) -> np.ndarray:
+        """Boolean mask over graph_store node ids: True where the node has an entry in node_id_to_embedding."""
+        store = self.node_id_to_embedding
+        if self._embedded_mask_source is not store or self._embedded_mask_size != len(store):
+            mask = np.zeros(self.graph_store.num_nodes, dtype=bool)
+            mask[self.graph_store.node_ids(store.keys())] = True
+            self._embedded_node_mask = mask
+            self._embedded_mask_source, self._embedded_mask_size = store, len(store)
+            self._khop_cache.clear()
+        return self._embedded_node_mask
+
+    def _khop_node_ids(self, center: str) -> np.ndarray:
+        """graph_store ids of the embedded nodes within neighbor_hops successor hops of ``center`` (LRU-cached)."""
+        mask = self._embedded_mask()
+        cached = self._khop_cache.get(center)
+        if cached is not None:
+            return cached
+        
+        idx = self.graph_store.node_id(center)
+        if idx < 0 or not mask[idx]:
+            logger.debug(f"Node {center} not found in graph or embedding map")
+            return np.zeros(0, dtype=np.int64)
+        
+        neighbors = self.graph_store.khop([idx], self.neighbor_hops, max_degree=self.hop_degree_cap, mask=mask)
+        self._khop_cache.put(center, neighbors)
+        return neighbors
+
     def _get_3hop_neighbors(self, center: str) -> Set[str]:
         """
-        Optimized 3-hop neighbor search using BFS with caching
+        Embedded nodes within neighbor_hops (default 3) successor hops of ``center``, center included
         """
-        # Check if center node exists in both embedding map and graph
-        if center not in self.node_id_to_embedding:
-            logger.warning(f"Warning: Node {center} not found in embedding map")
-            return set()
-        
-        if center not in self.graph.nodes:
-            logger.warning(f"Warning: Node {center} not found in graph")
-            return set()
-        
-        # Check cache first
-        cache_key = f"3hop_{center}"
-        if hasattr(self, '_3hop_cache') and cache_key in self._3hop_cache:
-            return self._3hop_cache[cache_key]
-        
-        neighbors = {center}
-        visited = {center}
-        
-        try:
-            # Use BFS for more efficient traversal
-            queue = [(center, 0)]  # (node, depth)
-            
-            while queue:
-                current_node, depth = queue.pop(0)
-                
-                if depth >= 3:
-                    continue
-                
-                # Check if current node exists in graph before getting neighbors
-                if current_node not in self.graph.nodes:
-                    logger.warning(f"Current node {current_node} not found in graph during BFS")
-                    continue
-                    
-                for neighbor in self.graph.neighbors(current_node):
-                    # Only include neighbors that exist in both graph and embedding map
-                    if neighbor in self.node_id_to_embedding and neighbor not in visited:
-                        visited.add(neighbor)
-                        neighbors.add(neighbor)
-                        if depth < 2:  # Only add to queue if we can go deeper
-                            queue.append((neighbor, depth + 1))
-                    elif neighbor not in self.node_id_to_embedding:
-                        logger.warning(f"Warning: Neighbor {neighbor} of {current_node} not found in embedding map")
-                            
-        except Exception as e:
-            logger.error(f"Error getting neighbors for node {center}: {str(e)}")
-        
-        # Cache the result
-        if not hasattr(self, '_3hop_cache'):
-            self._3hop_cache = {}
-        self._3hop_cache[cache_key] = neighbors
-        
-        # Limit cache size
-        if len(self._3hop_cache) > 10000:
-            # Simple LRU: remove oldest entries
-            oldest_keys = list(self._3hop_cache.keys())[:1000]
-            for key in oldest_keys:
-                del self._3hop_cache[key]
-        
-        return neighbors
+        keys = self.graph_store.keys
+        return {keys[i] for i in self._khop_node_ids(center).tolist()}
 
     def _get_community_nodes(self, community: str) -> List[str]:
         """
-        Get all nodes that belong to a community.
-        Communities are nodes with label 'community' and have members property.
+        Get all nodes that belong to a community (precomputed membership index).
         """
-        if community not in self.graph.nodes:
-            return []
-            
-        # Check if it's a community node
-        if self.graph.nodes[community].get('label') != 'community':
-            return []
-            
-        # Get members from the community's properties
-        if 'properties' in self.graph.nodes[community]:
-            member_names = self.graph.nodes[community]['properties'].get('members', [])
-            # Convert member names to node IDs
-            member_ids = []
-            for name in member_names:
+        return self.community_members.get(community, [])
+
+    def _build_community_membership(self):
+        """Build community -> member IDs (and the reverse) once from member_of edges, and persist it.
+
+        Communities without member_of edges fall back to resolving their ``members``
+        name list; nodes carrying a ``community_l4`` attribute are added as members too.
+        """
+        gs = self.graph_store
+        keys = gs.keys
+        members = defaultdict(list)
+        member_of = gs.relations.id_of(MEMBER_OF_RELATION)
+        if member_of >= 0:
+            edges = np.flatnonzero(gs.edge_rel == member_of)
+            # group by community, keeping edge (insertion) order inside each group
+            edges = edges[np.argsort(gs.edge_dst[edges], kind="stable")]
+            for src, dst in zip(gs.edge_src[edges].tolist(), gs.edge_dst[edges].tolist()):
+                members[keys[dst]].append(keys[src])
+
+        unresolved = 0
+        for idx in gs.nodes_with_label('community').tolist():
+            community = keys[idx]
+            if community in members:
+                continue
+            for name in gs.properties[idx].get('members', []) or []:
                 # Convert list or other types to string before checking
                 if isinstance(name, list):
                     name = ", ".join(str(item) for item in name)
                 elif not isinstance(name, str):
                     name = str(name)
-                    
                 if name in self.name_to_id:
-                    member_ids.append(self.name_to_id[name])
+                    members[community].append(self.name_to_id[name])
                 else:
-                    logger.warning(f"Warning: Member name '{name}' not found in graph nodes")
-            return member_ids
-        return []
+                    unresolved += 1
+        if unresolved:
+            logger.warning(f"Warning: {unresolved} community member names not found in graph nodes")
+
+        for node, data in self.graph.nodes(data=True):
+            community = data.get('community_l4')
+            if community is not None:
+                members[community].append(node)  # duplicates are dropped below
+
+        self._set_community_membership({c: list(dict.fromkeys(m)) for c, m in members.items() if m})
+
+        def write_members(path):
+            with open(path, 'w') as f:
+                json.dump(self.community_members, f)
+
+        try:
+            embedding_store.atomic_write(f"{self.cache_dir}/{self.dataset}/community_members.json", write_members)
+        except Exception as e:
+            logger.error(f"Error saving community membership: {e}")
+
+    def _load_community_membership(self):
+        members_path = f"{self.cache_dir}/{self.dataset}/community_members.json"
+        if os.path.exists(members_path):
+            try:
+                with open(members_path, 'r') as f:
+                    self._set_community_membership(json.load(f))
+                return
+            except Exception as e:
+                logger.warning(f"Warning: Failed to load community membership, rebuilding: {e}")
+        self._build_community_membership()
+
+    def _set_community_membership(self, community_members: Dict[str, List[str]]):
+        self.community_members = community_members
+        node_communities = defaultdict(list)
+        for community, members in community_members.items():
+            for node in members:
+                node_communities[node].append(community)
+        self.node_communities = dict(node_communities)
 
     def _calculate_node_scores(self, query_embed, nodes: List[str]) -> Dict[str, float]:
         scores = {}
@@ -440,6 +534,7 @@ class DualFAISSRetriever:
         query_tensor = self.transform_vector(query_tensor)
         
         nodes_with_embedding = []
+        nodes_cached = []
         nodes_without_embedding = []
         nodes_to_encode = []
         
@@ -447,11 +542,15 @@ class DualFAISSRetriever:
             if 'embedding' in self.graph.nodes[node]:
                 nodes_with_embedding.append(node)
             elif node in self.node_embedding_cache:
-                scores[node] = F.cosine_similarity(query_tensor, self.node_embedding_cache[node], dim=0).item()
+                nodes_cached.append(node)
             else:
                 nodes_without_embedding.append(node)
                 nodes_to_encode.append(node)
         
+        if nodes_cached:
+            cached, similarities = self.node_embedding_cache.cosine_similarity(query_tensor, nodes_cached)
+            scores.update(zip(cached, similarities.tolist()))
+        
         if nodes_with_embedding:
             embeddings = []
             for node in nodes_with_embedding:
@@ -481,7 +580,7 @@ class DualFAISSRetriever:
                 
                 for i, node in enumerate(nodes_to_encode):
                     scores[node] = similarities[i].item()
-                    self.node_embedding_cache[node] = node_embeddings[i].detach()
+                self.node_embedding_cache.add_batch(nodes_to_encode, node_embeddings)
         
         return scores
 
@@ -497,6 +596,7 @@ class DualFAISSRetriever:
 
         node_embeddings = []
         node_names = []
+        cached_nodes = []
         
         for node in nodes:
             if 'embedding' in self.graph.nodes[node]:
@@ -504,10 +604,7 @@ class DualFAISSRetriever:
                 node_embeddings.append(embed)
                 node_names.append(node)
             elif node in self.node_embedding_cache:
-                node_embeddings.append(self.node_embedding_cache[node])
-                node_names.append(node)
-            else:
-                continue
+                cached_nodes.append(node)
         
         scores = {}
         if node_embeddings:
@@ -517,6 +614,11 @@ class DualFAISSRetriever:
             for i, node in enumerate(node_names):
                 scores[node] = similarities[i].item()
         
+        if cached_nodes:
+            # one gather + matmul over the contiguous cache matrix
+            cached, similarities = self.node_embedding_cache.cosine_similarity(query_tensor, cached_nodes)
+            scores.update(zip(cached, similarities.tolist()))
+        
         nodes_to_encode = [node for node in nodes if node not in scores]
         if nodes_to_encode:
             texts = [self._get_node_text(node) for node in nodes_to_encode]
@@ -531,7 +633,7 @@ class DualFAISSRetriever:
                     
                     for i, node in enumerate(nodes_to_encode):
                         scores[node] = similarities[i].item()
-                        self.node_embedding_cache[node] = embeddings[i].detach()
+                    self.node_embedding_cache.add_batch(nodes_to_encode, embeddings)
                         
                 except Exception as e:
                     logger.warning(f"Error encoding nodes: {e}")
@@ -541,66 +643,53 @@ class DualFAISSRetriever:
         
         return scores
 
-    def clear_embedding_cache(self, max_cache_size: int = 10000):
-
-        if len(self.node_embedding_cache) > max_cache_size:
-            items_to_remove = len(self.node_embedding_cache) - max_cache_size
-            oldest_keys = list(self.node_embedding_cache.keys())[:items_to_remove]
-            for key in oldest_keys:
-                del self.node_embedding_cache[key]
-
     def save_embedding_cache(self):
-        """Save embedding cache to disk using numpy format to avoid pickle issues"""
-        cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.pt"
+        """Save embedding cache to disk as one .npy matrix plus a node ID table"""
+        cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.npy"
         try:
             if not self.node_embedding_cache:
                 return False
-                
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            if len(self.node_embedding_cache) == self._saved_cache_size and os.path.exists(cache_path):
+                return True
             
-            # Convert tensors to numpy arrays for safe serialization
-            numpy_cache = {}
-            for node, embed in self.node_embedding_cache.items():
-                if embed is not None:
-                    try:
-                        # Convert to numpy array for safer serialization
-                        if hasattr(embed, 'detach'):
-                            numpy_cache[node] = embed.detach().cpu().numpy()
-                        elif isinstance(embed, np.ndarray):
-                            numpy_cache[node] = embed
-                        else:
-                            numpy_cache[node] = np.array(embed)
-                    except Exception as e:
-                        continue
+            self.node_embedding_cache.save(cache_path, dtype=self.embedding_dtype)
+            embedding_store.share(cache_path, self.node_embedding_cache)
+            self._saved_cache_size = len(self.node_embedding_cache)
             
-            if not numpy_cache:
+            file_size = os.path.getsize(cache_path)
+            logger.info(f"Saved embedding cache with {len(self.node_embedding_cache)} entries to {cache_path} (size: {file_size} bytes)")
+            return True
+                
+        except Exception as e:
+            logger.warning(f"Failed to save embedding cache: {e}")
+            return False
+
+    def _load_embedding_cache_matrix(self) -> bool:
+        """Open node_embedding_cache.npy memory-mapped as the process-wide shared cache store, nothing is copied."""
+        cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.npy"
+        if not os.path.exists(cache_path):
+            return False
+        try:
+            store = embedding_store.open_shared(cache_path, mmap=self.use_mmap, device=self.device)
+            if not store:
+                logger.warning("Warning: Loaded cache is empty")
                 return False
             
-            # Save using torch.save with tensor format for better compatibility
-            try:
-                tensor_cache = {}
-                for node, embed_array in numpy_cache.items():
-                    if isinstance(embed_array, np.ndarray):
-                        tensor_cache[node] = torch.from_numpy(embed_array).float()
-                    else:
-                        tensor_cache[node] = embed_array
-                
-                torch.save(tensor_cache, cache_path)
-            except Exception as torch_error:
-                # Fallback to numpy format to avoid pickle tensor issues
-                cache_path_npz = cache_path.replace('.pt', '.npz')
-                np.savez_compressed(cache_path_npz, **numpy_cache)
-                cache_path = cache_path_npz
+            self.node_embedding_cache = store
+            self._saved_cache_size = len(store)
             
-            file_size = os.path.getsize(cache_path)
-            logger.info(f"Saved embedding cache with {len(numpy_cache)} entries to {cache_path} (size: {file_size} bytes)")
+            logger.info(f"Loaded embedding cache with {len(store)} entries from {cache_path} (file size: {os.path.getsize(cache_path)} bytes)")
             return True
-                
         except Exception as e:
+            logger.error(f"Error loading embedding cache matrix: {e}")
             return False
 
     def load_embedding_cache(self):
         """从磁盘加载嵌入缓存"""
+        if self._load_embedding_cache_matrix():
+            return True
+        
+        # Legacy per-node tensor dict, rewritten in the matrix format after loading
         cache_path = f"{self.cache_dir}/{self.dataset}/node_embedding_cache.pt"
         if os.path.exists(cache_path):
             try:
@@ -654,6 +743,8 @@ class DualFAISSRetriever:
                             continue
 
                 logger.info(f"Loaded embedding cache with {len(self.node_embedding_cache)} entries from {cache_path} (file size: {file_size} bytes)")
+                if self.save_embedding_cache():
+                    os.remove(cache_path)
                 return True
                 
             except Exception as e:
@@ -730,8 +821,7 @@ class DualFAISSRetriever:
             # Try batch processing first
             embeddings = self._compute_and_transform_embeddings(batch_texts)
             
-            for j, node in enumerate(valid_nodes):
-                self.node_embedding_cache[node] = embeddings[j].detach()
+            self.node_embedding_cache.add_batch(valid_nodes, embeddings)
             
             logger.info(f"Encoded batch {batch_num}/{total_batches} ({len(valid_nodes)} nodes)")
             return len(valid_nodes)
@@ -791,29 +881,48 @@ class DualFAISSRetriever:
         relation_path = f"{self.cache_dir}/{self.dataset}/relation.index"
         triple_path = f"{self.cache_dir}/{self.dataset}/triple.index"
         comm_path = f"{self.cache_dir}/{self.dataset}/comm.index"
-        node_embed_path = f"{self.cache_dir}/{self.dataset}/node_embeddings.pt"
-        relation_embed_path = f"{self.cache_dir}/{self.dataset}/relation_embeddings.pt"
+        node_embed_path = f"{self.cache_dir}/{self.dataset}/node_embeddings.npy"
+        relation_embed_path = f"{self.cache_dir}/{self.dataset}/relation_embeddings.npy"
+        legacy_node_embed_path = f"{self.cache_dir}/{self.dataset}/node_embeddings.pt"
+        legacy_relation_embed_path = f"{self.cache_dir}/{self.dataset}/relation_embeddings.pt"
         node_map_path = f"{self.cache_dir}/{self.dataset}/node_map.json"
         dim_transform_path = f"{self.cache_dir}/{self.dataset}/dim_transform.pt"
+        index_meta_path = f"{self.cache_dir}/{self.dataset}/index_meta.json"
+        index_state_path = f"{self.cache_dir}/{self.dataset}/index_state.json"
+        self.graph_fingerprint = None
+        fingerprint = self.fingerprint()
         
         all_exist = (os.path.exists(node_path) and 
                     os.path.exists(relation_path) and 
                     os.path.exists(triple_path) and 
                     os.path.exists(comm_path) and
-                    os.path.exists(node_embed_path) and
-                    os.path.exists(relation_embed_path) and
+                    (os.path.exists(node_embed_path) or os.path.exists(legacy_node_embed_path)) and
+                    (os.path.exists(relation_embed_path) or os.path.exists(legacy_relation_embed_path)) and
                     os.path.exists(node_map_path))
         
         indices_consistent = False
-        if all_exist:
+        update_plan = None
+        manifest_ok, manifest_reason = (cache_manifest.check_manifest(node_path, fingerprint, model=self.model_name)
+                                        if all_exist else (None, ""))
+        if manifest_ok and self._load_index_meta() == self._index_build_params():
+            indices_consistent = True
+            logger.info("Cached FAISS indices match the graph fingerprint")
+        elif all_exist:
+            if manifest_ok is False:
+                logger.info(f"FAISS index manifest does not match: {manifest_reason}")
             try:
                 with open(node_map_path, 'r') as f:
                     cached_node_map = json.load(f)
                 current_nodes = set(self.graph.nodes())
                 cached_nodes = set(cached_node_map.values())
                 
-                # Check graph consistency
-                graph_consistent = current_nodes == cached_nodes
+                # Check graph consistency; ID-mapped caches are diffed down to edges and node texts
+                index_state = self._load_index_state()
+                if index_state is not None:
+                    update_plan = self._plan_index_update(index_state)
+                    graph_consistent = update_plan is not None and update_plan["changes"] == 0
+                else:
+                    graph_consistent = current_nodes == cached_nodes
                 
                 # Check model dimension consistency
                 dim_consistent = True
@@ -828,16 +937,27 @@ class DualFAISSRetriever:
                         logger.warning(f"Error checking dimension transform consistency: {e}")
                         dim_consistent = False
                 
-                if graph_consistent and dim_consistent:
+                # Check ANN index configuration consistency
+                index_consistent = self._load_index_meta() == self._index_build_params()
+                
+                if graph_consistent and dim_consistent and index_consistent:
                     indices_consistent = True
                     logger.info("Cached FAISS indices are consistent with current graph and model")
+                    if update_plan is not None:
+                        # node texts and edges were diffed, so the cache can be stamped for the fast check
+                        cache_manifest.write_manifest(node_path, fingerprint, model=self.model_name)
+                elif dim_consistent and index_consistent and self._can_update_incrementally(update_plan):
+                    logger.info(f"Graph changed since the cached indices were built: {update_plan['summary']}")
                 else:
+                    update_plan = None
                     if not graph_consistent:
                         logger.info(f"Graph inconsistency detected: current nodes {len(current_nodes)}, cached nodes {len(cached_nodes)}")
                         logger.info(f"Missing in cache: {current_nodes - cached_nodes}")
                         logger.info(f"Extra in cache: {cached_nodes - current_nodes}")
                     if not dim_consistent:
                         logger.info("Model dimension inconsistency detected")
+                    if not index_consistent:
+                        logger.info("FAISS index configuration changed since the cached indices were built")
             except Exception as e:
                 logger.error(f"Error checking index consistency: {e}")
         
@@ -852,11 +972,21 @@ class DualFAISSRetriever:
                 self._precompute_node_embeddings(force_recompute=True)
             else:
                 logger.info("Successfully loaded node embedding cache from disk")
+            self._load_community_membership()
+        elif update_plan is not None and self._update_indices(update_plan):
+            logger.info("FAISS indices and embeddings updated incrementally")
+            self._populate_embedding_maps()
+            self._seed_node_embedding_cache()
+            self._build_community_membership()
+            cache_manifest.write_manifest(node_path, fingerprint, model=self.model_name)
         else:
             logger.info("Building FAISS indices and embeddings...")
+            cache_manifest.remove_manifest(node_path)
             if all_exist and not indices_consistent:
                 logger.info("Clearing inconsistent cache files...")
-                for path in [node_path, relation_path, triple_path, comm_path, node_embed_path, relation_embed_path, node_map_path, dim_transform_path]:
+                for path in [node_path, relation_path, triple_path, comm_path, node_embed_path, relation_embed_path,
+                             legacy_node_embed_path, legacy_relation_embed_path, node_map_path, dim_transform_path,
+                             index_meta_path, index_state_path, f"{self.cache_dir}/{self.dataset}/community_members.json"]:
                     if os.path.exists(path):
                         os.remove(path)
             
@@ -864,22 +994,28 @@ class DualFAISSRetriever:
             self._build_relation_index()
             self._build_triple_index()
             self._build_community_index()
+            self._build_community_membership()
             self._save_dim_transform()
+            self._save_index_meta()
+            self._save_index_state()
+            cache_manifest.write_manifest(node_path, fingerprint, model=self.model_name)
             logger.info("FAISS indices and embeddings built successfully!")
             self._populate_embedding_maps()
-            try:
-                if self.node_embeddings is not None and self.node_map:
-                    self.node_embedding_cache = {}
-                    for i_str, node_id in self.node_map.items():
-                        try:
-                            self.node_embedding_cache[node_id] = self.node_embeddings[int(i_str)].detach()
-                        except Exception:
-                            continue
-                    self.save_embedding_cache()
-            except Exception as e:
-                logger.warning(f"Warning: Failed to seed node_embedding_cache from built embeddings: {e}")
+            self._seed_node_embedding_cache()
         
         self._preload_faiss_indices()
+        self.faiss_search_cache.clear()
+
+    def _seed_node_embedding_cache(self):
+        try:
+            if self.node_embeddings is not None and self.node_embedding_ids:
+                # share node_embeddings rows; the store copies on its first write
+                self.node_embedding_cache = embedding_store.EmbeddingStore.from_matrix(
+                    self.node_embedding_ids, self.node_embeddings.detach(), device=self.device, readonly=True
+                )
+                self.save_embedding_cache()
+        except Exception as e:
+            logger.warning(f"Warning: Failed to seed node_embedding_cache from built embeddings: {e}")
 
     def _save_dim_transform(self):
         """Save dimension transform state to disk"""
@@ -947,29 +1083,97 @@ class DualFAISSRetriever:
         
         return False
 
+    def _index_build_params(self) -> Dict:
+        """Parameters that change the structure of a built index (query-time knobs excluded)."""
+        params = {}
+        for name, spec in self.index_specs.items():
+            if spec["type"] == "flat":
+                params[name] = {"type": "flat"}
+            else:
+                params[name] = {k: v for k, v in spec.items() if k not in ("nprobe", "ef_search")}
+        if self.triple_embedding_mode != "encode":
+            params["triple_embedding"] = {"mode": self.triple_embedding_mode, "weights": list(self.triple_compose_weights)}
+        return params
+
+    def _load_index_meta(self) -> Dict:
+        index_meta_path = f"{self.cache_dir}/{self.dataset}/index_meta.json"
+        if not os.path.exists(index_meta_path):
+            # Caches written before index types were configurable hold flat indices
+            return {name: {"type": "flat"} for name in INDEX_NAMES}
+        try:
+            with open(index_meta_path, 'r') as f:
+                return json.load(f).get("build_params", {})
+        except Exception as e:
+            logger.warning(f"Warning: Failed to read index metadata: {e}")
+            return {}
+
+    def _save_index_meta(self):
+        index_meta_path = f"{self.cache_dir}/{self.dataset}/index_meta.json"
+        try:
+            with open(index_meta_path, 'w') as f:
+                json.dump({"build_params": self._index_build_params(), "recall_reports": self.ann_reports}, f, indent=2)
+        except Exception as e:
+            logger.error(f"Error saving index metadata: {e}")
+
+    @staticmethod
+    def _normalized(embeddings) -> np.ndarray:
+        if isinstance(embeddings, torch.Tensor):
+            embeddings = embeddings.detach().cpu().numpy()
+        embeddings = np.array(embeddings, dtype=np.float32, order='C')
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def _create_index(self, name: str, embeddings: np.ndarray):
+        """Build the configured FAISS index over normalized embeddings and record recall vs. the flat baseline.
+
+        Row i is stored under ID i (see ann_index.build_index), so later incremental updates keep existing IDs valid.
+        """
+        embeddings = self._normalized(embeddings)
+        spec = self.index_specs[name]
+        index = ann_index.build_index(embeddings, spec, name=name, ids=np.arange(embeddings.shape[0]))
+
+        if ann_index.is_flat(index) or not getattr(self.faiss_config, 'recall_report', True):
+            return index
+        try:
+            report = ann_index.recall_report(
+                index, embeddings,
+                k=getattr(self.faiss_config, 'recall_k', 10),
+                num_queries=getattr(self.faiss_config, 'recall_queries', 200),
+            )
+            if report:
+                self.ann_reports[name] = report
+                logger.info(
+                    f"{name} index recall@{report['k']}={report['recall_at_k']:.3f}, "
+                    f"{report['ann_ms_per_query']:.3f} ms/query vs flat {report['flat_ms_per_query']:.3f} ms/query, "
+                    f"{report['bytes_per_vector']} vs {report['flat_bytes_per_vector']} bytes/vector"
+                )
+        except Exception as e:
+            logger.warning(f"Warning: Failed to compute recall report for {name} index: {e}")
+        return index
+
+    def _apply_search_params(self):
+        for name, index in (("node", getattr(self, 'node_index', None)), ("relation", getattr(self, 'relation_index', None)),
+                            ("triple", self.triple_index), ("community", self.comm_index)):
+            if index is not None:
+                ann_index.apply_search_params(index, self.index_specs[name])
+
     def _build_node_index(self):
         """Build FAISS index for all nodes and cache embeddings"""
-        nodes = list(self.graph.nodes())
-        texts = [self._get_node_text(n) for n in nodes]
-        embeddings = self.model.encode(texts, convert_to_tensor=True)
+        node_texts = self._node_text_map()
+        nodes = list(node_texts)
+        embeddings = self.model.encode([node_texts[n] for n in nodes], convert_to_tensor=True)
         
         # Store embeddings on CPU to save GPU memory
         self.node_embeddings = embeddings.cpu()
-        # Save as .pt for consistency across the codebase
-        torch.save(self.node_embeddings, f"{self.cache_dir}/{self.dataset}/node_embeddings.pt")
+        self.node_embedding_ids = nodes
+        # Flat .npy matrix plus node ID table, so later loads can memory-map it
+        embedding_store.save_embedding_matrix(f"{self.cache_dir}/{self.dataset}/node_embeddings.npy", self.node_embeddings,
+                                              ids=nodes, dtype=self.embedding_dtype)
         
         # Build FAISS index
-        embeddings_np = embeddings.cpu().numpy()
-        dim = embeddings_np.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings_np)
-        index.add(embeddings_np)
-        
-        faiss.write_index(index, f"{self.cache_dir}/{self.dataset}/node.index")
+        index = self._create_index("node", embeddings.cpu().numpy())
         self.node_map = {str(i): n for i, n in enumerate(nodes)}
-        with open(f"{self.cache_dir}/{self.dataset}/node_map.json", 'w') as f:
-            json.dump(self.node_map, f)
-            
+        self._write_index("node", index, self.node_map)
         self.node_index = index
         
     def _build_relation_index(self):
@@ -982,80 +1186,344 @@ class DualFAISSRetriever:
 
         # Store embeddings on CPU
         self.relation_embeddings = embeddings.cpu()
-        # Save as .pt for consistency across the codebase
-        torch.save(self.relation_embeddings, f"{self.cache_dir}/{self.dataset}/relation_embeddings.pt")
+        self.relation_embedding_ids = relations
+        # Flat .npy matrix plus relation table
+        embedding_store.save_embedding_matrix(f"{self.cache_dir}/{self.dataset}/relation_embeddings.npy", self.relation_embeddings,
+                                              ids=relations, dtype=self.embedding_dtype)
 
         # Build FAISS index
-        embeddings_np = embeddings.cpu().numpy()
-        dim = embeddings_np.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings_np)
-        index.add(embeddings_np)
-        
-        faiss.write_index(index, f"{self.cache_dir}/{self.dataset}/relation.index")
+        index = self._create_index("relation", embeddings.cpu().numpy())
         self.relation_map = {str(i): r for i, r in enumerate(relations)}
-        with open(f"{self.cache_dir}/{self.dataset}/relation_map.json", 'w') as f:
-            json.dump(self.relation_map, f)
-            
+        self._write_index("relation", index, self.relation_map)
         self.relation_index = index
 
+    def _graph_triples(self) -> List[Tuple[str, str, str]]:
+        return [(u, data['relation'], v) for u, v, data in self.graph.edges(data=True) if 'relation' in data]
+
+    def _triple_embeddings(self, triples: List[Tuple[str, str, str]]) -> np.ndarray:
+        embeddings = None
+        if self.triple_embedding_mode == "compose":
+            embeddings = self._compose_triple_embeddings(triples)
+        if embeddings is None:
+            embeddings = self._encode_triple_texts(triples)
+        return embeddings
+
     def _build_triple_index(self):
         """Build FAISS Triple Index"""
-        triples = []
-        for u, v, data in self.graph.edges(data=True):
-            if 'relation' in data:
-                triples.append((u, data['relation'],v))
-        
-        texts = [f"{self._get_node_text(h)},{r},{self._get_node_text(t)}" for h, r, t in triples]
-        embeddings = self.model.encode(texts)
-        
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings)
-        index.add(embeddings)
-        
-        faiss.write_index(index, f"{self.cache_dir}/{self.dataset}/triple.index")
-        with open(f"{self.cache_dir}/{self.dataset}/triple_map.json", 'w') as f:
-            json.dump({i: n for i, n in enumerate(triples)}, f)
-        
-        self.triple_index = index
+        triples = self._graph_triples()
+        index = self._create_index("triple", self._triple_embeddings(triples))
         self.triple_map = {str(i): n for i, n in enumerate(triples)}
+        self._write_index("triple", index, self.triple_map)
+        self.triple_index = index
+
+    def _encode_triple_texts(self, triples: List[Tuple[str, str, str]]) -> np.ndarray:
+        """Encode "head,relation,tail" texts, each distinct text once."""
+        node_texts = self._node_text_map()
+        text_rows = {}
+        rows = np.empty(len(triples), dtype=np.int64)
+        for i, (h, r, t) in enumerate(triples):
+            text = f"{node_texts[h]},{r},{node_texts[t]}"
+            rows[i] = text_rows.setdefault(text, len(text_rows))
+        
+        if not text_rows:
+            return np.zeros((0, self.model_dim), dtype=np.float32)
+        logger.info(f"Encoding {len(text_rows)} distinct triple texts for {len(triples)} triples")
+        return np.asarray(self.model.encode(list(text_rows)), dtype=np.float32)[rows]
+
+    def _compose_triple_embeddings(self, triples: List[Tuple[str, str, str]]):
+        """Triple vectors as a weighted sum of normalized head, relation and tail embeddings (no encoder calls)."""
+        if self.node_embeddings is None or self.relation_embeddings is None or not self.node_embedding_ids or not self.relation_embedding_ids:
+            logger.warning("Node/relation embeddings unavailable, encoding triple texts instead")
+            return None
+        
+        node_row = {node: row for row, node in enumerate(self.node_embedding_ids)}
+        relation_row = {rel: row for row, rel in enumerate(self.relation_embedding_ids)}
+        try:
+            heads = np.fromiter((node_row[h] for h, _, _ in triples), dtype=np.int64, count=len(triples))
+            rels = np.fromiter((relation_row[r] for _, r, _ in triples), dtype=np.int64, count=len(triples))
+            tails = np.fromiter((node_row[t] for _, _, t in triples), dtype=np.int64, count=len(triples))
+        except KeyError as e:
+            logger.warning(f"Triple endpoint or relation {e} has no embedding, encoding triple texts instead")
+            return None
+        
+        def normalized(matrix):
+            matrix = np.asarray(matrix.detach().cpu().numpy() if hasattr(matrix, 'detach') else matrix, dtype=np.float32)
+            return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        
+        node_matrix = normalized(self.node_embeddings)
+        relation_matrix = normalized(self.relation_embeddings)
+        w_head, w_rel, w_tail = self.triple_compose_weights
+        logger.info(f"Composing {len(triples)} triple embeddings from node and relation embeddings")
+        return w_head * node_matrix[heads] + w_rel * relation_matrix[rels] + w_tail * node_matrix[tails]
+
+    def _community_texts(self) -> Dict[str, str]:
+        """Text representation of every community node that has a name or description."""
+        texts = {}
+        for comm in self.node_attributes.nodes_with_label('community'):
+            data = self.graph.nodes[comm]
+            if 'properties' not in data:
+                continue
+            name = data['properties'].get('name', '')
+            description = data['properties'].get('description', '')
+            if name or description:  # Only include if it has name or description
+                texts[comm] = f"{name},{description}".strip()
+        return texts
 
     def _build_community_index(self):
         """Build FAISS Community Index"""
-        communities = {
-            n for n, d in self.graph.nodes(data=True) 
-            if d.get('label') == 'community'
-        }
-        
-        texts = []
-        valid_communities = []
-        for comm in communities:
-            # Get community text representation
-            data = self.graph.nodes[comm]
-            if 'properties' in data:
-                name = data['properties'].get('name', '')
-                description = data['properties'].get('description', '')
-                if name or description:  # Only include if it has name or description
-                    texts.append(f"{name},{description}".strip())
-                    valid_communities.append(comm)
-        
-        if not valid_communities:
+        comm_texts = self._community_texts()
+        if not comm_texts:
             return
-            
-        embeddings = self.model.encode(texts)
         
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings)
-        index.add(embeddings)
-        
-        faiss.write_index(index, f"{self.cache_dir}/{self.dataset}/comm.index")
-        with open(f"{self.cache_dir}/{self.dataset}/comm_map.json", 'w') as f:
-            json.dump({i: n for i, n in enumerate(valid_communities)}, f)
+        valid_communities = list(comm_texts)
+        embeddings = self.model.encode([comm_texts[c] for c in valid_communities])
         
-        self.comm_index = index
+        index = self._create_index("community", embeddings)
         self.comm_map = {str(i): n for i, n in enumerate(valid_communities)}
+        self._write_index("community", index, self.comm_map)
+        self.comm_index = index
+
+    def _write_index(self, name: str, index, index_map: Dict):
+        """Atomically replace {prefix}.index and {prefix}_map.json."""
+        prefix = INDEX_FILES[name]
+        embedding_store.atomic_write(f"{self.cache_dir}/{self.dataset}/{prefix}.index", lambda path: faiss.write_index(index, path))
+
+        def write_map(path):
+            with open(path, 'w') as f:
+                json.dump(index_map, f)
+
+        embedding_store.atomic_write(f"{self.cache_dir}/{self.dataset}/{prefix}_map.json", write_map)
+
+    def _node_text_map(self) -> Dict[str, str]:
+        """_get_node_text for every graph node, computed once per retriever."""
+        if self._node_texts is None:
+            self._node_texts = {node: self._get_node_text(node) for node in self.graph.nodes()}
+        return self._node_texts
+
+    def _load_index_state(self):
+        """Stable-ID bookkeeping of the cached indices; None for legacy caches or an interrupted update."""
+        index_state_path = f"{self.cache_dir}/{self.dataset}/index_state.json"
+        if not os.path.exists(index_state_path):
+            return None
+        try:
+            with open(index_state_path, 'r') as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.warning(f"Warning: Failed to read index state: {e}")
+            return None
+        if state.get("dirty"):
+            logger.warning("Cached FAISS indices were left mid-update, they will be rebuilt")
+            return None
+        return state
+
+    def _save_index_state(self, dirty: bool = False):
+        """Record the next free FAISS ID per index and per-node/community text hashes for change detection."""
+        index_state_path = f"{self.cache_dir}/{self.dataset}/index_state.json"
+        maps = {"node": self.node_map, "relation": self.relation_map, "triple": self.triple_map, "community": self.comm_map}
+        state = {
+            "dirty": dirty,
+            "next_id": {name: max((int(k) for k in maps[name]), default=-1) + 1 for name in INDEX_NAMES},
+            "node_text": {node: _text_hash(text) for node, text in self._node_text_map().items()},
+            "comm_text": {comm: _text_hash(text) for comm, text in self._community_texts().items()},
+        }
+        if not dirty and self._index_state:
+            # IDs are never reused, even after the items holding the highest IDs were removed
+            for name, next_id in self._index_state["next_id"].items():
+                state["next_id"][name] = max(state["next_id"].get(name, 0), next_id)
+
+        def write_state(path):
+            with open(path, 'w') as f:
+                json.dump(state, f)
+
+        try:
+            embedding_store.atomic_write(index_state_path, write_state)
+            self._index_state = state
+        except Exception as e:
+            logger.error(f"Error saving index state: {e}")
+
+    @staticmethod
+    def _diff_index_map(cached_map: Dict, current_items: List, changed: Set, next_id: int) -> Dict:
+        """Plan the update of one ID-mapped index from its cached {id: item} map to ``current_items``.
+
+        Unchanged items keep their ID, items in ``changed`` keep their ID but are
+        re-embedded, new items get fresh IDs and vanished items are removed.
+        Duplicate items (parallel edges) are matched one to one.
+        """
+        ids_by_item = defaultdict(list)
+        for key, item in cached_map.items():
+            ids_by_item[tuple(item) if isinstance(item, list) else item].append(int(key))
+        new_map, remove_ids, add_ids, add_items = {}, [], [], []
+        for item in current_items:
+            ids = ids_by_item.get(item)
+            if ids:
+                item_id = ids.pop()
+                if item in changed:
+                    remove_ids.append(item_id)
+                    add_ids.append(item_id)
+                    add_items.append(item)
+            else:
+                item_id = next_id
+                next_id += 1
+                add_ids.append(item_id)
+                add_items.append(item)
+            new_map[str(item_id)] = item
+        for ids in ids_by_item.values():
+            remove_ids.extend(ids)
+        return {"map": new_map, "remove_ids": remove_ids, "add_ids": add_ids, "add_items": add_items,
+                "size": len(current_items), "next_id": next_id}
+
+    def _plan_index_update(self, index_state: Dict):
+        """Diff the current graph against the cached maps and text hashes; None if the cache cannot be diffed."""
+        try:
+            cached_maps = {}
+            for name in INDEX_NAMES:
+                map_path = f"{self.cache_dir}/{self.dataset}/{INDEX_FILES[name]}_map.json"
+                if os.path.exists(map_path):
+                    with open(map_path, 'r') as f:
+                        cached_maps[name] = json.load(f)
+                else:
+                    cached_maps[name] = {}
+
+            node_texts = self._node_text_map()
+            cached_node_text = index_state.get("node_text", {})
+            changed_nodes = {n for n, text in node_texts.items() if n in cached_node_text and cached_node_text[n] != _text_hash(text)}
+            comm_texts = self._community_texts()
+            cached_comm_text = index_state.get("comm_text", {})
+            changed_comms = {c for c, text in comm_texts.items() if c in cached_comm_text and cached_comm_text[c] != _text_hash(text)}
+
+            triples = self._graph_triples()
+            changed_triples = {t for t in triples if t[0] in changed_nodes or t[2] in changed_nodes}
+            relations = sorted({r for _, r, _ in triples})
+
+            next_id = index_state.get("next_id", {})
+            plan = {
+                "node": self._diff_index_map(cached_maps["node"], list(node_texts), changed_nodes, next_id.get("node", 0)),
+                "relation": self._diff_index_map(cached_maps["relation"], relations, set(), next_id.get("relation", 0)),
+                "triple": self._diff_index_map(cached_maps["triple"], triples, changed_triples, next_id.get("triple", 0)),
+                "community": self._diff_index_map(cached_maps["community"], list(comm_texts), changed_comms, next_id.get("community", 0)),
+            }
+        except Exception as e:
+            logger.warning(f"Warning: Failed to diff graph against cached indices: {e}")
+            return None
+
+        plan["changes"] = sum(len(plan[name]["remove_ids"]) + len(plan[name]["add_ids"]) for name in INDEX_NAMES)
+        plan["summary"] = ", ".join(
+            f"{name} -{len(plan[name]['remove_ids'])}/+{len(plan[name]['add_ids'])}" for name in INDEX_NAMES
+        )
+        return plan
+
+    def _can_update_incrementally(self, plan) -> bool:
+        if not self.incremental_update or plan is None:
+            return False
+        total = sum(plan[name]["size"] for name in INDEX_NAMES)
+        ratio = plan["changes"] / max(total, 1)
+        if ratio > self.incremental_max_change_ratio:
+            # IVF centroids and PQ codebooks trained on the old data stop fitting after large edits
+            logger.info(f"Graph change ratio {ratio:.2f} exceeds {self.incremental_max_change_ratio}, rebuilding indices")
+            return False
+        return True
+
+    def _update_indices(self, plan: Dict) -> bool:
+        """Apply an incremental update plan: re-embed only changed items and add/remove them by stable ID."""
+        start_time = time.time()
+        self._index_state = None
+        self._save_index_state(dirty=True)
+        cache_manifest.remove_manifest(f"{self.cache_dir}/{self.dataset}/node.index")
+        try:
+            indices = {}
+            for name in INDEX_NAMES:
+                index_path = f"{self.cache_dir}/{self.dataset}/{INDEX_FILES[name]}.index"
+                if not os.path.exists(index_path):
+                    if plan[name]["size"]:
+                        logger.info(f"No cached {name} index to update, rebuilding all indices")
+                        return False
+                    continue
+                indices[name] = ann_index.read_index(index_path, mmap=False)
+                if not ann_index.is_id_mapped(indices[name]):
+                    logger.info(f"Cached {name} index has no stable IDs, rebuilding all indices")
+                    return False
+
+            # Node and relation embedding matrices first: compose-mode triples are built from them
+            node_ids, node_matrix = self._load_embedding_matrix("node_embeddings")
+            relation_ids, relation_matrix = self._load_embedding_matrix("relation_embeddings")
+            if node_ids is None or relation_ids is None:
+                logger.info("Cached embedding matrices have no ID tables, rebuilding all indices")
+                return False
+            node_texts = self._node_text_map()
+            node_store = self._updated_embedding_store(node_ids, node_matrix, plan["node"], lambda nodes: [node_texts[n] for n in nodes])
+            relation_store = self._updated_embedding_store(relation_ids, relation_matrix, plan["relation"], list)
+            self.node_embedding_ids, self.node_embeddings = node_store.ids, node_store.matrix
+            self.relation_embedding_ids, self.relation_embeddings = relation_store.ids, relation_store.matrix
+
+            comm_texts = self._community_texts()
+            embed_fns = {
+                "node": lambda items: node_store.take(items)[1],
+                "relation": lambda items: relation_store.take(items)[1],
+                "triple": self._triple_embeddings,
+                "community": lambda items: self.model.encode([comm_texts[c] for c in items]),
+            }
+            for name in INDEX_NAMES:
+                step = plan[name]
+                if name not in indices:
+                    continue
+                add_embeddings = self._normalized(embed_fns[name](step["add_items"])) if step["add_items"] else None
+                indices[name] = ann_index.update_index(
+                    indices[name], self.index_specs[name], step["remove_ids"], add_embeddings, step["add_ids"], name=name
+                )
+                ann_index.apply_search_params(indices[name], self.index_specs[name])
+                self._write_index(name, indices[name], step["map"])
+
+            embedding_store.save_embedding_matrix(f"{self.cache_dir}/{self.dataset}/node_embeddings.npy", self.node_embeddings,
+                                                  ids=self.node_embedding_ids, dtype=self.embedding_dtype)
+            embedding_store.save_embedding_matrix(f"{self.cache_dir}/{self.dataset}/relation_embeddings.npy", self.relation_embeddings,
+                                                  ids=self.relation_embedding_ids, dtype=self.embedding_dtype)
+        except Exception as e:
+            logger.error(f"Error updating FAISS indices incrementally, rebuilding: {e}")
+            return False
+
+        self.node_index, self.node_map = indices.get("node"), plan["node"]["map"]
+        self.relation_index, self.relation_map = indices.get("relation"), plan["relation"]["map"]
+        self.triple_index, self.triple_map = indices.get("triple"), plan["triple"]["map"]
+        self.comm_index, self.comm_map = indices.get("community"), plan["community"]["map"]
+        self._load_dim_transform()
+        self._index_state = {"next_id": {name: plan[name]["next_id"] for name in INDEX_NAMES}}
+        self._save_index_state()
+        logger.info(f"Updated FAISS indices ({plan['summary']}) in {time.time() - start_time:.2f}s")
+        return True
+
+    def _updated_embedding_store(self, ids: List[str], matrix: torch.Tensor, step: Dict, texts_fn) -> embedding_store.EmbeddingStore:
+        """Cached embedding matrix with vanished rows dropped and added/changed items (re-)encoded."""
+        store = embedding_store.EmbeddingStore.from_matrix(ids, matrix, readonly=True)
+        current = set(step["map"].values())
+        store.retain([i for i in ids if i in current])
+        if step["add_items"]:
+            store.add_batch(step["add_items"], self.model.encode(texts_fn(step["add_items"]), convert_to_tensor=True).cpu())
+        return store
+
+    def _load_embedding_matrix(self, name: str):
+        """Open {name}.npy memory-mapped, migrating a legacy {name}.pt tensor file on first use.
+
+        Returns (row IDs or None for matrices saved without an ID table, tensor); (None, None) if missing.
+        """
+        npy_path = f"{self.cache_dir}/{self.dataset}/{name}.npy"
+        legacy_path = f"{self.cache_dir}/{self.dataset}/{name}.pt"
+        try:
+            if not os.path.exists(npy_path) and os.path.exists(legacy_path):
+                # 兼容PyTorch 2.6+的weights_only参数
+                try:
+                    tensor = torch.load(legacy_path, map_location='cpu', weights_only=False)
+                except TypeError:
+                    tensor = torch.load(legacy_path, map_location='cpu')
+                embedding_store.save_embedding_matrix(npy_path, tensor.float(), dtype=self.embedding_dtype)
+                os.remove(legacy_path)
+                logger.info(f"Migrated {legacy_path} to {npy_path}")
+            if not os.path.exists(npy_path):
+                return None, None
+            ids, matrix = embedding_store.load_embedding_matrix(npy_path, mmap=self.use_mmap)
+            return ids, embedding_store.as_tensor(matrix)
+        except Exception as e:
+            logger.warning(f"Warning: Failed to load {name}: {e}")
+            return None, None
 
     def _load_indices(self):
         logger.info("Starting _load_indices...")
@@ -1063,57 +1531,42 @@ class DualFAISSRetriever:
         comm_path = f"{self.cache_dir}/{self.dataset}/comm.index"
         node_path = f"{self.cache_dir}/{self.dataset}/node.index"
         relation_path = f"{self.cache_dir}/{self.dataset}/relation.index"
-        node_embed_path = f"{self.cache_dir}/{self.dataset}/node_embeddings.pt"
-        relation_embed_path = f"{self.cache_dir}/{self.dataset}/relation_embeddings.pt"
         
         logger.debug(f"Checking cache files...")
         logger.debug(f"node_path exists: {os.path.exists(node_path)}")
         logger.debug(f"relation_path exists: {os.path.exists(relation_path)}")
         logger.debug(f"triple_path exists: {os.path.exists(triple_path)}")
         logger.debug(f"comm_path exists: {os.path.exists(comm_path)}")
-        logger.debug(f"node_embed_path exists: {os.path.exists(node_embed_path)}")
-        logger.debug(f"relation_embed_path exists: {os.path.exists(relation_embed_path)}")
         
         if os.path.exists(node_path):
             logger.debug("Loading node index...")
-            self.node_index = faiss.read_index(node_path)
+            self.node_index = ann_index.read_index(node_path, mmap=self.use_mmap)
             with open(f"{self.cache_dir}/{self.dataset}/node_map.json", 'r') as f:
                 self.node_map = json.load(f)
                 
         if os.path.exists(relation_path):
-            self.relation_index = faiss.read_index(relation_path)
+            self.relation_index = ann_index.read_index(relation_path, mmap=self.use_mmap)
             with open(f"{self.cache_dir}/{self.dataset}/relation_map.json", 'r') as f:
                 self.relation_map = json.load(f)
         
         if os.path.exists(triple_path):
-            self.triple_index = faiss.read_index(triple_path)
+            self.triple_index = ann_index.read_index(triple_path, mmap=self.use_mmap)
             with open(f"{self.cache_dir}/{self.dataset}/triple_map.json", 'r') as f:
                 self.triple_map = json.load(f)
                 
         if os.path.exists(comm_path):
-            self.comm_index = faiss.read_index(comm_path)
+            self.comm_index = ann_index.read_index(comm_path, mmap=self.use_mmap)
             with open(f"{self.cache_dir}/{self.dataset}/comm_map.json", 'r') as f:
                 self.comm_map = json.load(f)
 
-        if os.path.exists(node_embed_path):
-            try:
-                # 兼容PyTorch 2.6+的weights_only参数
-                try:
-                    self.node_embeddings = torch.load(node_embed_path, weights_only=False)
-                except TypeError:
-                    self.node_embeddings = torch.load(node_embed_path)
-            except Exception as e:
-                logger.warning(f"Warning: Failed to load node embeddings: {e}")
-                
-        if os.path.exists(relation_embed_path):
-            try:
-                # 兼容PyTorch 2.6+的weights_only参数
-                try:
-                    self.relation_embeddings = torch.load(relation_embed_path, weights_only=False)
-                except TypeError:
-                    self.relation_embeddings = torch.load(relation_embed_path)
-            except Exception as e:
-                logger.warning(f"Warning: Failed to load relation embeddings: {e}")
+        node_ids, self.node_embeddings = self._load_embedding_matrix("node_embeddings")
+        relation_ids, self.relation_embeddings = self._load_embedding_matrix("relation_embeddings")
+        # matrices written without an ID table follow the (dense) map order
+        self.node_embedding_ids = node_ids or [self.node_map[str(i)] for i in range(len(self.node_map))]
+        self.relation_embedding_ids = relation_ids or [self.relation_map[str(i)] for i in range(len(self.relation_map))]
+
+        # Query-time knobs follow the current config rather than the values saved with the index
+        self._apply_search_params()
 
         # Load dimension transform if available
         self._load_dim_transform()
@@ -1128,13 +1581,16 @@ class DualFAISSRetriever:
 
     def _populate_embedding_maps(self):
         """Populate the node_id and relation to embedding maps."""
-        if self.node_map and self.node_embeddings is not None:
-            for i_str, node_id in self.node_map.items():
-                self.node_id_to_embedding[node_id] = self.node_embeddings[int(i_str)]
+        # Views over node_embeddings / relation_embeddings, no per-ID tensors
+        if self.node_embedding_ids and self.node_embeddings is not None:
+            self.node_id_to_embedding = embedding_store.EmbeddingStore.from_matrix(
+                self.node_embedding_ids, self.node_embeddings, readonly=True
+            )
         
-        if self.relation_map and self.relation_embeddings is not None:
-            for i_str, rel in self.relation_map.items():
-                self.relation_to_embedding[rel] = self.relation_embeddings[int(i_str)]
+        if self.relation_embedding_ids and self.relation_embeddings is not None:
+            self.relation_to_embedding = embedding_store.EmbeddingStore.from_matrix(
+                self.relation_embedding_ids, self.relation_embeddings, readonly=True
+            )
         
         # Verify data consistency
         self._verify_data_consistency()
@@ -1237,19 +1693,21 @@ class DualFAISSRetriever:
         """Get entities and keywords that belong to a community."""
         entities, keywords = [], []
         
-        for node_id, node_data in self.graph.nodes(data=True):
-            if node_data.get('community_l4') == community_node:
-                name, description = self._extract_node_info(node_data)
-                if not name:
-                    continue
-                    
-                formatted_text = self._format_node_text(name, description)
-                node_type = node_data.get('level')
+        for node_id in self._get_community_nodes(community_node):
+            if node_id not in self.graph.nodes:
+                continue
+            node_data = self.graph.nodes[node_id]
+            name, description = self._extract_node_info(node_data)
+            if not name:
+                continue
                 
-                if node_type == 2:  # Entity
-                    entities.append(formatted_text)
-                elif node_type == 1:  # Keyword
-                    keywords.append(formatted_text)
+            formatted_text = self._format_node_text(name, description)
+            node_type = node_data.get('level')
+            
+            if node_type == 2:  # Entity
+                entities.append(formatted_text)
+            elif node_type == 1:  # Keyword
+                keywords.append(formatted_text)
         
         return entities, keywords
     
@@ -1357,16 +1815,12 @@ class DualFAISSRetriever:
         
         # Transform query embedding for FAISS search
         query_embed = self.transform_vector(query_embed)
-        query_embed_np = query_embed.cpu().detach().numpy().reshape(1, -1)
+        # copy: normalize_L2 works in place and the tensor is shared with the other retrieval paths
+        query_embed_np = query_embed.cpu().detach().numpy().reshape(1, -1).copy()
         
         # Normalize query embedding for FAISS search
         faiss.normalize_L2(query_embed_np)
         
-        # Create a set of input triples for fast lookup
-        input_triples_set = set(triples)
-        logger.debug(f"Input triples set size: {len(input_triples_set)}")
-        logger.debug(f"First few input triples: {list(input_triples_set)[:3]}")
-        
         # Check if triple_index exists and is valid
         if not hasattr(self, 'triple_index') or self.triple_index is None:
             logger.debug("triple_index is None or doesn't exist")
@@ -1376,36 +1830,22 @@ class DualFAISSRetriever:
             logger.debug(f"Using fallback method, returning {len(scored_triples)} triples")
             return scored_triples[:top_k]
         logger.debug(f"triple_index exists, size: {self.triple_index.ntotal}")
-        # Use FAISS to search for similar triples in the index
+        # Score exactly the candidates: look up their index IDs, fetch their vectors and take one matmul
         try:
-            # Search for top similar triples in the index
-            search_k = min(len(triples) * 2, 50)  # Search more than needed to get good matches
-            logger.debug(f"Searching for {search_k} similar triples")
-            D, I = self.triple_index.search(query_embed_np, search_k)
-            # Process results from FAISS search
-            for i, (distance, idx) in enumerate(zip(D[0], I[0])):
-                if idx >= 0:  # Valid index
-                    try:
-                        # Get the triple from the index
-                        indexed_triple = self.triple_map[str(idx)]
-                        h, r, t = indexed_triple  # This is (head, tail, relation) format
-                        # Check if this triple is in our input triples
-                        if (h, r, t) in input_triples_set:
-                            # Convert distance to similarity score (FAISS returns distances, we need similarities)
-                            # For normalized vectors, similarity = 1 - distance^2 / 2
-                            # similarity_score = 1.0 - (distance ** 2) / 2.0
-                            # bug fixing since D already returns similarity in IndexFlatIP
-                            similarity_score = distance
-                            # Only keep triples above threshold
-                            if similarity_score >= threshold:
-                                scored_triples.append((h, r, t, similarity_score))  # Return as (head, tail, relation, score)
-                            else:
-                                logger.debug(f"Triple ({h}, {t}, {r}) below threshold {threshold}")
-                                
-                    except (KeyError, ValueError) as e:
-                        logger.error(f"Warning: Error processing indexed triple {idx}: {str(e)}")
-                        continue
+            triple_ids = self._triple_id_lookup()
+            candidates = [triple for triple in dict.fromkeys(triples) if triple in triple_ids]
+            if candidates:
+                ids = np.fromiter((triple_ids[triple] for triple in candidates), dtype=np.int64, count=len(candidates))
+                vectors = ann_index.reconstruct_batch(self.triple_index, ids)
+                scores = vectors @ query_embed_np[0]
+                for (h, r, t), similarity_score in zip(candidates, scores.tolist()):
+                    # Only keep triples above threshold
+                    if similarity_score >= threshold:
+                        scored_triples.append((h, r, t, similarity_score))
+                    else:
+                        logger.debug(f"Triple ({h}, {t}, {r}) below threshold {threshold}")
         except Exception as e:
+            logger.warning(f"Warning: Direct triple scoring failed, using default scores: {e}")
             for h, r, t in triples:
                 scored_triples.append((h, r, t, 0.5))  # Default score
         
@@ -1418,6 +1858,37 @@ class DualFAISSRetriever:
         result = scored_triples[:top_k]
         return result
 
+    def _node_id_lookup(self) -> Dict[str, int]:
+        """node ID -> node index ID, rebuilt whenever node_map is replaced."""
+        if self._node_ids_source is not self.node_map:
+            self._node_ids = {node: int(key) for key, node in self.node_map.items()}
+            self._node_ids_source = self.node_map
+        return self._node_ids
+
+    def search_nodes_in(self, query_embed, nodes: List[str], top_k: int) -> List[str]:
+        """Top-k nodes by similarity to ``query_embed`` among ``nodes`` only, searched inside the node index."""
+        node_ids = self._node_id_lookup()
+        ids = np.fromiter((node_ids[n] for n in nodes if n in node_ids), dtype=np.int64)
+        if not len(ids) or getattr(self, 'node_index', None) is None:
+            return []
+        if isinstance(query_embed, torch.Tensor):
+            query_embed = query_embed.to(self.device)
+        else:
+            query_embed = torch.FloatTensor(query_embed).to(self.device)
+        query = self.transform_vector(query_embed).detach().cpu().numpy()
+        _, I = ann_index.search_subset(self.node_index, query, top_k, ids)
+        return [self.node_map[str(idx)] for idx in I[0] if idx >= 0 and str(idx) in self.node_map]
+
+    def _triple_id_lookup(self) -> Dict[Tuple[str, str, str], int]:
+        """(head, relation, tail) -> triple index ID, rebuilt whenever triple_map is replaced."""
+        if self._triple_ids_source is not self.triple_map:
+            triple_ids = {}
+            for key, triple in self.triple_map.items():
+                # parallel edges share one vector, the first ID is enough
+                triple_ids.setdefault(tuple(triple), int(key))
+            self._triple_ids, self._triple_ids_source = triple_ids, self.triple_map
+        return self._triple_ids
+
     def __del__(self):
         try:
             if hasattr(self, 'node_embedding_cache') and self.node_embedding_cache:
@@ -0,0 +1,154 @@
+"""
+Request-scoped DAG of retrieval stages on a shared, long-lived executor.
+
+A ``RetrievalPipeline`` is built per request: each stage names the stages whose
+results it consumes, and a stage is dispatched as soon as all of them have
+finished, so independent searches overlap without nested thread pools. The
+thread calling ``run`` executes ready stages itself while it waits, which keeps
+requests making progress even when every executor worker is busy (for example
+with other requests blocked in ``run``). Per-stage wall time is recorded in
+``timings`` and logged once per run.
+
+``shared_executor`` hands out the process-wide pool the pipelines run on, so
+retrievers created per request do not each start (and leak) their own threads.
+"""
+
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import logger
+
+__all__ = ["RetrievalPipeline", "shared_executor"]
+
+_executors_lock = threading.Lock()
+_executors: Dict[int, concurrent.futures.ThreadPoolExecutor] = {}
+
+
+def shared_executor(max_workers: int) -> concurrent.futures.ThreadPoolExecutor:
+    """Return the process-wide retrieval pool with ``max_workers`` threads, creating it on first use."""
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                             thread_name_prefix="kt-retrieval")
+            _executors[max_workers] = executor
+        return executor
+
+
+class _Stage:
+    __slots__ = ("name", "fn", "deps", "dependents", "waiting", "result", "error", "skipped")
+
+    def __init__(self, name: str, fn: Callable, deps: tuple):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+        self.dependents: List["_Stage"] = []
+        self.waiting = len(deps)
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.skipped = False
+
+
+class RetrievalPipeline:
+    """Stages ``fn(*dependency results)`` run once their dependencies are done; ``run`` returns name -> result."""
+
+    def __init__(self, executor: Optional[concurrent.futures.Executor], name: str = "retrieval"):
+        self.executor = executor
+        self.name = name
+        self.timings: Dict[str, float] = {}
+        self._stages: Dict[str, _Stage] = {}
+        self._ready = deque()
+        self._remaining = 0
+        self._cond = threading.Condition()
+
+    def add(self, name: str, fn: Callable, *deps: str) -> "RetrievalPipeline":
+        """Add stage ``name``; ``fn`` is called with the results of ``deps`` in order. Dependencies must be added first."""
+        if name in self._stages:
+            raise ValueError(f"duplicate pipeline stage: {name}")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"stage {name} depends on unknown stages: {missing}")
+        stage = _Stage(name, fn, deps)
+        for dep in deps:
+            self._stages[dep].dependents.append(stage)
+        self._stages[name] = stage
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results; re-raises the first (in stage order) stage failure."""
+        start_time = time.time()
+        with self._cond:
+            self._remaining = len(self._stages)
+            for stage in self._stages.values():
+                if not stage.deps:
+                    self._dispatch(stage)
+        while True:
+            with self._cond:
+                while not self._ready and self._remaining:
+                    self._cond.wait()
+                if not self._remaining:
+                    break
+                stage = self._ready.popleft()
+            self._execute(stage)
+
+        self._log(time.time() - start_time)
+        for stage in self._stages.values():
+            if stage.error is not None:
+                raise stage.error
+        return {name: stage.result for name, stage in self._stages.items()}
+
+    def _dispatch(self, stage: _Stage) -> None:
+        # caller holds self._cond; whichever thread pops the stage first runs it
+        self._ready.append(stage)
+        self._cond.notify_all()
+        if self.executor is not None:
+            try:
+                self.executor.submit(self._run_next)
+            except RuntimeError:  # executor shut down: the thread in run() picks the stage up
+                pass
+
+    def _run_next(self) -> None:
+        with self._cond:
+            if not self._ready:
+                return
+            stage = self._ready.popleft()
+        self._execute(stage)
+
+    def _execute(self, stage: _Stage) -> None:
+        start_time = time.time()
+        try:
+            stage.result = stage.fn(*(self._stages[dep].result for dep in stage.deps))
+        except Exception as e:
+            stage.error = e
+            logger.error(f"Pipeline {self.name}: stage {stage.name} failed: {e}")
+        elapsed = time.time() - start_time
+        with self._cond:
+            self.timings[stage.name] = elapsed
+            self._finish(stage)
+
+    def _finish(self, stage: _Stage) -> None:
+        # caller holds self._cond; dependents of failed or skipped stages are skipped too
+        pending = [stage]
+        while pending:
+            done = pending.pop()
+            self._remaining -= 1
+            for dependent in done.dependents:
+                if done.error is not None or done.skipped:
+                    dependent.skipped = True
+                dependent.waiting -= 1
+                if dependent.waiting == 0:
+                    if dependent.skipped:
+                        pending.append(dependent)
+                    else:
+                        self._dispatch(dependent)
+        self._cond.notify_all()
+
+    def _log(self, total: float) -> None:
+        stages = " ".join(f"{name}={elapsed:.4f}" for name, elapsed in self.timings.items())
+        logger.info(f"[StepTiming] pipeline={self.name} total={total:.4f} {stages}")
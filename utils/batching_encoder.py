@@ -0,0 +1,106 @@
+"""
+Micro-batching front end for a sentence encoder.
+
+Concurrent retrieval requests each embed a single query string. ``BatchingEncoder``
+holds such calls for up to ``max_wait_ms`` milliseconds (or until
+``max_batch_size`` are waiting) and runs them through the wrapped encoder as one
+``encode(list)`` call, so under concurrent traffic the model sees batches
+instead of single rows. A lone caller pays at most the wait window.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from utils.logger import logger
+
+__all__ = ["BatchingEncoder"]
+
+
+class BatchingEncoder:
+    """``encode(text)`` for one string, served from micro-batches on a background thread.
+
+    ``max_wait_ms`` <= 0 or ``max_batch_size`` <= 1 disables batching and calls
+    the encoder directly.
+    """
+
+    def __init__(self, encoder: Any, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.encoder = encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+        self.requests = 0
+        self.batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_wait > 0 and self.max_batch_size > 1 and not self._closed
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embedding row of ``text`` (float32)."""
+        if not self.enabled:
+            return np.asarray(self.encoder.encode(text), dtype=np.float32)
+        future = Future()
+        with self._cond:
+            queued = not self._closed  # close() may have run since the check above
+            if queued:
+                self._pending.append((text, future))
+                self.requests += 1
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                    self._worker.start()
+                self._cond.notify_all()
+        if not queued:
+            return np.asarray(self.encoder.encode(text), dtype=np.float32)
+        return future.result()
+
+    def close(self) -> None:
+        """Stop the batching thread after it has served the queued requests."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            # collect more requests until the window closes or the batch is full
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # closed and drained
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                rows = np.asarray(self.encoder.encode(texts), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Batched query encoding failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            row_of = {text: i for i, text in enumerate(texts)}
+            for text, future in batch:
+                future.set_result(rows[row_of[text]])
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0}
@@ -0,0 +1,110 @@
+"""
+Content fingerprints for cache validation.
+
+A fingerprint is an order-independent hash over every node (ID and
+attributes) and edge (endpoints and attributes) of a graph, so renaming a
+node or editing a description changes it even when the node set stays the
+same. Each cached artifact gets a small ``<artifact>.manifest.json`` holding
+the fingerprint it was built from; validating a cache is then a comparison
+of two short strings instead of rebuilding and diffing ID sets.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Iterable, Optional, Tuple
+
+from utils.embedding_store import atomic_write
+
+MANIFEST_VERSION = 1
+_MASK = (1 << 64) - 1
+
+
+def _item_hash(item) -> int:
+    payload = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _combine(kind: str, count: int, total: int) -> str:
+    return f"{kind}:{count}:{total:016x}"
+
+
+def items_fingerprint(items: Iterable) -> str:
+    """Fingerprint of an unordered collection of JSON-serializable items (e.g. ``dict.items()``)."""
+    count, total = 0, 0
+    for item in items:
+        total = (total + _item_hash(item)) & _MASK
+        count += 1
+    return hashlib.blake2b(_combine("items", count, total).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def graph_fingerprint(graph) -> str:
+    """Fingerprint of a networkx graph's nodes, node attributes, edges and edge attributes."""
+    node_count, node_total = 0, 0
+    for node, data in graph.nodes(data=True):
+        node_total = (node_total + _item_hash([node, data])) & _MASK
+        node_count += 1
+    edge_count, edge_total = 0, 0
+    for u, v, data in graph.edges(data=True):
+        edge_total = (edge_total + _item_hash([u, v, data])) & _MASK
+        edge_count += 1
+    digest = f"{_combine('nodes', node_count, node_total)}|{_combine('edges', edge_count, edge_total)}"
+    return hashlib.blake2b(digest.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def manifest_path(artifact_path: str) -> str:
+    return f"{artifact_path}.manifest.json"
+
+
+def write_manifest(artifact_path: str, fingerprint: str, model: Optional[str] = None) -> None:
+    """Record the fingerprint (and embedding model, for vector artifacts) ``artifact_path`` was built from."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "fingerprint": fingerprint,
+        "model": model,
+        "artifact_size": os.path.getsize(artifact_path),
+        "created": time.time(),
+    }
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    atomic_write(manifest_path(artifact_path), write)
+
+
+def remove_manifest(artifact_path: str) -> None:
+    """Drop the manifest before rewriting an artifact, so an interrupted write is never trusted."""
+    path = manifest_path(artifact_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def check_manifest(artifact_path: str, fingerprint: str, model: Optional[str] = None) -> Tuple[Optional[bool], str]:
+    """(True, "") if the artifact's manifest matches, (False, reason) if the artifact is stale.
+
+    (None, reason) means the manifest cannot decide: there is none (caches
+    written before manifests existed), or the artifact was rewritten after
+    it, e.g. by a writer that appends entries without re-stamping. Callers
+    fall back to their full consistency check in that case.
+    """
+    path = manifest_path(artifact_path)
+    if not os.path.exists(path):
+        return None, "no manifest"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return False, f"unreadable manifest ({e})"
+    if manifest.get("version") != MANIFEST_VERSION:
+        return False, f"manifest version {manifest.get('version')}"
+    if manifest.get("fingerprint") != fingerprint:
+        return False, "graph content changed"
+    if manifest.get("model") != model:
+        return False, f"embedding model changed ({manifest.get('model')} -> {model})"
+    if not os.path.exists(artifact_path):
+        return False, "artifact missing"
+    if os.path.getsize(artifact_path) != manifest.get("artifact_size"):
+        return None, "artifact was rewritten after its manifest"
+    return True, ""
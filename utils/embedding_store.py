@@ -0,0 +1,307 @@
+"""
+On-disk embedding matrices.
+
+Embeddings are stored as a flat ``.npy`` matrix (float32 or float16) plus an
+optional ``<name>_ids.json`` table mapping row -> ID. Matrices are opened with
+``np.load(mmap_mode='r')`` so cold start does not read the whole file and
+several processes share the same page-cache pages.
+"""
+
+import json
+import os
+import threading
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+def ids_path_for(matrix_path: str) -> str:
+    root, _ = os.path.splitext(matrix_path)
+    return f"{root}_ids.json"
+
+
+def atomic_write(path: str, write_fn) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_embedding_matrix(path: str, matrix, ids: Optional[Sequence[str]] = None, dtype: str = "float32") -> None:
+    """Write ``matrix`` to ``path`` (.npy) and, if given, the row ID table next to it."""
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+    if isinstance(matrix, torch.Tensor):
+        matrix = matrix.detach().cpu().numpy()
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if ids is not None and len(ids) != matrix.shape[0]:
+        raise ValueError(f"ID table has {len(ids)} entries but matrix has {matrix.shape[0]} rows")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write_matrix(tmp_path):
+        # np.save appends .npy to paths without the suffix, so write through a file handle
+        with open(tmp_path, "wb") as f:
+            np.save(f, matrix)
+
+    atomic_write(path, write_matrix)
+
+    if ids is not None:
+        def write_ids(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(ids), f, ensure_ascii=False)
+
+        atomic_write(ids_path_for(path), write_ids)
+
+
+def load_embedding_matrix(path: str, mmap: bool = True) -> Tuple[Optional[List[str]], np.ndarray]:
+    """Open a matrix written by save_embedding_matrix; returns (ids or None, matrix)."""
+    matrix = np.load(path, mmap_mode="r" if mmap else None)
+    ids = None
+    ids_path = ids_path_for(path)
+    if os.path.exists(ids_path):
+        with open(ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"{ids_path} has {len(ids)} entries but {path} has {matrix.shape[0]} rows")
+    return ids, matrix
+
+
+def as_tensor(matrix: np.ndarray) -> torch.Tensor:
+    """Float32 torch view of a (possibly memory-mapped) matrix.
+
+    float32 matrices are wrapped without copying; torch warns about read-only
+    buffers, which is fine because the retrievers never write into them.
+    float16 matrices are upcast, which materializes them in memory.
+    """
+    if matrix.dtype != np.float32:
+        return torch.from_numpy(np.asarray(matrix, dtype=np.float32))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.from_numpy(matrix)
+
+
+class EmbeddingStore:
+    """Embeddings for many IDs held in one contiguous (N, dim) tensor plus an ID -> row index.
+
+    Supports the mapping operations the retrievers used on their per-ID dicts
+    (``in``, ``[]``, assignment, ``del``, ``keys``/``items``) while keeping the
+    vectors in a single matrix, so scoring is a fancy-indexed slice and one
+    matmul instead of stacking a list of tensors per query. Values returned by
+    ``[]`` are row views. A store wrapping a memory-mapped matrix copies it into
+    owned memory on the first write.
+
+    Stores are shared between retrievers and threads: writers hold ``_lock`` and
+    publish new IDs only after their rows are written, and readers take the
+    (row index, matrix) pair under the same lock so they never pair a row with a
+    matrix that does not hold it yet.
+    """
+
+    def __init__(self, device="cpu", dtype: torch.dtype = torch.float32):
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[torch.Tensor] = None
+        self._readonly = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_matrix(cls, ids: Sequence[str], matrix, device="cpu", readonly: bool = False) -> "EmbeddingStore":
+        """Wrap an existing matrix without copying it (rows follow ``ids``)."""
+        if isinstance(matrix, np.ndarray):
+            matrix = as_tensor(matrix)
+        store = cls(device=device, dtype=matrix.dtype if matrix.is_floating_point() else torch.float32)
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"{len(ids)} IDs for a matrix with {matrix.shape[0]} rows")
+        store._matrix = matrix.to(store.device)
+        store._ids = list(ids)
+        store._rows = {node_id: row for row, node_id in enumerate(store._ids)}
+        # a memory-mapped CPU matrix must never be written through
+        store._readonly = readonly and store._matrix.data_ptr() == matrix.data_ptr()
+        return store
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, device="cpu") -> "EmbeddingStore":
+        ids, matrix = load_embedding_matrix(path, mmap=mmap)
+        if ids is None:
+            raise ValueError(f"{path} has no ID table")
+        return cls.from_matrix(ids, matrix, device=device, readonly=mmap)
+
+    def save(self, path: str, dtype: str = "float32") -> None:
+        save_embedding_matrix(path, self.matrix, ids=self._ids, dtype=dtype)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def matrix(self) -> torch.Tensor:
+        """(len(self), dim) view of the stored vectors, row i belonging to ``self.ids[i]``."""
+        with self._lock:
+            if self._matrix is None:
+                return torch.empty((0, 0), dtype=self.dtype, device=self.device)
+            return self._matrix[:len(self._ids)]
+
+    @property
+    def ids(self) -> List[str]:
+        return self._ids
+
+    def _writable_matrix(self, rows: int, dim: int) -> torch.Tensor:
+        """A matrix with room for ``rows`` rows holding the current vectors: the stored one if it is
+        large enough and writable, else a grown copy that the caller publishes after writing to it."""
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match store dimension {self._matrix.shape[1]}")
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity and not self._readonly:
+            return self._matrix
+        new_capacity = max(rows, capacity * 2 if rows > capacity else capacity, 64)
+        grown = torch.empty((new_capacity, dim), dtype=self.dtype, device=self.device)
+        if self._ids:
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        return grown
+
+    def __setitem__(self, node_id: str, embedding) -> None:
+        self.add_batch([node_id], embedding.reshape(1, -1) if hasattr(embedding, 'reshape') else [embedding])
+
+    def add_batch(self, ids: Sequence[str], embeddings) -> None:
+        """Insert or overwrite vectors for ``ids`` (rows of ``embeddings``) in one copy."""
+        if not len(ids):
+            return
+        if not isinstance(embeddings, torch.Tensor):
+            embeddings = torch.as_tensor(np.asarray(embeddings, dtype=np.float32))
+        embeddings = embeddings.detach().to(device=self.device, dtype=self.dtype)
+        if embeddings.dim() == 1:
+            embeddings = embeddings.unsqueeze(0)
+
+        with self._lock:
+            new_ids = [node_id for node_id in dict.fromkeys(ids) if node_id not in self._rows]
+            new_rows = {node_id: len(self._ids) + i for i, node_id in enumerate(new_ids)}
+            matrix = self._writable_matrix(len(self._ids) + len(new_ids), embeddings.shape[1])
+            rows = [self._rows[node_id] if node_id in self._rows else new_rows[node_id] for node_id in ids]
+            matrix[torch.as_tensor(rows, dtype=torch.long, device=self.device)] = embeddings
+            # publish the written matrix first, then the IDs that point into it
+            self._matrix = matrix
+            self._readonly = False
+            self._ids.extend(new_ids)
+            self._rows.update(new_rows)
+
+    def __getitem__(self, node_id: str) -> torch.Tensor:
+        with self._lock:
+            return self._matrix[self._rows[node_id]]
+
+    def get(self, node_id: str, default=None):
+        with self._lock:
+            row = self._rows.get(node_id)
+            return default if row is None else self._matrix[row]
+
+    def __contains__(self, node_id) -> bool:
+        return node_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __bool__(self) -> bool:
+        return bool(self._ids)
+
+    def __iter__(self):
+        return iter(list(self._ids))
+
+    def keys(self) -> List[str]:
+        return list(self._ids)
+
+    def items(self):
+        with self._lock:
+            ids, matrix = list(self._ids), self._matrix
+        for row, node_id in enumerate(ids):
+            yield node_id, matrix[row]
+
+    def __delitem__(self, node_id: str) -> None:
+        self.retain([i for i in self._ids if i != node_id])
+
+    def retain(self, ids: Sequence[str]) -> None:
+        """Keep only ``ids`` (in that order), compacting the matrix."""
+        with self._lock:
+            keep = [i for i in dict.fromkeys(ids) if i in self._rows]
+            rows = torch.as_tensor([self._rows[i] for i in keep], dtype=torch.long, device=self.device)
+            self._matrix = self._matrix[rows].clone() if keep else None
+            self._ids = keep
+            self._rows = {node_id: row for row, node_id in enumerate(keep)}
+            self._readonly = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids = []
+            self._rows = {}
+            self._matrix = None
+            self._readonly = False
+
+    def rows_for(self, ids: Sequence[str]) -> Tuple[List[str], List[int]]:
+        """IDs present in the store and their row numbers, in input order."""
+        found, rows = [], []
+        for node_id in ids:
+            row = self._rows.get(node_id)
+            if row is not None:
+                found.append(node_id)
+                rows.append(row)
+        return found, rows
+
+    def take(self, ids: Sequence[str]) -> Tuple[List[str], torch.Tensor]:
+        """(found IDs, their vectors as one (k, dim) tensor); missing IDs are skipped."""
+        with self._lock:
+            found, rows = self.rows_for(ids)
+            matrix = self._matrix
+        if not rows:
+            return [], torch.empty((0, self.dim or 0), dtype=self.dtype, device=self.device)
+        return found, matrix[torch.as_tensor(rows, dtype=torch.long, device=self.device)]
+
+    def cosine_similarity(self, query: torch.Tensor, ids: Sequence[str]) -> Tuple[List[str], torch.Tensor]:
+        """Cosine similarity of ``query`` against the stored vectors of ``ids`` in one matmul."""
+        found, vectors = self.take(ids)
+        if not found:
+            return [], torch.empty(0, device=self.device)
+        query = query.to(device=vectors.device, dtype=vectors.dtype).reshape(-1)
+        norms = vectors.norm(dim=1).clamp_min(1e-8) * query.norm().clamp_min(1e-8)
+        return found, (vectors @ query) / norms
+
+
+_shared_lock = threading.Lock()
+_shared_stores: Dict[Tuple[str, str], Tuple[Tuple[int, int], "EmbeddingStore"]] = {}
+
+
+def _shared_key(path: str, device) -> Tuple[str, str]:
+    return os.path.abspath(path), str(torch.device(device))
+
+
+def _file_version(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def open_shared(path: str, mmap: bool = True, device="cpu") -> EmbeddingStore:
+    """Process-wide store for a cache file: every caller opening the same file gets the same instance.
+
+    The instance is reloaded only when the file changed on disk since it was opened or shared.
+    """
+    key = _shared_key(path, device)
+    with _shared_lock:
+        version = _file_version(path)
+        entry = _shared_stores.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        store = EmbeddingStore.load(path, mmap=mmap, device=device)
+        _shared_stores[key] = (version, store)
+        return store
+
+
+def share(path: str, store: EmbeddingStore) -> None:
+    """Register ``store`` as the shared instance for ``path`` (call after saving it there)."""
+    with _shared_lock:
+        _shared_stores[_shared_key(path, store.device)] = (_file_version(path), store)
@@ -0,0 +1,62 @@
+"""
+Process-wide registry of sentence encoders.
+
+KTRetriever, DualFAISSRetriever and FastTreeComm all ask for the configured
+SentenceTransformer; loading it once per process instead of once per object
+keeps a single copy of the weights in memory. Optional cross-encoder rerankers
+are shared the same way, as is the micro-batching front end of each encoder.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from utils.batching_encoder import BatchingEncoder
+from utils.logger import logger
+
+_lock = threading.Lock()
+_encoders: Dict[Tuple[str, Optional[str]], SentenceTransformer] = {}
+_cross_encoders: Dict[Tuple[str, Optional[str]], CrossEncoder] = {}
+# keyed by id(encoder); the BatchingEncoder keeps the encoder alive, so ids are not reused
+_batching_encoders: Dict[int, BatchingEncoder] = {}
+
+
+def get_encoder(model_name: str, device: Optional[str] = None) -> SentenceTransformer:
+    """Return the shared encoder for ``model_name``, loading it on first use."""
+    key = (model_name, str(device) if device is not None else None)
+    with _lock:
+        encoder = _encoders.get(key)
+        if encoder is None:
+            logger.info(f"Loading sentence encoder {model_name}")
+            encoder = SentenceTransformer(model_name, device=device) if device is not None else SentenceTransformer(model_name)
+            _encoders[key] = encoder
+        return encoder
+
+
+def register_encoder(model_name: str, encoder: SentenceTransformer, device: Optional[str] = None) -> None:
+    """Make a caller-provided encoder the shared instance for ``model_name``."""
+    with _lock:
+        _encoders.setdefault((model_name, str(device) if device is not None else None), encoder)
+
+
+def get_cross_encoder(model_name: str, device: Optional[str] = None) -> CrossEncoder:
+    """Return the shared cross-encoder for ``model_name``, loading it on first use."""
+    key = (model_name, str(device) if device is not None else None)
+    with _lock:
+        encoder = _cross_encoders.get(key)
+        if encoder is None:
+            logger.info(f"Loading cross-encoder {model_name}")
+            encoder = CrossEncoder(model_name, device=device) if device is not None else CrossEncoder(model_name)
+            _cross_encoders[key] = encoder
+        return encoder
+
+
+def get_batching_encoder(encoder, max_batch_size: int = 32, max_wait_ms: float = 2.0) -> BatchingEncoder:
+    """Return the shared ``BatchingEncoder`` in front of ``encoder``; the first caller's settings win."""
+    with _lock:
+        batching = _batching_encoders.get(id(encoder))
+        if batching is None:
+            batching = BatchingEncoder(encoder, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            _batching_encoders[id(encoder)] = batching
+        return batching
@@ -0,0 +1,185 @@
+"""
+Secondary node indexes for networkx graphs.
+
+``NodeAttributeIndex`` maps label, level, schema type and chunk id values to
+the nodes carrying them, so subset queries ("all communities", "level-2
+nodes", "entities of these schema types") are dictionary lookups instead of
+``graph.nodes(data=True)`` scans. ``IndexedMultiDiGraph`` keeps one up to date
+through add_node/add_nodes_from/add_edge/add_edges_from/remove_node/
+remove_nodes_from/clear. Attribute edits made in place through
+``graph.nodes[n]`` bypass networkx; callers that change an indexed attribute
+that way call ``reindex_node``.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import networkx as nx
+
+__all__ = ["INDEXED_FIELDS", "NodeAttributeIndex", "IndexedMultiDiGraph", "node_index"]
+
+INDEXED_FIELDS = ("label", "level", "schema_type", "chunk_id")
+
+
+def _hashable(value: Any) -> Optional[Hashable]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return str(value)
+    return value
+
+
+def indexed_values(data: Dict[str, Any]) -> Tuple:
+    """(label, level, schema_type, chunk_id) of a node's attribute dict; missing values are None."""
+    props = data.get('properties')
+    if not isinstance(props, dict):
+        props = data
+    level = data.get('level')
+    try:
+        level = int(level) if level is not None else None
+    except (TypeError, ValueError):
+        level = _hashable(level)
+    return (_hashable(data.get('label')), level, _hashable(props.get('schema_type')), _hashable(props.get('chunk id')))
+
+
+class NodeAttributeIndex:
+    """Value -> nodes maps for the INDEXED_FIELDS; each bucket keeps node insertion order."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Dict[Hashable, Dict[Hashable, None]]] = {
+            field: defaultdict(dict) for field in INDEXED_FIELDS
+        }
+        self._values: Dict[Hashable, Tuple] = {}
+
+    @classmethod
+    def from_graph(cls, graph: nx.Graph) -> "NodeAttributeIndex":
+        index = cls()
+        for node, data in graph.nodes(data=True):
+            index.add(node, data)
+        return index
+
+    def add(self, node: Hashable, data: Dict[str, Any]) -> None:
+        """Index ``node`` (re-indexing it if it was already present)."""
+        values = indexed_values(data)
+        old = self._values.get(node)
+        if old == values:
+            return
+        if old is not None:
+            self.remove(node)
+        self._values[node] = values
+        for field, value in zip(INDEXED_FIELDS, values):
+            self._buckets[field][value][node] = None
+
+    def remove(self, node: Hashable) -> None:
+        values = self._values.pop(node, None)
+        if values is None:
+            return
+        for field, value in zip(INDEXED_FIELDS, values):
+            bucket = self._buckets[field].get(value)
+            if bucket is not None:
+                bucket.pop(node, None)
+                if not bucket:
+                    del self._buckets[field][value]
+
+    def clear(self) -> None:
+        for buckets in self._buckets.values():
+            buckets.clear()
+        self._values.clear()
+
+    def __contains__(self, node) -> bool:
+        return node in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def value(self, node: Hashable, field: str) -> Any:
+        values = self._values.get(node)
+        return None if values is None else values[INDEXED_FIELDS.index(field)]
+
+    def nodes_with(self, field: str, value: Any) -> List[Hashable]:
+        return list(self._buckets[field].get(_hashable(value), ()))
+
+    def nodes_with_label(self, label: str) -> List[Hashable]:
+        return self.nodes_with('label', label)
+
+    def nodes_with_level(self, level: int) -> List[Hashable]:
+        return self.nodes_with('level', level)
+
+    def nodes_with_schema_type(self, schema_types: Iterable[str]) -> List[Hashable]:
+        buckets = self._buckets['schema_type']
+        nodes: Dict[Hashable, None] = {}
+        for schema_type in schema_types:
+            nodes.update(buckets.get(_hashable(schema_type), {}))
+        return list(nodes)
+
+    def nodes_with_chunk_id(self, chunk_id: str) -> List[Hashable]:
+        return self.nodes_with('chunk_id', chunk_id)
+
+    def values(self, field: str) -> List[Any]:
+        """Distinct non-missing values of ``field``."""
+        return [value for value in self._buckets[field] if value is not None]
+
+
+class IndexedMultiDiGraph(nx.MultiDiGraph):
+    """MultiDiGraph whose ``attribute_index`` follows node additions and removals."""
+
+    def __init__(self, incoming_graph_data=None, multigraph_input=None, **attr):
+        # set before networkx populates the graph from incoming_graph_data
+        self.attribute_index = NodeAttributeIndex()
+        super().__init__(incoming_graph_data, multigraph_input=multigraph_input, **attr)
+        if incoming_graph_data is not None:
+            # conversion from another graph fills self._node directly
+            for node, data in self._node.items():
+                self.attribute_index.add(node, data)
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self.attribute_index.add(node_for_adding, self._node[node_for_adding])
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        nodes = list(nodes_for_adding)
+        super().add_nodes_from(nodes, **attr)
+        for n in nodes:
+            try:
+                node = n if n in self._node else n[0]
+            except TypeError:  # (node, attr dict) pairs are unhashable
+                node = n[0]
+            self.attribute_index.add(node, self._node[node])
+
+    def add_edge(self, u_for_edge, v_for_edge, key=None, **attr):
+        # MultiGraph.add_edges_from routes through add_edge, so this also covers it
+        new_nodes = [n for n in (u_for_edge, v_for_edge) if n not in self._node]
+        key = super().add_edge(u_for_edge, v_for_edge, key, **attr)
+        for node in new_nodes:
+            self.attribute_index.add(node, self._node[node])
+        return key
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self.attribute_index.remove(n)
+
+    def remove_nodes_from(self, nodes):
+        nodes = list(nodes)
+        super().remove_nodes_from(nodes)
+        for n in nodes:
+            self.attribute_index.remove(n)
+
+    def clear(self):
+        super().clear()
+        self.attribute_index.clear()
+
+    def reindex_node(self, n) -> None:
+        """Refresh the index entry of ``n`` after its attributes were edited in place."""
+        self.attribute_index.add(n, self._node[n])
+
+
+def node_index(graph: nx.Graph) -> NodeAttributeIndex:
+    """The live index of an IndexedMultiDiGraph, or a snapshot index built from any other graph."""
+    index = getattr(graph, 'attribute_index', None)
+    if isinstance(index, NodeAttributeIndex):
+        return index
+    return NodeAttributeIndex.from_graph(graph)
@@ -1,6 +1,7 @@
 import networkx as nx
 import json
 
+from utils.graph_index import IndexedMultiDiGraph
 from utils.logger import logger
 
 
@@ -23,7 +24,7 @@ def load_graph_from_json(input_path: str) -> nx.MultiDiGraph:
         }
     ]
     """
-    graph = nx.MultiDiGraph()
+    graph = IndexedMultiDiGraph()
     
     with open(input_path, 'r', encoding='utf-8') as f:
         relationships = json.load(f)
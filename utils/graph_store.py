@@ -0,0 +1,453 @@
+"""
+Compact, read-optimized graph store.
+
+A snapshot of a networkx MultiDiGraph laid out as flat NumPy arrays:
+interned string tables for node keys, names, labels, relations, schema types
+and chunk ids; integer node IDs; CSR out/in adjacency with parallel relation-ID
+arrays; and columnar node attributes. ``NetworkXView`` exposes the subset of
+the networkx read API used across the codebase so callers can migrate
+gradually.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+__all__ = ["StringTable", "CompactGraph", "NetworkXView"]
+
+
+def _to_str(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return value if isinstance(value, str) else str(value)
+
+
+class StringTable:
+    """Interned string table: each distinct string is stored once and addressed by an int id."""
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self._strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for s in strings:
+            self.intern(s)
+
+    def intern(self, s: str) -> int:
+        idx = self._ids.get(s)
+        if idx is None:
+            idx = len(self._strings)
+            self._ids[s] = idx
+            self._strings.append(s)
+        return idx
+
+    def id_of(self, s: str, default: int = -1) -> int:
+        return self._ids.get(s, default)
+
+    def __getitem__(self, idx: int) -> str:
+        return self._strings[idx]
+
+    def __contains__(self, s: str) -> bool:
+        return s in self._ids
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._strings)
+
+
+class CompactGraph:
+    """Immutable array-backed directed multigraph.
+
+    Node ``i`` has outgoing edges ``out_indices[out_indptr[i]:out_indptr[i+1]]``
+    with relation ids in the same slice of ``out_rel`` (and symmetrically for
+    incoming edges). Edge ``e`` in COO form is ``(edge_src[e], edge_rel[e], edge_dst[e])``;
+    ``out_eid``/``in_eid`` map CSR positions back to edge ids.
+    """
+
+    NO_VALUE = -1
+
+    def __init__(self):
+        self.keys = StringTable()
+        self.names = StringTable()
+        self.labels = StringTable()
+        self.relations = StringTable()
+        self.schema_types = StringTable()
+        self.chunk_ids = StringTable()
+
+        self.name_id = np.zeros(0, dtype=np.int32)
+        self.label_id = np.zeros(0, dtype=np.int16)
+        self.level = np.zeros(0, dtype=np.int8)
+        self.schema_type_id = np.zeros(0, dtype=np.int32)
+        self.chunk_id = np.zeros(0, dtype=np.int32)
+        # cold storage for the adapter: references to the original property dicts (not copied)
+        self.properties: List[Dict[str, Any]] = []
+
+        self.edge_src = np.zeros(0, dtype=np.int32)
+        self.edge_dst = np.zeros(0, dtype=np.int32)
+        self.edge_rel = np.zeros(0, dtype=np.int32)
+
+        self.out_indptr = np.zeros(1, dtype=np.int64)
+        self.out_indices = np.zeros(0, dtype=np.int32)
+        self.out_rel = np.zeros(0, dtype=np.int32)
+        self.out_eid = np.zeros(0, dtype=np.int64)
+        self.in_indptr = np.zeros(1, dtype=np.int64)
+        self.in_indices = np.zeros(0, dtype=np.int32)
+        self.in_rel = np.zeros(0, dtype=np.int32)
+        self.in_eid = np.zeros(0, dtype=np.int64)
+        # per direction, CSR positions with each node's run ordered by relation id (built on first use)
+        self._by_relation: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_networkx(cls, graph: nx.MultiDiGraph) -> "CompactGraph":
+        store = cls()
+        n = graph.number_of_nodes()
+        store.name_id = np.empty(n, dtype=np.int32)
+        store.label_id = np.empty(n, dtype=np.int16)
+        store.level = np.empty(n, dtype=np.int8)
+        store.schema_type_id = np.full(n, cls.NO_VALUE, dtype=np.int32)
+        store.chunk_id = np.full(n, cls.NO_VALUE, dtype=np.int32)
+
+        for i, (node, data) in enumerate(graph.nodes(data=True)):
+            store.keys.intern(node)
+            props = data.get('properties')
+            if not isinstance(props, dict):
+                props = data
+            store.properties.append(props)
+            store.name_id[i] = store.names.intern(_to_str(props.get('name', '') or ''))
+            store.label_id[i] = store.labels.intern(_to_str(data.get('label', '')))
+            store.level[i] = int(data.get('level', 0) or 0)
+            schema_type = props.get('schema_type')
+            if schema_type:
+                store.schema_type_id[i] = store.schema_types.intern(_to_str(schema_type))
+            chunk = props.get('chunk id')
+            if chunk:
+                store.chunk_id[i] = store.chunk_ids.intern(_to_str(chunk))
+
+        src, dst, rel = [], [], []
+        key_ids = store.keys._ids
+        for u, v, data in graph.edges(data=True):
+            src.append(key_ids[u])
+            dst.append(key_ids[v])
+            rel.append(store.relations.intern(_to_str(data.get('relation', ''))))
+        store.edge_src = np.asarray(src, dtype=np.int32)
+        store.edge_dst = np.asarray(dst, dtype=np.int32)
+        store.edge_rel = np.asarray(rel, dtype=np.int32)
+
+        store.out_indptr, store.out_eid = cls._csr(store.edge_src, n)
+        store.out_indices = store.edge_dst[store.out_eid]
+        store.out_rel = store.edge_rel[store.out_eid]
+        store.in_indptr, store.in_eid = cls._csr(store.edge_dst, n)
+        store.in_indices = store.edge_src[store.in_eid]
+        store.in_rel = store.edge_rel[store.in_eid]
+        return store
+
+    @staticmethod
+    def _csr(rows: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, order
+
+    # ----- sizes / ids -----
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.keys)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.edge_src)
+
+    def node_id(self, key: Hashable) -> int:
+        return self.keys.id_of(key)
+
+    def node_ids(self, keys: Iterable[Hashable]) -> np.ndarray:
+        ids = self.keys._ids
+        return np.fromiter((ids[k] for k in keys if k in ids), dtype=np.int64)
+
+    def node_key(self, idx: int) -> str:
+        return self.keys[idx]
+
+    def node_name(self, idx: int) -> str:
+        return self.names[self.name_id[idx]]
+
+    # ----- adjacency -----
+
+    def successors(self, idx: int) -> np.ndarray:
+        return self.out_indices[self.out_indptr[idx]:self.out_indptr[idx + 1]]
+
+    def predecessors(self, idx: int) -> np.ndarray:
+        return self.in_indices[self.in_indptr[idx]:self.in_indptr[idx + 1]]
+
+    def out_edges(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.out_indptr[idx], self.out_indptr[idx + 1]
+        return self.out_indices[lo:hi], self.out_rel[lo:hi]
+
+    def in_edges(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.in_indptr[idx], self.in_indptr[idx + 1]
+        return self.in_indices[lo:hi], self.in_rel[lo:hi]
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.out_indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.diff(self.in_indptr)
+
+    def degree(self) -> np.ndarray:
+        return self.out_degree() + self.in_degree()
+
+    @staticmethod
+    def _gather(indptr: np.ndarray, nodes: np.ndarray, max_degree: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """CSR positions of the edges of ``nodes`` and the node each position belongs to.
+
+        With ``max_degree`` > 0 only the first ``max_degree`` edges of each node are taken.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = indptr[nodes]
+        counts = indptr[nodes + 1] - starts
+        if max_degree > 0:
+            counts = np.minimum(counts, max_degree)
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        # position = start of the node's run + offset inside the run
+        run_begin = np.cumsum(counts) - counts
+        positions = np.repeat(starts - run_begin, counts) + np.arange(total)
+        return positions, np.repeat(nodes, counts)
+
+    def out_edges_of(self, nodes: np.ndarray, max_degree: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(src, rel, dst) arrays of all outgoing edges of ``nodes``."""
+        positions, owners = self._gather(self.out_indptr, nodes, max_degree)
+        return owners, self.out_rel[positions], self.out_indices[positions]
+
+    def in_edges_of(self, nodes: np.ndarray, max_degree: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(src, rel, dst) arrays of all incoming edges of ``nodes``."""
+        positions, owners = self._gather(self.in_indptr, nodes, max_degree)
+        return self.in_indices[positions], self.in_rel[positions], owners
+
+    def _relation_sorted(self, direction: str) -> np.ndarray:
+        order = self._by_relation.get(direction)
+        if order is None:
+            indptr, rel = (self.out_indptr, self.out_rel) if direction == "out" else (self.in_indptr, self.in_rel)
+            owners = np.repeat(np.arange(self.num_nodes), np.diff(indptr))
+            # node runs keep their indptr offsets; inside a run positions are sorted by relation
+            order = np.lexsort((rel, owners))
+            self._by_relation[direction] = order
+        return order
+
+    def _edges_with_relations(self, direction: str, nodes: np.ndarray, rel_ids: np.ndarray) -> np.ndarray:
+        """Edge ids of ``nodes``' edges in ``direction`` whose relation id is in ``rel_ids``: the (node, relation) index."""
+        indptr, rel, eid = ((self.out_indptr, self.out_rel, self.out_eid) if direction == "out"
+                            else (self.in_indptr, self.in_rel, self.in_eid))
+        order = self._relation_sorted(direction)
+        found = []
+        for node in nodes.tolist():
+            lo, hi = indptr[node], indptr[node + 1]
+            if lo == hi:
+                continue
+            positions = order[lo:hi]
+            run = rel[positions]
+            left = np.searchsorted(run, rel_ids, side="left")
+            right = np.searchsorted(run, rel_ids, side="right")
+            for a, b in zip(left.tolist(), right.tolist()):
+                if a < b:
+                    found.append(eid[positions[a:b]])
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def edges_of(self, nodes: Iterable[int], relations: Optional[Iterable[str]] = None,
+                 direction: str = "both") -> np.ndarray:
+        """Sorted ids of the edges incident to ``nodes`` ("out", "in" or "both"), i.e. in graph edge order.
+
+        With ``relations`` only edges carrying one of those relation strings are
+        returned, located per (node, relation) by binary search, so the cost
+        depends on the nodes' degrees and never on the total edge count.
+        """
+        nodes = np.unique(np.asarray(list(nodes), dtype=np.int64))
+        directions = ("out", "in") if direction == "both" else (direction,)
+        if relations is not None:
+            rel_ids = np.unique(np.asarray([r for r in (self.relations.id_of(x) for x in relations) if r >= 0],
+                                           dtype=np.int32))
+            if not len(rel_ids) or not len(nodes):
+                return np.zeros(0, dtype=np.int64)
+            parts = [self._edges_with_relations(d, nodes, rel_ids) for d in directions]
+        else:
+            parts = []
+            for d in directions:
+                positions, _ = self._gather(self.out_indptr if d == "out" else self.in_indptr, nodes)
+                parts.append((self.out_eid if d == "out" else self.in_eid)[positions])
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def edge_triple(self, eid: int) -> Tuple[str, str, str]:
+        """(source key, relation, target key) of edge ``eid``."""
+        return self.keys[self.edge_src[eid]], self.relations[self.edge_rel[eid]], self.keys[self.edge_dst[eid]]
+
+    def khop(self, seeds: Iterable[int], hops: int, max_degree: int = 0, mask: Optional[np.ndarray] = None,
+             direction: str = "out") -> np.ndarray:
+        """Sorted node ids within ``hops`` hops of ``seeds`` (seeds included).
+
+        Each hop expands the whole frontier with one CSR gather. Nodes outside the
+        boolean ``mask`` are neither returned nor expanded; ``max_degree`` caps the
+        edges followed per frontier node and hop so hubs cannot blow the frontier up.
+        ``direction`` is "out" (successors), "in" (predecessors) or "both".
+        """
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        frontier = np.unique(np.asarray(list(seeds), dtype=np.int64))
+        visited[frontier] = True
+        for _ in range(hops):
+            if not len(frontier):
+                break
+            reached = []
+            if direction in ("out", "both"):
+                positions, _ = self._gather(self.out_indptr, frontier, max_degree)
+                reached.append(self.out_indices[positions])
+            if direction in ("in", "both"):
+                positions, _ = self._gather(self.in_indptr, frontier, max_degree)
+                reached.append(self.in_indices[positions])
+            reached = np.concatenate(reached) if reached else np.zeros(0, dtype=np.int64)
+            if mask is not None:
+                reached = reached[mask[reached]]
+            frontier = np.unique(reached[~visited[reached]])
+            visited[frontier] = True
+        return np.flatnonzero(visited)
+
+    def adjacency_matrix(self, unique: bool = True):
+        """Out-adjacency as a scipy CSR matrix (1 per distinct successor when unique)."""
+        import scipy.sparse as sp
+
+        n = self.num_nodes
+        data = np.ones(self.num_edges, dtype=np.float32)
+        adj = sp.csr_matrix((data, self.out_indices, self.out_indptr), shape=(n, n))
+        if unique:
+            adj.sum_duplicates()
+            adj.data[:] = 1.0
+        return adj
+
+    # ----- columnar filters -----
+
+    def nodes_with_label(self, label: str) -> np.ndarray:
+        lid = self.labels.id_of(label)
+        return np.flatnonzero(self.label_id == lid) if lid >= 0 else np.zeros(0, dtype=np.int64)
+
+    def nodes_with_level(self, level: int) -> np.ndarray:
+        return np.flatnonzero(self.level == level)
+
+    def nodes_with_schema_type(self, schema_types: Iterable[str]) -> np.ndarray:
+        tids = [self.schema_types.id_of(t) for t in schema_types]
+        tids = [t for t in tids if t >= 0]
+        if not tids:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.schema_type_id, tids))
+
+    def as_networkx_view(self) -> "NetworkXView":
+        return NetworkXView(self)
+
+
+class _NodeView:
+    def __init__(self, store: CompactGraph):
+        self._store = store
+
+    def _attrs(self, idx: int) -> Dict[str, Any]:
+        s = self._store
+        return {"label": s.labels[s.label_id[idx]], "level": int(s.level[idx]), "properties": s.properties[idx]}
+
+    def __contains__(self, key) -> bool:
+        return key in self._store.keys
+
+    def __iter__(self):
+        return iter(self._store.keys)
+
+    def __len__(self) -> int:
+        return self._store.num_nodes
+
+    def __getitem__(self, key) -> Dict[str, Any]:
+        idx = self._store.node_id(key)
+        if idx < 0:
+            raise KeyError(key)
+        return self._attrs(idx)
+
+    def get(self, key, default=None):
+        idx = self._store.node_id(key)
+        return self._attrs(idx) if idx >= 0 else default
+
+    def __call__(self, data: bool = False):
+        if not data:
+            return iter(self._store.keys)
+        return ((self._store.keys[i], self._attrs(i)) for i in range(self._store.num_nodes))
+
+
+class NetworkXView:
+    """Read-only adapter exposing the networkx MultiDiGraph API subset used in this repo.
+
+    Node attribute dicts are rebuilt on access from the columnar store, so
+    mutating them does not write back.
+    """
+
+    def __init__(self, store: CompactGraph):
+        self.store = store
+        self.nodes = _NodeView(store)
+
+    def __contains__(self, key) -> bool:
+        return key in self.store.keys
+
+    def __len__(self) -> int:
+        return self.store.num_nodes
+
+    def has_node(self, key) -> bool:
+        return key in self.store.keys
+
+    def number_of_nodes(self) -> int:
+        return self.store.num_nodes
+
+    def number_of_edges(self) -> int:
+        return self.store.num_edges
+
+    def _idx(self, key) -> int:
+        idx = self.store.node_id(key)
+        if idx < 0:
+            raise nx.NetworkXError(f"The node {key} is not in the graph.")
+        return idx
+
+    def successors(self, key) -> Iterator[str]:
+        keys = self.store.keys
+        return (keys[j] for j in dict.fromkeys(self.store.successors(self._idx(key)).tolist()))
+
+    neighbors = successors
+
+    def predecessors(self, key) -> Iterator[str]:
+        keys = self.store.keys
+        return (keys[j] for j in dict.fromkeys(self.store.predecessors(self._idx(key)).tolist()))
+
+    def degree(self, key) -> int:
+        idx = self._idx(key)
+        s = self.store
+        return int(s.out_indptr[idx + 1] - s.out_indptr[idx] + s.in_indptr[idx + 1] - s.in_indptr[idx])
+
+    def out_edges(self, key, data: bool = False):
+        s = self.store
+        dst, rel = s.out_edges(self._idx(key))
+        for j, r in zip(dst.tolist(), rel.tolist()):
+            yield (key, s.keys[j], {"relation": s.relations[r]}) if data else (key, s.keys[j])
+
+    def in_edges(self, key, data: bool = False):
+        s = self.store
+        src, rel = s.in_edges(self._idx(key))
+        for j, r in zip(src.tolist(), rel.tolist()):
+            yield (s.keys[j], key, {"relation": s.relations[r]}) if data else (s.keys[j], key)
+
+    def edges(self, data: bool = False):
+        s = self.store
+        for u, v, r in zip(s.edge_src.tolist(), s.edge_dst.tolist(), s.edge_rel.tolist()):
+            yield (s.keys[u], s.keys[v], {"relation": s.relations[r]}) if data else (s.keys[u], s.keys[v])
+
+    def get_edge_data(self, u, v, default=None) -> Optional[Dict[int, Dict[str, str]]]:
+        s = self.store
+        ui, vi = s.node_id(u), s.node_id(v)
+        if ui < 0 or vi < 0:
+            return default
+        dst, rel = s.out_edges(ui)
+        matches = rel[dst == vi].tolist()
+        if not matches:
+            return default
+        return {k: {"relation": s.relations[r]} for k, r in enumerate(matches)}
@@ -0,0 +1,84 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+__all__ = ["AhoCorasickMatcher"]
+
+
+class AhoCorasickMatcher:
+    """Multi-pattern substring matcher (Aho-Corasick automaton).
+
+    The automaton is built once over all patterns; scanning a text then costs
+    O(len(text) + matches) regardless of how many patterns were added.
+    Each pattern carries one or more payloads (e.g. node IDs sharing a name).
+    """
+
+    def __init__(self, case_sensitive: bool = False):
+        self.case_sensitive = case_sensitive
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[Hashable]] = [set()]
+        self._built = False
+
+    def _normalize(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def add(self, pattern: str, payload: Hashable) -> None:
+        """Register a pattern; empty patterns are ignored."""
+        pattern = self._normalize(pattern)
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = nxt
+        self._output[state].add(payload)
+        self._built = False
+
+    def add_all(self, items: Iterable[Tuple[str, Hashable]]) -> "AhoCorasickMatcher":
+        for pattern, payload in items:
+            self.add(pattern, payload)
+        return self
+
+    def build(self) -> "AhoCorasickMatcher":
+        """Compute failure links breadth-first and merge outputs along them."""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._output[nxt] |= self._output[self._fail[nxt]]
+
+        self._built = True
+        return self
+
+    def find(self, text: str) -> Set[Hashable]:
+        """Return payloads of all patterns occurring as substrings of text."""
+        if not self._built:
+            self.build()
+
+        found = set()
+        state = 0
+        for char in self._normalize(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found |= self._output[state]
+        return found
+
+    def __len__(self) -> int:
+        return len(self._goto)
@@ -0,0 +1,116 @@
+"""
+Bounded, thread-safe LRU cache for per-instance memoization.
+
+``functools.lru_cache`` keys on ``self`` and cannot be cleared per instance,
+so retrievers that cache per-node results use this mapping instead. Entries
+can additionally expire after ``ttl`` seconds, and the cache can be bounded by
+an approximate memory budget (``max_bytes``, sized with ``sizeof``).
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def nbytes(value: Any) -> int:
+    """Approximate size of a cached value: array buffers (also inside tuples/lists) or sys.getsizeof."""
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    size = getattr(value, 'nbytes', None)
+    return int(size) if size is not None else sys.getsizeof(value)
+
+
+class LRUCache:
+    """Mapping with least-recently-used eviction once ``maxsize`` entries are stored.
+
+    ``maxsize`` <= 0 disables the cache (``put`` stores nothing, see ``enabled``)
+    and ``maxsize=None`` never evicts by count. ``ttl`` > 0 expires entries that
+    many seconds after they were stored;
+    ``max_bytes`` > 0 evicts until the summed ``sizeof(value)`` fits the budget.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 1024, ttl: float = 0.0, max_bytes: int = 0,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or nbytes
+        # key -> (value, expires_at or None, size in bytes)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize is None or self.maxsize > 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        size = self._sizeof(value) if self.max_bytes > 0 else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes > 0 and size > self.max_bytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+            while self._data and ((self.maxsize is not None and len(self._data) > self.maxsize)
+                                  or (self.max_bytes > 0 and self.bytes > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key)
+        self.bytes -= entry[2]
+        return entry
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def items(self) -> list:
+        """Snapshot of the unexpired (key, value) pairs, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._data.items() if entry[1] is None or entry[1] > now]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "hit_rate": self.hits / total if total else 0.0}
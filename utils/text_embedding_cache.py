@@ -0,0 +1,151 @@
+"""
+Bounded, persistent text -> embedding cache.
+
+Entries are keyed by a hash of the encoded text, so they stay valid across
+graph rebuilds and only depend on the embedding model, which the cache
+manifest records. The cache lives in memory as an ``LRUCache`` and is written
+as an embedding matrix plus hash table (least recently used first, so a reload
+keeps the recency order) once enough new entries have accumulated and on
+``save``. ``get_text_embedding_cache`` shares one cache per file across the
+process and saves it at interpreter exit.
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils import cache_manifest
+from utils import embedding_store
+from utils.logger import logger
+from utils.lru_cache import LRUCache
+
+__all__ = ["TextEmbeddingCache", "get_text_embedding_cache", "text_key"]
+
+# manifest fingerprint of text-keyed caches: validity depends on the model only
+_FINGERPRINT = "text-hash"
+
+
+def text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TextEmbeddingCache:
+    """LRU of text-hash -> float32 vector, loaded from and saved to ``path`` (.npy) when given."""
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 50000, model: Optional[str] = None,
+                 save_every: int = 256):
+        self.path = path
+        self.model = model
+        self.save_every = save_every
+        self._cache = LRUCache(maxsize)
+        self._unsaved = 0
+        self._loaded = False
+        self._lock = threading.Lock()  # guards _unsaved
+        self._io_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._io_lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path or not os.path.exists(self.path):
+                return
+            manifest_ok, reason = cache_manifest.check_manifest(self.path, _FINGERPRINT, model=self.model)
+            if manifest_ok is False:
+                logger.info(f"Text embedding cache {self.path} is stale ({reason}), starting empty")
+                return
+            try:
+                keys, matrix = embedding_store.load_embedding_matrix(self.path, mmap=False)
+                if keys is None:
+                    return
+                matrix = np.asarray(matrix, dtype=np.float32)
+                for key, row in zip(keys, matrix):
+                    self._cache.put(key, row)
+                logger.info(f"Loaded {len(keys)} cached text embeddings from {self.path}")
+            except Exception as e:
+                logger.warning(f"Failed to load text embedding cache {self.path}: {e}")
+
+    def lookup(self, texts: Sequence[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """({position: vector} for cached texts, positions of the misses)."""
+        if not self.enabled:
+            return {}, list(range(len(texts)))
+        self._ensure_loaded()
+        found, missing = {}, []
+        for i, text in enumerate(texts):
+            vector = self._cache.get(text_key(text))
+            if vector is None:
+                missing.append(i)
+            else:
+                found[i] = vector
+        return found, missing
+
+    def add(self, texts: Sequence[str], vectors) -> None:
+        """Cache ``vectors[i]`` for ``texts[i]``; persists once ``save_every`` entries are new."""
+        if not self.enabled:
+            return
+        self._ensure_loaded()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for text, vector in zip(texts, vectors):
+            # copy: a row view would keep the whole batch alive
+            self._cache.put(text_key(text), np.array(vector))
+        with self._lock:
+            self._unsaved += len(texts)
+            due = self.save_every > 0 and self._unsaved >= self.save_every
+        if due and self.path:
+            self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._io_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                self._unsaved = 0
+            entries = self._cache.items()
+            if not entries:
+                return
+            try:
+                keys = [key for key, _ in entries]
+                embedding_store.save_embedding_matrix(self.path, np.stack([vector for _, vector in entries]), keys)
+                cache_manifest.write_manifest(self.path, _FINGERPRINT, model=self.model)
+            except Exception as e:
+                logger.warning(f"Failed to save text embedding cache {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+_shared_lock = threading.Lock()
+_shared: Dict[str, TextEmbeddingCache] = {}
+
+
+def get_text_embedding_cache(path: str, maxsize: int = 50000, model: Optional[str] = None) -> TextEmbeddingCache:
+    """Return the process-wide cache stored at ``path``, creating it on first use; the first caller's settings win."""
+    with _shared_lock:
+        cache = _shared.get(path)
+        if cache is None:
+            cache = TextEmbeddingCache(path, maxsize=maxsize, model=model)
+            _shared[path] = cache
+        return cache
+
+
+@atexit.register
+def _save_shared() -> None:
+    with _shared_lock:
+        caches = list(_shared.values())
+    for cache in caches:
+        cache.save()
@@ -4,16 +4,15 @@ import warnings
 from collections import defaultdict
 from typing import Dict, List
 
-import networkx as nx
 import numpy as np
-import scipy.sparse as sp
 import torch
 import json_repair
-from sentence_transformers import SentenceTransformer
 from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
 
 from utils import call_llm_api
+from utils import encoder_registry
+from utils.embedding_store import EmbeddingStore
+from utils.graph_store import CompactGraph
 from utils.logger import logger
 
 
@@ -45,40 +44,22 @@ class FastTreeComm:
             embedding_model = embedding_model or config.tree_comm.embedding_model
             struct_weight = struct_weight if struct_weight != 0.3 else config.tree_comm.struct_weight
         
-        self.model = SentenceTransformer(embedding_model)
-        self.semantic_cache = {}
+        self.model = encoder_registry.get_encoder(embedding_model)
+        self.semantic_cache = EmbeddingStore()
         self.struct_weight = struct_weight
-        self.node_list = list(graph.nodes())
-        self.node_names = {n: graph.nodes[n]["properties"]["name"] for n in graph.nodes()}
-        self.neighbor_cache = {n: set(graph.neighbors(n)) for n in graph.nodes()}
-        self.edge_relations = {(u, v): data.get("relation", "related_to") 
-                          for u, v, data in graph.edges(data=True)}
+        self.store = CompactGraph.from_networkx(graph)
+        self.node_list = list(self.store.keys)
+        self.node_names = {n: graph.nodes[n]["properties"]["name"] for n in self.node_list}
         
         self.triple_strings_cache = {}
-        self.degree_cache = {n: self.graph.degree(n) for n in self.node_list}
+        self.degree_cache = dict(zip(self.node_list, self.store.degree().tolist()))
 
-        self.adjacency_sparse = self._build_sparse_adjacency()
+        self.adjacency_sparse = self.store.adjacency_matrix(unique=True)
 
         self._precompute_all_triples()
         
         self.llm_client = call_llm_api.LLMCompletionCall()
 
-    def _build_sparse_adjacency(self):
-        n = len(self.node_list)
-        node_to_idx = {node: i for i, node in enumerate(self.node_list)}
-        row, col = [], []
-        
-        for node in self.node_list:
-            i = node_to_idx[node]
-            for neighbor in self.graph.neighbors(node):
-                if neighbor in node_to_idx:
-                    j = node_to_idx[neighbor]
-                    row.append(i)
-                    col.append(j)
-        
-        data = [1] * len(row)
-        return sp.csr_matrix((data, (row, col)), shape=(n, n))
-
     def _precompute_all_triples(self):
         for node_id in self.node_list:
             self.triple_strings_cache[node_id] = self._get_triple_strings(node_id)
@@ -90,13 +71,18 @@ class FastTreeComm:
         if node_id in self.triple_strings_cache:
             return self.triple_strings_cache[node_id]
             
-        node_name = self.graph.nodes[node_id]["properties"]["name"]
+        node_name = self.node_names[node_id]
         triples = []
         
-        for neighbor in self.graph.neighbors(node_id):
-            rel = self.graph.edges[node_id, neighbor, 0].get("relation", "related_to")
-            neighbor_name = self.graph.nodes[neighbor]["properties"]["name"]
-            triples.append(f"{node_name} {rel} {neighbor_name}")
+        # first relation per distinct successor, read from the CSR out-adjacency
+        dst, rel = self.store.out_edges(self.store.node_id(node_id))
+        first_rel = {}
+        for j, r in zip(dst.tolist(), rel.tolist()):
+            first_rel.setdefault(j, r)
+        for j, r in first_rel.items():
+            rel_name = self.store.relations[r] or "related_to"
+            neighbor_name = self.node_names[self.store.keys[j]]
+            triples.append(f"{node_name} {rel_name} {neighbor_name}")
             
         result = list(set(triples))
         self.triple_strings_cache[node_id] = result
@@ -107,12 +93,12 @@ class FastTreeComm:
         if node_id not in self.semantic_cache:
             triples = self.triple_strings_cache.get(node_id, [])
             text = ", ".join(triples) if triples else self.graph.nodes[node_id]["properties"]["name"]
-            self.semantic_cache[node_id] = self.model.encode(text)
-        return self.semantic_cache[node_id]
+            self.semantic_cache[node_id] = torch.as_tensor(self.model.encode(text))
+        return self.semantic_cache[node_id].numpy()
     
     def get_triple_embeddings_batch(self, node_ids):
         """Batch processing for GPU acceleration with optimized caching"""
-        uncached_ids = [nid for nid in node_ids if nid not in self.semantic_cache]
+        uncached_ids = [nid for nid in dict.fromkeys(node_ids) if nid not in self.semantic_cache]
         
         if uncached_ids:
             texts = []
@@ -124,16 +110,15 @@ class FastTreeComm:
             with torch.no_grad():
                 embeddings = self.model.encode(texts, convert_to_tensor=True, batch_size=128)
                 
-            for nid, emb in zip(uncached_ids, embeddings):
-                self.semantic_cache[nid] = emb.cpu().numpy()
-        return np.array([self.semantic_cache[nid] for nid in node_ids])
+            self.semantic_cache.add_batch(uncached_ids, embeddings.cpu())
+        _, rows = self.semantic_cache.rows_for(node_ids)
+        return self.semantic_cache.matrix[rows].numpy()
 
     def _compute_jaccard_matrix_vectorized(self, level_nodes):
 
-        node_to_idx = {node: i for i, node in enumerate(self.node_list)}
-        level_indices = [node_to_idx[node] for node in level_nodes if node in node_to_idx]
+        level_indices = self.store.node_ids(level_nodes)
 
-        if not level_indices:
+        if not len(level_indices):
             return np.zeros((len(level_nodes), len(level_nodes)))
 
         sub_adj = self.adjacency_sparse[level_indices][:, level_indices]
@@ -248,10 +233,9 @@ class FastTreeComm:
         if len(initial_clusters) == 1:
             return initial_clusters
         
-        cluster_centers = {}
-        for cluster_id, nodes in initial_clusters.items():
-            center = self._compute_community_center(nodes)
-            cluster_centers[cluster_id] = center
+        cluster_ids = list(initial_clusters.keys())
+        centers = self._compute_community_centers([initial_clusters[cid] for cid in cluster_ids])
+        cluster_centers = dict(zip(cluster_ids, centers))
         
         center_nodes = list(cluster_centers.values())
         center_sim_matrix = self._compute_sim_matrix(center_nodes)
@@ -351,11 +335,16 @@ class FastTreeComm:
             return community_nodes[0]
         return self.extract_keywords_from_community(community_nodes)[0]
 
+    def _compute_community_centers(self, communities: List[List[str]]) -> List[str]:
+        """Batched variant of _compute_community_center for many communities at once"""
+        keywords = self.extract_keywords_from_communities(communities)
+        return [members[0] if len(members) == 1 else kws[0] for members, kws in zip(communities, keywords)]
+
     def _build_batch_prompt(self, community_batch):
         batch_data = []
-        for comm_id, members in community_batch:
+        centers = self._compute_community_centers([members for _, members in community_batch])
+        for (comm_id, members), center_node in zip(community_batch, centers):
             member_names = [self.node_names[n] for n in members]
-            center_node = self._compute_community_center(members)
             center_name = self.node_names[center_node]
             
             comm_info = {
@@ -447,39 +436,89 @@ class FastTreeComm:
         return super_nodes
 
     def extract_keywords_from_community(self, community_nodes: List[str], top_k: int = 5) -> List[str]:
-        if len(community_nodes) <= top_k:
-            return community_nodes
+        return self.extract_keywords_from_communities([community_nodes], top_k=top_k)[0]
 
-        structural_scores = {node: self.degree_cache.get(node, 0) for node in community_nodes}
-        
-        node_embeddings = self.get_triple_embeddings_batch(community_nodes)
-        avg_embedding = np.mean(node_embeddings, axis=0)
-        
-        semantic_scores = cosine_similarity(node_embeddings, [avg_embedding]).flatten()
-        
-        max_degree = max(structural_scores.values()) if structural_scores else 1
-        norm_structural = {n: s / max_degree for n, s in structural_scores.items()}
-        norm_semantic = dict(zip(community_nodes, semantic_scores))
-        
-        combined_scores = {
-            node: (self.struct_weight * norm_structural[node] +
-                   (1 - self.struct_weight) * norm_semantic[node])
-            for node in community_nodes
-        }
-        
-        top_nodes = sorted(community_nodes, key=lambda x: combined_scores[x], reverse=True)[:top_k]
-        return top_nodes
+    def extract_keywords_from_communities(self, communities: List[List[str]], top_k: int = 5) -> List[List[str]]:
+        """Pick top-k keyword nodes for every community in one vectorized pass.
+
+        Members of all communities are flattened into a single array with a
+        membership (segment) index, so centroids, structural+semantic scores and
+        the per-community top-k selection are computed without Python loops over
+        members.
+        """
+        results = [list(members) for members in communities]
+        large = [i for i, members in enumerate(communities) if len(members) > top_k]
+        if not large:
+            return results
+
+        sizes = np.array([len(communities[i]) for i in large], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        flat_nodes = [node for i in large for node in communities[i]]
+        segment = np.repeat(np.arange(len(large)), sizes)
+
+        unique_nodes = list(dict.fromkeys(flat_nodes))
+        unique_row = {node: row for row, node in enumerate(unique_nodes)}
+        unique_embeddings = self.get_triple_embeddings_batch(unique_nodes).astype(np.float32, copy=False)
+        embeddings = unique_embeddings[np.fromiter((unique_row[n] for n in flat_nodes), dtype=np.int64, count=len(flat_nodes))]
+
+        # segment mean -> community centroids
+        centroids = np.add.reduceat(embeddings, offsets, axis=0) / sizes[:, None]
+        member_norms = np.linalg.norm(embeddings, axis=1) + 1e-9
+        centroid_norms = np.linalg.norm(centroids, axis=1) + 1e-9
+        semantic = np.einsum("ij,ij->i", embeddings, centroids[segment]) / (member_norms * centroid_norms[segment])
+
+        degrees = np.fromiter((self.degree_cache.get(n, 0) for n in flat_nodes), dtype=np.float32, count=len(flat_nodes))
+        max_degree = np.maximum.reduceat(degrees, offsets)
+        max_degree[max_degree == 0] = 1.0
+        structural = degrees / max_degree[segment]
+
+        combined = self.struct_weight * structural + (1 - self.struct_weight) * semantic
+
+        for local_idx, top_positions in self._top_k_per_segment(combined, offsets, sizes, top_k):
+            start = offsets[local_idx]
+            results[large[local_idx]] = [flat_nodes[start + p] for p in top_positions]
+        return results
+
+    @staticmethod
+    def _top_k_per_segment(scores: np.ndarray, offsets: np.ndarray, sizes: np.ndarray, top_k: int, max_block_elems: int = 1 << 22):
+        """Yield (segment, positions) with the top_k positions of each segment, best first.
+
+        Segments are padded into a dense matrix and reduced with argpartition.
+        Segments are processed in size-sorted blocks so the padded matrix stays
+        bounded even when a few communities are very large.
+        """
+        order = np.argsort(sizes, kind="stable")
+        block_start = 0
+        while block_start < len(order):
+            block_end = block_start + 1
+            while block_end < len(order):
+                if (block_end - block_start + 1) * int(sizes[order[block_end]]) > max_block_elems:
+                    break
+                block_end += 1
+            block = order[block_start:block_end]
+            width = int(sizes[block].max())
+
+            padded = np.full((len(block), width), -np.inf, dtype=np.float32)
+            col = np.arange(width)
+            mask = col[None, :] < sizes[block][:, None]
+            gather = offsets[block][:, None] + np.where(mask, col[None, :], 0)
+            padded[mask] = scores[gather[mask]]
+
+            top = np.argpartition(-padded, top_k - 1, axis=1)[:, :top_k]
+            top_scores = np.take_along_axis(padded, top, axis=1)
+            top = np.take_along_axis(top, np.argsort(-top_scores, axis=1, kind="stable"), axis=1)
+            for row, seg in enumerate(block):
+                yield seg, top[row].tolist()
+            block_start = block_end
 
     def create_super_nodes_with_keywords(self, comm_to_nodes: Dict[str, List[str]], level: int = 4, batch_size: int = 5):
         super_nodes = self.create_super_nodes(comm_to_nodes, level, batch_size)
         
         keyword_mapping = {}
-        for comm_id, members in comm_to_nodes.items():
-            if len(members) < 2:
-                continue
-                
+        eligible = [(comm_id, members) for comm_id, members in comm_to_nodes.items() if len(members) >= 2]
+        all_keywords = self.extract_keywords_from_communities([members for _, members in eligible])
+        for (comm_id, members), keywords in zip(eligible, all_keywords):
             try:
-                keywords = self.extract_keywords_from_community(members)
                 super_node_id = f"comm_{level}_{comm_id}"
                 
                 for keyword in keywords: